@@ -4,16 +4,18 @@ Producto SaaS B2B - Análisis de dominios corporativos
 """
 
 import pandas as pd
-import dns.resolver
 import streamlit as st
 import re
-import whois
 import concurrent.futures
-from functools import lru_cache
 from datetime import datetime
 from dataclasses import dataclass
 from typing import Optional, List, Tuple, Dict
 from enum import Enum
+from dns_cache import EstadoDNS, consultar as consultar_dns
+from sufijos_publicos import dominio_registrable
+from vendor_matcher import terminos_spf
+from catalogo_vendors import CatalogoVendors, obtener_catalogo
+from rdap_cliente import fecha_creacion_dominio
 
 # ============================================================================
 # CONFIGURACIÓN Y CONSTANTES
@@ -61,48 +63,6 @@ class AntiguedadDominio(Enum):
     DESCONOCIDO = "Desconocido"
 
 
-# ============================================================================
-# CATÁLOGOS DE VENDORS
-# ============================================================================
-
-VENDORS_CORREO_MX = {
-    r'outlook|protection\.outlook|microsoft': ("Microsoft 365", CategoriaVendor.PLATAFORMA_CORREO),
-    r'google|googlemail|smtp\.google': ("Google Workspace", CategoriaVendor.PLATAFORMA_CORREO),
-    r'zoho': ("Zoho Mail", CategoriaVendor.PLATAFORMA_CORREO),
-    r'secureserver|domaincontrol': ("GoDaddy", CategoriaVendor.PLATAFORMA_CORREO),
-    r'yahoodns|yahoo': ("Yahoo", CategoriaVendor.PLATAFORMA_CORREO),
-}
-
-VENDORS_SEGURIDAD_MX = {
-    r'proofpoint|pphosted': ("Proofpoint", CategoriaVendor.SEGURIDAD_GATEWAY),
-    r'mimecast': ("Mimecast", CategoriaVendor.SEGURIDAD_GATEWAY),
-    r'barracuda|barracudanetworks': ("Barracuda", CategoriaVendor.SEGURIDAD_GATEWAY),
-    r'iphmx|ironport': ("Cisco IronPort", CategoriaVendor.SEGURIDAD_GATEWAY),
-    r'messagelabs|symantec': ("Symantec", CategoriaVendor.SEGURIDAD_GATEWAY),
-    r'fireeye': ("FireEye", CategoriaVendor.SEGURIDAD_GATEWAY),
-}
-
-VENDORS_SEGURIDAD_SPF = {
-    r'include:_spf\.proofpoint\.com': ("Proofpoint", CategoriaVendor.SEGURIDAD_GATEWAY),
-    r'include:.*mimecast': ("Mimecast", CategoriaVendor.SEGURIDAD_GATEWAY),
-    r'include:.*barracuda': ("Barracuda", CategoriaVendor.SEGURIDAD_GATEWAY),
-}
-
-VENDORS_ENVIO_SPF = {
-    r'include:sendgrid\.net': ("SendGrid", CategoriaVendor.ENVIO),
-    r'include:.*mailgun\.org': ("Mailgun", CategoriaVendor.ENVIO),
-    r'include:amazonses\.com': ("Amazon SES", CategoriaVendor.ENVIO),
-    r'include:.*mailchimp\.com': ("Mailchimp", CategoriaVendor.ENVIO),
-    r'include:.*sendinblue': ("Sendinblue", CategoriaVendor.ENVIO),
-    r'include:.*hubspot\.com': ("HubSpot", CategoriaVendor.ENVIO),
-    r'include:.*salesforce\.com': ("Salesforce", CategoriaVendor.ENVIO),
-    r'include:.*constantcontact\.com': ("Constant Contact", CategoriaVendor.ENVIO),
-    r'include:.*postmarkapp\.com': ("Postmark", CategoriaVendor.ENVIO),
-    r'include:.*sparkpost': ("SparkPost", CategoriaVendor.ENVIO),
-    r'include:.*mandrill': ("Mandrill", CategoriaVendor.ENVIO),
-}
-
-
 # ============================================================================
 # ESTRUCTURAS DE DATOS
 # ============================================================================
@@ -127,65 +87,62 @@ class ResultadoAnalisis:
     antiguedad: AntiguedadDominio
     fecha_creacion: Optional[str]
     postura: PosturaGeneral
+    catalogo_version: str = ""
 
 
 # ============================================================================
 # FUNCIONES DE CONSULTA DNS
 # ============================================================================
 
-@lru_cache(maxsize=1024)
 def obtener_registros_mx(dominio: str) -> List[str]:
     """Obtiene registros MX del dominio."""
+    respuesta = consultar_dns(dominio, 'MX', lifetime=DNS_TIMEOUT)
+    if respuesta.estado != EstadoDNS.RESPUESTA:
+        return []
     try:
-        respuesta = dns.resolver.resolve(dominio, 'MX', lifetime=DNS_TIMEOUT)
         return [r.exchange.to_text().rstrip('.').lower() for r in respuesta]
-    except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, 
-            dns.resolver.Timeout, Exception):
+    except Exception:
         return []
 
 
-@lru_cache(maxsize=1024)
 def obtener_spf(dominio: str) -> str:
     """Obtiene registro SPF del dominio."""
+    respuestas = consultar_dns(dominio, 'TXT', lifetime=DNS_TIMEOUT)
+    if respuestas.estado != EstadoDNS.RESPUESTA:
+        return ""
     try:
-        respuestas = dns.resolver.resolve(dominio, 'TXT', lifetime=DNS_TIMEOUT)
         for r in respuestas:
             txt_record = b''.join(r.strings).decode()
             if "v=spf1" in txt_record.lower():
                 return txt_record
-    except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, 
-            dns.resolver.Timeout, Exception):
+    except Exception:
         pass
     return ""
 
 
-@lru_cache(maxsize=1024)
 def obtener_dmarc(dominio: str) -> str:
     """Obtiene registro DMARC del dominio."""
+    respuestas = consultar_dns(f"_dmarc.{dominio}", 'TXT', lifetime=DNS_TIMEOUT)
+    if respuestas.estado != EstadoDNS.RESPUESTA:
+        return ""
     try:
-        respuestas = dns.resolver.resolve(f"_dmarc.{dominio}", 'TXT', lifetime=DNS_TIMEOUT)
         for r in respuestas:
             txt_record = b''.join(r.strings).decode()
             if "v=DMARC1" in txt_record.upper():
                 return txt_record
-    except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, 
-            dns.resolver.Timeout, Exception):
+    except Exception:
         pass
     return ""
 
 
-@lru_cache(maxsize=512)
 def obtener_whois(dominio: str) -> Tuple[Optional[datetime], str]:
-    """Obtiene fecha de creación del dominio via WHOIS."""
+    """Obtiene fecha de creación del dominio via RDAP (WHOIS si el TLD no tiene RDAP)."""
     try:
-        info = whois.whois(dominio, timeout=10)
-        creation = info.creation_date
-        if isinstance(creation, list):
-            creation = creation[0]
-        if creation:
-            return creation, creation.strftime("%Y-%m-%d")
-    except Exception:
-        pass
+        creation = fecha_creacion_dominio(dominio)
+    except Exception:  # Red caída o registro limitando: no queda en caché
+        creation = None
+    if creation:
+        return creation, creation.strftime("%Y-%m-%d")
     return None, "N/D"
 
 
@@ -245,12 +202,11 @@ def calcular_antiguedad(fecha_creacion: Optional[datetime]) -> AntiguedadDominio
         return AntiguedadDominio.DESCONOCIDO
 
 
-def detectar_vendor_correo(registros_mx: List[str]) -> Optional[str]:
+def detectar_vendor_correo(registros_mx: List[str], catalogo: Optional[CatalogoVendors] = None) -> Optional[str]:
     """Detecta el vendor de correo principal por MX."""
-    for registro in registros_mx:
-        for patron, (nombre, _) in VENDORS_CORREO_MX.items():
-            if re.search(patron, registro, re.IGNORECASE):
-                return nombre
+    vendor = (catalogo or obtener_catalogo()).correo_mx.primero(registros_mx)
+    if vendor:
+        return vendor
     
     # Si hay MX pero no coincide con ningún vendor conocido
     if registros_mx:
@@ -258,35 +214,19 @@ def detectar_vendor_correo(registros_mx: List[str]) -> Optional[str]:
     return None
 
 
-def detectar_vendors_seguridad(registros_mx: List[str], spf: str) -> List[str]:
+def detectar_vendors_seguridad(
+    registros_mx: List[str], spf: str, catalogo: Optional[CatalogoVendors] = None
+) -> List[str]:
     """Detecta vendors de seguridad/gateway por MX y SPF."""
-    vendors = set()
-    
-    # Buscar en MX
-    for registro in registros_mx:
-        for patron, (nombre, _) in VENDORS_SEGURIDAD_MX.items():
-            if re.search(patron, registro, re.IGNORECASE):
-                vendors.add(nombre)
-    
-    # Buscar en SPF
-    if spf:
-        for patron, (nombre, _) in VENDORS_SEGURIDAD_SPF.items():
-            if re.search(patron, spf, re.IGNORECASE):
-                vendors.add(nombre)
-    
-    return list(vendors)
+    catalogo = catalogo or obtener_catalogo()
+    # Buscar en MX y en cada término del SPF
+    vendors = catalogo.seguridad_mx.todos(registros_mx) + catalogo.seguridad_spf.todos(terminos_spf(spf))
+    return list(dict.fromkeys(vendors))
 
 
-def detectar_vendors_envio(spf: str) -> List[str]:
+def detectar_vendors_envio(spf: str, catalogo: Optional[CatalogoVendors] = None) -> List[str]:
     """Detecta vendors de envío (marketing/transaccional) por SPF."""
-    vendors = set()
-    
-    if spf:
-        for patron, (nombre, _) in VENDORS_ENVIO_SPF.items():
-            if re.search(patron, spf, re.IGNORECASE):
-                vendors.add(nombre)
-    
-    return list(vendors)
+    return (catalogo or obtener_catalogo()).envio_spf.todos(terminos_spf(spf))
 
 
 def calcular_postura_general(
@@ -346,9 +286,10 @@ def analizar_dominio(dominio: str) -> ResultadoAnalisis:
     antiguedad = calcular_antiguedad(fecha_creacion)
     
     # Detección de vendors
-    vendor_correo = detectar_vendor_correo(registros_mx)
-    vendors_seguridad = detectar_vendors_seguridad(registros_mx, spf)
-    vendors_envio = detectar_vendors_envio(spf)
+    catalogo = obtener_catalogo()
+    vendor_correo = detectar_vendor_correo(registros_mx, catalogo)
+    vendors_seguridad = detectar_vendors_seguridad(registros_mx, spf, catalogo)
+    vendors_envio = detectar_vendors_envio(spf, catalogo)
     
     # Postura general
     postura = calcular_postura_general(
@@ -366,7 +307,8 @@ def analizar_dominio(dominio: str) -> ResultadoAnalisis:
         vendors_envio=vendors_envio,
         antiguedad=antiguedad,
         fecha_creacion=fecha_str,
-        postura=postura
+        postura=postura,
+        catalogo_version=catalogo.version,
     )
 
 
@@ -383,7 +325,8 @@ def resultado_a_dict_tecnico(resultado: ResultadoAnalisis) -> Dict:
         "Estado DMARC": resultado.estado_dmarc.value,
         "Fecha Creación": resultado.fecha_creacion,
         "Antigüedad": resultado.antiguedad.value,
-        "Postura General": resultado.postura.value
+        "Postura General": resultado.postura.value,
+        "Versión Catálogo": resultado.catalogo_version,
     }
 
 
@@ -408,13 +351,15 @@ def validar_email(email: str) -> bool:
     """Valida formato básico de email."""
     if not isinstance(email, str):
         return False
-    return bool(re.match(r'^[\w\.\-\+]+@[a-zA-Z\d\.\-]+\.[a-zA-Z]{2,}$', email))
+    # \w acepta dominios Unicode (IDN); el TLD puede venir ya en punycode (xn--)
+    return bool(re.match(r'^[\w\.\-\+]+@[\w\.\-]+\.(?:[^\W\d_]{2,}|xn--[a-z\d\-]+)$', email))
 
 
 def extraer_dominio(email: str) -> str:
     """Extrae el dominio de un email."""
     if validar_email(email):
-        return email.split("@")[-1].lower().strip()
+        # Dominio registrable (eTLD+1): ventas.empresa.com.mx -> empresa.com.mx
+        return dominio_registrable(email.split("@")[-1].lower().strip())
     return ""
 
 
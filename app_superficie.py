@@ -4,41 +4,89 @@ Producto SaaS B2B - Análisis integral de dominios corporativos
 """
 
 import pandas as pd
-import dns.resolver
 import streamlit as st
 import re
-import requests
-import whois
+import sqlite3
 import concurrent.futures
+import contextlib
+import hashlib
 import io
 import os
-from functools import lru_cache
+import threading
+import time
+import uuid
 import plotly.express as px
 import plotly.graph_objects as go
+import requests
 
 # Cache en Neon (opcional, funciona sin él)
-import contextlib
 try:
     from db_cache import (
         get_cached_dominios, save_to_cache, get_cache_stats,
-        init_db, query_all_cached, get_single_domain
+        init_db, query_all_cached, get_single_domain,
+        get_fechas_creacion, save_fechas_creacion,
+        crear_escaneo, buscar_escaneo_pendiente, liberar_escaneo, get_checkpoint, save_checkpoint,
+        terminar_escaneo
     )
     CACHE_AVAILABLE = True
 except ImportError:
     CACHE_AVAILABLE = False
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Tuple
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, List, Dict, Set, Tuple
 from enum import Enum
 from datetime import datetime
 from urllib.parse import urlparse
+from dns_cache import EstadoDNS
+from dns_async import RegistrosIdentidad, resolver_identidad, resolvedor_identidad, verificador_existencia
+from sufijos_publicos import dominio_registrable
+from latencias import estadisticas_timeouts
+from spf_resolver import SPF_LIMITE_LOOKUPS, ExpansorSPF, expandir_spf_dominio, expandir_spf_registros
+from vendor_matcher import terminos_spf
+from http_probe import SondaHTTP, configurar_sesion_http, sondear
+from tls_info import InfoTLS
+try:
+    from http_async import HTTP_CONCURRENCIA_ASYNC, sondeador
+    HTTP_ASYNC_DISPONIBLE = True
+except ImportError:  # Sin httpx: cada hilo sondea con requests
+    HTTP_ASYNC_DISPONIBLE = False
+from catalogo_vendors import CatalogoVendors, obtener_catalogo
+from plazo import ETAPA_WHOIS, PLAZO_DOMINIO_SEGUNDOS, Plazo, ejecutar_con_plazo
+from whois_cliente import TIMEOUT_WHOIS, WhoisLimitado
+from rdap_cliente import TIMEOUT_RDAP, fecha_creacion_dominio, servidor_rdap
+from pipeline import EtapaAsync, EtapaHilos, Pipeline
+from trabajos import FALLIDO, TERMINADO, ColaTrabajos, asegurar_trabajadores, requiere_trabajador
 
 # ============================================================================
 # CONFIGURACIÓN
 # ============================================================================
 
 DNS_TIMEOUT = 5
-REQUEST_TIMEOUT = 10
 MAX_WORKERS = 10
+# Consultas WHOIS simultáneas de la fase de antigüedad (corre junto a DNS y HTTP)
+WHOIS_CONCURRENCIA = 8
+# Pipeline por etapas: dominios en vuelo por etapa (cada una con su cola acotada)
+ETAPA_EXISTENCIA_CONCURRENCIA = 200
+ETAPA_DNS_CONCURRENCIA = 200
+ETAPA_PUNTUACION_CONCURRENCIA = 4
+# Escaneo en streaming: filas por escritura a Neon y refresco de la vista parcial
+CACHE_LOTE_FILAS = 50
+UI_REFRESCO_SEGUNDOS = 1.0
+# Checkpoint de escaneos por archivo: además de cada CACHE_LOTE_FILAS filas,
+# como mucho cada tantos segundos
+CHECKPOINT_SEGUNDOS = 15.0
+# Un escaneo de archivo que pasa este tiempo sigue en un trabajador en
+# segundo plano (trabajador.py); 0 = siempre en la sesión
+UMBRAL_INTERACTIVO_SEGUNDOS = float(os.environ.get("PROSPECTSCAN_UMBRAL_INTERACTIVO", "60"))
+# Cada cuánto la UI consulta el progreso de un trabajo en segundo plano
+TRABAJO_SONDEO_SEGUNDOS = 2.0
+
+# Pool HTTP keep-alive compartido, una conexión por hilo de análisis
+configurar_sesion_http(MAX_WORKERS)
+
+# Valores de df_resultados["estado_dominio"]
+ESTADO_DOMINIO_ACTIVO = "Activo"
+ESTADO_DOMINIO_INEXISTENTE = "Inexistente"
+ESTADO_DOMINIO_ERROR = "Error"  # el análisis falló: se muestra, no se cachea
 
 DOMINIOS_PERSONALES = frozenset([
     "gmail.com", "hotmail.com", "outlook.com", "yahoo.com",
@@ -81,49 +129,6 @@ class EstadoHeader(Enum):
     AUSENTE = "Ausente"
 
 
-# ============================================================================
-# CATÁLOGOS DE VENDORS
-# ============================================================================
-
-VENDORS_CORREO_MX = {
-    r'outlook|protection\.outlook|microsoft': "Microsoft 365",
-    r'google|googlemail|smtp\.google': "Google Workspace",
-    r'zoho': "Zoho Mail",
-    r'secureserver|domaincontrol': "GoDaddy",
-}
-
-VENDORS_SEGURIDAD_MX = {
-    r'proofpoint|pphosted': "Proofpoint",
-    r'mimecast': "Mimecast",
-    r'barracuda|barracudanetworks': "Barracuda",
-    r'iphmx|ironport': "Cisco IronPort",
-}
-
-VENDORS_SEGURIDAD_SPF = {
-    r'include:_spf\.proofpoint\.com': "Proofpoint",
-    r'include:.*mimecast': "Mimecast",
-    r'include:.*barracuda': "Barracuda",
-}
-
-VENDORS_ENVIO_SPF = {
-    r'include:sendgrid\.net': "SendGrid",
-    r'include:.*mailgun\.org': "Mailgun",
-    r'include:amazonses\.com': "Amazon SES",
-    r'include:.*mailchimp\.com': "Mailchimp",
-    r'include:.*hubspot\.com': "HubSpot",
-    r'include:.*salesforce\.com': "Salesforce",
-}
-
-CDN_WAF_HEADERS = {
-    r'cloudflare': "Cloudflare",
-    r'akamai': "Akamai",
-    r'fastly': "Fastly",
-    r'cloudfront': "CloudFront",
-    r'sucuri': "Sucuri",
-    r'incapsula|imperva': "Imperva",
-}
-
-
 # ============================================================================
 # ESTRUCTURAS DE DATOS
 # ============================================================================
@@ -138,6 +143,11 @@ class ResultadoIdentidad:
     vendors_seguridad: List[str]
     vendors_envio: List[str]
     postura: Postura
+    # Alguna consulta DNS quedó en timeout/SERVFAIL: "Ausente" no es definitivo
+    dns_incompleto: bool = False
+    # SPF expandido (include:/redirect= recursivos)
+    spf_lookups: int = 0
+    spf_incluidos: List[str] = field(default_factory=list)
 
 
 @dataclass
@@ -150,6 +160,8 @@ class ResultadoExposicion:
     servidor: Optional[str]
     postura: Postura
     error: Optional[str]
+    # Certificado y protocolo del handshake HTTPS de la sonda (sin conexión extra)
+    tls: Optional[InfoTLS] = None
 
 
 @dataclass
@@ -159,71 +171,26 @@ class ResultadoSuperficie:
     exposicion: ResultadoExposicion
     postura_general: Postura
     recomendaciones: List[str]
+    # Versión de data/catalogo_vendors.json usada para clasificar vendors
+    catalogo_version: str = ""
+    # Etapas (DNS, HTTP, WHOIS) que el plazo del dominio dejó sin terminar
+    etapas_parciales: List[str] = field(default_factory=list)
+
+    @property
+    def parcial(self) -> bool:
+        return bool(self.etapas_parciales)
 
 
 # ============================================================================
 # FUNCIONES DNS (IDENTIDAD)
 # ============================================================================
 
-@lru_cache(maxsize=1024)
-def obtener_mx(dominio: str) -> List[str]:
-    """Obtiene registros MX del dominio."""
-    try:
-        resp = dns.resolver.resolve(dominio, 'MX', lifetime=DNS_TIMEOUT)
-        return [r.exchange.to_text().rstrip('.').lower() for r in resp]
-    except dns.resolver.NXDOMAIN:
-        return []  # Dominio no existe
-    except dns.resolver.NoAnswer:
-        return []  # Sin registros MX
-    except dns.resolver.Timeout:
-        return []  # Timeout
-    except Exception:
-        return []
-
-
-@lru_cache(maxsize=1024)
-def obtener_spf(dominio: str) -> str:
-    """Obtiene registro SPF del dominio."""
-    try:
-        resp = dns.resolver.resolve(dominio, 'TXT', lifetime=DNS_TIMEOUT)
-        for r in resp:
-            txt = b''.join(r.strings).decode()
-            if "v=spf1" in txt.lower():
-                return txt
-        return ""  # Hay TXT pero no SPF
-    except dns.resolver.NXDOMAIN:
-        return ""  # Dominio no existe
-    except dns.resolver.NoAnswer:
-        return ""  # Sin registros TXT
-    except dns.resolver.Timeout:
-        return ""  # Timeout
-    except Exception:
-        return ""
-
-
-@lru_cache(maxsize=1024)
-def obtener_dmarc(dominio: str) -> str:
-    """Obtiene registro DMARC del dominio."""
-    try:
-        resp = dns.resolver.resolve(f"_dmarc.{dominio}", 'TXT', lifetime=DNS_TIMEOUT)
-        for r in resp:
-            txt = b''.join(r.strings).decode()
-            if "v=dmarc1" in txt.lower():
-                return txt
-        return ""  # Registro existe pero no es DMARC válido
-    except dns.resolver.NXDOMAIN:
-        return ""  # No existe _dmarc.dominio
-    except dns.resolver.NoAnswer:
-        return ""  # Sin registros TXT
-    except dns.resolver.Timeout:
-        return ""  # Timeout
-    except Exception:
-        return ""
-
-
-def evaluar_spf(spf: str) -> EstadoSPF:
+def evaluar_spf(spf: str, lookups: int = 0) -> EstadoSPF:
     if not spf:
         return EstadoSPF.AUSENTE
+    # RFC 7208: más de 10 lookups es permerror, el receptor ignora el SPF
+    if lookups > SPF_LIMITE_LOOKUPS:
+        return EstadoSPF.DEBIL
     spf_lower = spf.lower()
     if "+all" in spf_lower or "?all" in spf_lower:
         return EstadoSPF.DEBIL
@@ -245,36 +212,27 @@ def evaluar_dmarc(dmarc: str) -> EstadoDMARC:
     return EstadoDMARC.AUSENTE
 
 
-def detectar_vendor_correo(mx: List[str]) -> Optional[str]:
-    for registro in mx:
-        for patron, nombre in VENDORS_CORREO_MX.items():
-            if re.search(patron, registro, re.IGNORECASE):
-                return nombre
+def detectar_vendor_correo(mx: List[str], catalogo: Optional[CatalogoVendors] = None) -> Optional[str]:
+    catalogo = catalogo or obtener_catalogo()
+    nombre = catalogo.correo_mx.primero(mx)
+    if nombre:
+        return nombre
     if mx:
         return "Infraestructura propia"
     return None
 
 
-def detectar_vendors_seguridad(mx: List[str], spf: str) -> List[str]:
-    vendors = set()
-    for registro in mx:
-        for patron, nombre in VENDORS_SEGURIDAD_MX.items():
-            if re.search(patron, registro, re.IGNORECASE):
-                vendors.add(nombre)
-    if spf:
-        for patron, nombre in VENDORS_SEGURIDAD_SPF.items():
-            if re.search(patron, spf, re.IGNORECASE):
-                vendors.add(nombre)
-    return list(vendors)
+def detectar_vendors_seguridad(
+    mx: List[str], spf: str, catalogo: Optional[CatalogoVendors] = None
+) -> List[str]:
+    catalogo = catalogo or obtener_catalogo()
+    vendors = catalogo.seguridad_mx.todos(mx) + catalogo.seguridad_spf.todos(terminos_spf(spf))
+    return list(dict.fromkeys(vendors))
 
 
-def detectar_vendors_envio(spf: str) -> List[str]:
-    vendors = set()
-    if spf:
-        for patron, nombre in VENDORS_ENVIO_SPF.items():
-            if re.search(patron, spf, re.IGNORECASE):
-                vendors.add(nombre)
-    return list(vendors)
+def detectar_vendors_envio(spf: str, catalogo: Optional[CatalogoVendors] = None) -> List[str]:
+    catalogo = catalogo or obtener_catalogo()
+    return catalogo.envio_spf.todos(terminos_spf(spf))
 
 
 def calcular_postura_identidad(
@@ -302,27 +260,56 @@ def calcular_postura_identidad(
     return Postura.BASICA
 
 
-def analizar_identidad(dominio: str) -> ResultadoIdentidad:
-    mx = obtener_mx(dominio)
-    spf = obtener_spf(dominio)
-    dmarc = obtener_dmarc(dominio)
+def spf_con_includes(spf: str, incluidos: List[str]) -> str:
+    """SPF + includes anidados como términos include:, para los catálogos de vendors."""
+    if not spf or not incluidos:
+        return spf
+    return spf + " " + " ".join(f"include:{d}" for d in incluidos)
+
+
+def _raw_o_motivo(valor: str, estado: EstadoDNS) -> str:
+    if valor:
+        return valor
+    if estado in (EstadoDNS.TIMEOUT, EstadoDNS.SERVFAIL):
+        return f"Sin respuesta DNS ({estado.value})"
+    return "No encontrado"
+
+
+def analizar_identidad(
+    dominio: str,
+    registros: Optional[RegistrosIdentidad] = None,
+    catalogo: Optional[CatalogoVendors] = None,
+    plazo: Optional[Plazo] = None,
+) -> ResultadoIdentidad:
+    # Si el lote ya resolvió el DNS (motor asíncrono), no volver a consultar
+    if registros is None:
+        registros = resolver_identidad(dominio, plazo)
+        try:
+            expandir_spf_dominio(dominio, registros)
+        except Exception:
+            pass  # Sin expansión: se detecta solo sobre el SPF de primer nivel
+    mx, spf, dmarc = registros.mx, registros.spf, registros.dmarc
+    spf_vendors = spf_con_includes(spf, registros.spf_incluidos)
     
-    estado_spf = evaluar_spf(spf)
+    estado_spf = evaluar_spf(spf, registros.spf_lookups)
     estado_dmarc = evaluar_dmarc(dmarc)
-    vendor_correo = detectar_vendor_correo(mx)
-    vendors_seguridad = detectar_vendors_seguridad(mx, spf)
-    vendors_envio = detectar_vendors_envio(spf)
+    vendor_correo = detectar_vendor_correo(mx, catalogo)
+    vendors_seguridad = detectar_vendors_seguridad(mx, spf_vendors, catalogo)
+    vendors_envio = detectar_vendors_envio(spf_vendors, catalogo)
     postura = calcular_postura_identidad(estado_spf, estado_dmarc, vendors_seguridad)
     
     return ResultadoIdentidad(
-        spf_raw=spf or "No encontrado",
+        spf_raw=_raw_o_motivo(spf, registros.estado_txt),
         estado_spf=estado_spf,
-        dmarc_raw=dmarc or "No encontrado",
+        dmarc_raw=_raw_o_motivo(dmarc, registros.estado_dmarc),
         estado_dmarc=estado_dmarc,
         vendor_correo=vendor_correo,
         vendors_seguridad=vendors_seguridad,
         vendors_envio=vendors_envio,
-        postura=postura
+        postura=postura,
+        dns_incompleto=registros.incompleto,
+        spf_lookups=registros.spf_lookups,
+        spf_incluidos=list(registros.spf_incluidos),
     )
 
 
@@ -330,47 +317,6 @@ def analizar_identidad(dominio: str) -> ResultadoIdentidad:
 # FUNCIONES HTTP (EXPOSICIÓN)
 # ============================================================================
 
-def hacer_request(dominio: str) -> Optional[requests.Response]:
-    headers = {'User-Agent': 'Mozilla/5.0 (compatible; SecurityAudit/1.0)'}
-    for proto in ["https", "http"]:
-        try:
-            return requests.get(
-                f"{proto}://{dominio}",
-                timeout=REQUEST_TIMEOUT,
-                headers=headers,
-                allow_redirects=True,
-                # Importante: si empezamos en http y redirige a https,
-                # requests hereda verify. Dejamos verify=True para evitar
-                # InsecureRequestWarning en redirects.
-                verify=True,
-            )
-        except Exception:
-            continue
-    return None
-
-
-def evaluar_https(dominio: str) -> EstadoHTTPS:
-    headers = {'User-Agent': 'Mozilla/5.0 (compatible; SecurityAudit/1.0)'}
-    https_ok = False
-    try:
-        requests.get(f"https://{dominio}", timeout=REQUEST_TIMEOUT, headers=headers, verify=True)
-        https_ok = True
-    except Exception:
-        pass
-    
-    if not https_ok:
-        return EstadoHTTPS.NO_DISPONIBLE
-    
-    try:
-        resp = requests.get(f"http://{dominio}", timeout=REQUEST_TIMEOUT, headers=headers, allow_redirects=True)
-        if resp.url.startswith("https://"):
-            return EstadoHTTPS.FORZADO
-    except Exception:
-        return EstadoHTTPS.FORZADO
-    
-    return EstadoHTTPS.DISPONIBLE
-
-
 def evaluar_hsts(headers: Dict) -> EstadoHeader:
     hsts = headers.get('Strict-Transport-Security', '')
     if not hsts:
@@ -394,13 +340,12 @@ def evaluar_xframe(headers: Dict) -> EstadoHeader:
     return EstadoHeader.PRESENTE if headers.get('X-Frame-Options') else EstadoHeader.AUSENTE
 
 
-def detectar_cdn_waf(headers: Dict) -> Optional[str]:
-    server = headers.get('Server', '').lower()
-    all_h = ' '.join(str(v) for v in headers.values()).lower()
-    
-    for patron, nombre in CDN_WAF_HEADERS.items():
-        if re.search(patron, server, re.IGNORECASE) or re.search(patron, all_h, re.IGNORECASE):
-            return nombre
+def detectar_cdn_waf(headers: Dict, catalogo: Optional[CatalogoVendors] = None) -> Optional[str]:
+    catalogo = catalogo or obtener_catalogo()
+    # El valor de Server ya está entre los headers: una sola pasada por todos
+    vendors = catalogo.cdn_waf.todos(str(v) for v in headers.values())
+    if vendors:
+        return vendors[0]
     
     if 'cf-ray' in headers:
         return "Cloudflare"
@@ -448,11 +393,21 @@ def calcular_postura_exposicion(
     return Postura.BASICA
 
 
-def analizar_exposicion(dominio: str) -> ResultadoExposicion:
-    https = evaluar_https(dominio)
-    resp = hacer_request(dominio)
+def analizar_exposicion(
+    dominio: str,
+    catalogo: Optional[CatalogoVendors] = None,
+    sonda: Optional[SondaHTTP] = None,
+    plazo: Optional[Plazo] = None,
+) -> ResultadoExposicion:
+    # Una sola traza http:// + https:// alimenta HTTPS, headers y detecciones.
+    # En lote la trae ya hecha el motor asíncrono (http_async)
+    if sonda is None:
+        sonda = sondear(dominio, plazo=plazo)
+    https = EstadoHTTPS(sonda.estado_https)
+    h = sonda.headers
+    tls = sonda.tls
     
-    if not resp:
+    if h is None:
         return ResultadoExposicion(
             https=https,
             hsts=EstadoHeader.AUSENTE,
@@ -461,14 +416,14 @@ def analizar_exposicion(dominio: str) -> ResultadoExposicion:
             cdn_waf=None,
             servidor=None,
             postura=Postura.BASICA,
-            error="No se pudo conectar"
+            error="No se pudo conectar",
+            tls=tls,
         )
     
-    h = dict(resp.headers)
     hsts = evaluar_hsts(h)
     csp = evaluar_csp(h)
     x_frame = evaluar_xframe(h)
-    cdn_waf = detectar_cdn_waf(h)
+    cdn_waf = detectar_cdn_waf(h, catalogo)
     servidor = detectar_servidor(h)
     postura = calcular_postura_exposicion(https, hsts, csp, x_frame, cdn_waf)
     
@@ -480,7 +435,8 @@ def analizar_exposicion(dominio: str) -> ResultadoExposicion:
         cdn_waf=cdn_waf,
         servidor=servidor,
         postura=postura,
-        error=None
+        error=None,
+        tls=tls,
     )
 
 
@@ -515,6 +471,13 @@ def generar_recomendaciones(resultado: 'ResultadoSuperficie') -> List[str]:
     # Exposición
     if resultado.exposicion.https != EstadoHTTPS.FORZADO:
         recs.append("Forzar el uso de HTTPS en todas las conexiones web.")
+
+    tls = resultado.exposicion.tls
+    if tls is not None and tls.por_vencer:
+        recs.append(f"Renovar el certificado TLS (vence en {tls.dias_para_vencer} días).")
+
+    if tls is not None and tls.protocolo_obsoleto:
+        recs.append(f"Deshabilitar {tls.protocolo}: versión de TLS obsoleta.")
     
     if resultado.exposicion.hsts != EstadoHeader.PRESENTE:
         recs.append("Habilitar HSTS para prevenir ataques de downgrade de protocolo.")
@@ -532,9 +495,16 @@ def generar_recomendaciones(resultado: 'ResultadoSuperficie') -> List[str]:
 # ANÁLISIS COMPLETO
 # ============================================================================
 
-def analizar_dominio(dominio: str) -> ResultadoSuperficie:
-    identidad = analizar_identidad(dominio)
-    exposicion = analizar_exposicion(dominio)
+def analizar_dominio(
+    dominio: str,
+    registros: Optional[RegistrosIdentidad] = None,
+    sonda: Optional[SondaHTTP] = None,
+    plazo: Optional[Plazo] = None,
+) -> ResultadoSuperficie:
+    # Una sola versión del catálogo para todo el dominio, aunque se recargue a mitad
+    catalogo = obtener_catalogo()
+    identidad = analizar_identidad(dominio, registros, catalogo, plazo)
+    exposicion = analizar_exposicion(dominio, catalogo, sonda, plazo)
     postura_general = calcular_postura_general(identidad.postura, exposicion.postura)
     
     resultado = ResultadoSuperficie(
@@ -542,7 +512,9 @@ def analizar_dominio(dominio: str) -> ResultadoSuperficie:
         identidad=identidad,
         exposicion=exposicion,
         postura_general=postura_general,
-        recomendaciones=[]
+        recomendaciones=[],
+        catalogo_version=catalogo.version,
+        etapas_parciales=list(plazo.cortes) if plazo is not None else [],
     )
     resultado.recomendaciones = generar_recomendaciones(resultado)
     
@@ -567,11 +539,14 @@ def resultado_a_ejecutivo(r: ResultadoSuperficie) -> Dict:
 
 
 def resultado_a_tecnico(r: ResultadoSuperficie) -> Dict:
+    tls = r.exposicion.tls
     return {
         "Dominio": r.dominio,
         # Identidad
         "SPF (Raw)": r.identidad.spf_raw,
         "Estado SPF": r.identidad.estado_spf.value,
+        "SPF Lookups": r.identidad.spf_lookups,
+        "SPF Includes": ", ".join(r.identidad.spf_incluidos) or "Ninguno",
         "DMARC (Raw)": r.identidad.dmarc_raw,
         "Estado DMARC": r.identidad.estado_dmarc.value,
         "Vendor Correo": r.identidad.vendor_correo or "No detectado",
@@ -585,9 +560,15 @@ def resultado_a_tecnico(r: ResultadoSuperficie) -> Dict:
         "X-Frame-Options": r.exposicion.x_frame.value,
         "CDN/WAF": r.exposicion.cdn_waf or "No detectado",
         "Servidor": r.exposicion.servidor or "No detectado",
+        "Versión TLS": tls.protocolo if tls and tls.protocolo else "N/D",
+        "Emisor Certificado": tls.emisor if tls and tls.emisor else "N/D",
+        "Vencimiento Certificado": tls.vence.date().isoformat() if tls and tls.vence else "N/D",
+        "Clave Certificado": tls.clave if tls and tls.clave else "N/D",
         "Postura Exposición": r.exposicion.postura.value,
         # General
-        "Superficie Digital": r.postura_general.value
+        "Superficie Digital": r.postura_general.value,
+        "Versión Catálogo": r.catalogo_version,
+        "Etapas Parciales": ", ".join(r.etapas_parciales) or "Ninguna",
     }
 
 
@@ -598,7 +579,8 @@ def resultado_a_tecnico(r: ResultadoSuperficie) -> Dict:
 def validar_email(email: str) -> bool:
     if not isinstance(email, str):
         return False
-    return bool(re.match(r'^[\w\.\-\+]+@[a-zA-Z\d\.\-]+\.[a-zA-Z]{2,}$', email))
+    # \w acepta dominios Unicode (IDN); el TLD puede venir ya en punycode (xn--)
+    return bool(re.match(r'^[\w\.\-\+]+@[\w\.\-]+\.(?:[^\W\d_]{2,}|xn--[a-z\d\-]+)$', email))
 
 
 def extraer_dominio(url_o_email: str) -> str:
@@ -608,26 +590,26 @@ def extraer_dominio(url_o_email: str) -> str:
     
     url_o_email = url_o_email.strip().lower()
     
+    # Siempre se devuelve el dominio registrable (eTLD+1, punycode):
+    # mail.empresa.com.mx y ventas.empresa.com.mx son el mismo prospecto.
+
     # Si es email
     if "@" in url_o_email and validar_email(url_o_email):
-        return url_o_email.split("@")[-1]
+        return dominio_registrable(url_o_email.split("@")[-1])
     
     # Si es URL
     if url_o_email.startswith(("http://", "https://")):
         try:
-            from urllib.parse import urlparse
             parsed = urlparse(url_o_email)
-            return parsed.netloc.replace("www.", "")
+            return dominio_registrable(parsed.hostname or "")
         except:
             pass
     
     # Si es dominio directo (ej: empresa.com)
     if "." in url_o_email and not " " in url_o_email:
-        # Limpiar www. si existe
-        dominio = url_o_email.replace("www.", "")
-        # Limpiar trailing slash
-        dominio = dominio.rstrip("/")
-        return dominio
+        # Limpiar ruta y trailing slash (empresa.com/contacto)
+        dominio = url_o_email.split("/")[0]
+        return dominio_registrable(dominio)
     
     return ""
 
@@ -770,21 +752,14 @@ def ingesta_archivo(archivo) -> List[str]:
     return salida
 
 
-@lru_cache(maxsize=512)
 def obtener_fecha_creacion_dominio(dominio: str) -> Optional[datetime]:
+    """Fecha de creación vía RDAP; WHOIS solo para TLDs sin servidor RDAP (rdap_cliente)."""
     try:
-        # python-whois puede imprimir errores de socket a stdout/stderr.
-        # Silenciamos para no ensuciar logs/UI.
-        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
-            w = whois.whois(dominio)
-        created = w.creation_date
-        if isinstance(created, list):
-            created = min([d for d in created if isinstance(d, datetime)], default=None)
-        if isinstance(created, datetime):
-            return created
+        return fecha_creacion_dominio(dominio)
+    except (WhoisLimitado, requests.RequestException, OSError):
+        raise  # fecha_creacion_con_plazo marca la etapa como parcial
     except Exception:
         return None
-    return None
 
 
 def calcular_score_seguridad(row) -> int:
@@ -907,8 +882,23 @@ def map_header_bool(estado: EstadoHeader) -> bool:
     return estado == EstadoHeader.PRESENTE
 
 
-def resultado_a_df_resultados(r: ResultadoSuperficie) -> Dict:
-    created = obtener_fecha_creacion_dominio(r.dominio)
+def fecha_creacion_con_plazo(dominio: str, plazo: Optional[Plazo] = None) -> Optional[datetime]:
+    # RDAP/WHOIS no tienen timeout total: se espera el timeout adaptativo (el de
+    # RDAP o el de WHOIS según el TLD), acotado a lo que quede del plazo
+    plazo = plazo if plazo is not None else Plazo()
+    adaptativo = TIMEOUT_RDAP if servidor_rdap(dominio) else TIMEOUT_WHOIS
+    try:
+        return ejecutar_con_plazo(
+            plazo, ETAPA_WHOIS, obtener_fecha_creacion_dominio, dominio, adaptativo=adaptativo
+        )
+    except (WhoisLimitado, requests.RequestException, OSError):
+        # El registro nos frenó o la red/servidor falló: resultado parcial (no
+        # se cachea en Neon) y se reintenta en la próxima carga
+        plazo.cortar(ETAPA_WHOIS)
+        return None
+
+
+def fila_df_resultados(r: ResultadoSuperficie, created: Optional[datetime]) -> Dict:
     fecha = created.date().isoformat() if created else "N/D"
 
     row_data = {
@@ -929,12 +919,229 @@ def resultado_a_df_resultados(r: ResultadoSuperficie) -> Dict:
         "csp": map_header_bool(r.exposicion.csp),
         # Contexto
         "dominio_antiguedad": fecha,
+        "estado_dominio": ESTADO_DOMINIO_ACTIVO,
+        "catalogo_version": r.catalogo_version,
     }
     # Calcular score
     row_data["score"] = calcular_score_seguridad(row_data)
     return row_data
 
 
+def _analizar_carril_lento(
+    dominio: str, plazo: Plazo, fecha: Optional[datetime] = None
+) -> Tuple[ResultadoSuperficie, Dict, Optional[datetime]]:
+    """
+    Reintento completo de un dominio con los timeouts fijos (DNS cacheado no
+    se repite). Con `fecha` (guardada en Neon o ya obtenida) no se vuelve a
+    consultar RDAP/WHOIS. Retorna (resultado, fila, fecha de creación).
+    """
+    plazo.pasar_a_carril_lento()
+    r = analizar_dominio(dominio, plazo=plazo)
+    if fecha is None:
+        fecha = fecha_creacion_con_plazo(dominio, plazo)
+    if plazo.parcial:
+        r.etapas_parciales = list(plazo.cortes)
+    return r, fila_df_resultados(r, fecha), fecha
+
+
+def _fila_sin_analisis(dominio: str, estado_dominio: str) -> Dict:
+    return {
+        "dominio": dominio,
+        "score": 0,
+        "postura_identidad": "N/D",
+        "postura_exposicion": "N/D",
+        "postura_general": "N/D",
+        "correo_proveedor": "N/D",
+        "correo_gateway": "None",
+        "correo_envio": "None",
+        "spf_estado": "Ausente",
+        "dmarc_estado": "Ausente",
+        "https_estado": "Ausente",
+        "cdn_waf": "None",
+        "hsts": False,
+        "csp": False,
+        "dominio_antiguedad": "N/D",
+        "estado_dominio": estado_dominio,
+        "catalogo_version": obtener_catalogo().version,
+    }
+
+
+def fila_dominio_inexistente(dominio: str) -> Dict:
+    """Fila df_resultados para un dominio que no existe en DNS (sin HTTP ni WHOIS)."""
+    return _fila_sin_analisis(dominio, ESTADO_DOMINIO_INEXISTENTE)
+
+
+def fila_dominio_error(dominio: str) -> Dict:
+    """Fila df_resultados para un dominio cuyo análisis falló (el detalle va en resumen.errores)."""
+    return _fila_sin_analisis(dominio, ESTADO_DOMINIO_ERROR)
+
+
+def separar_inexistentes(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Retorna (activos, inexistentes). Filas antiguas sin la columna cuentan
+    como activas; las de error no están en ninguno de los dos (no entran en
+    métricas y ya se avisaron con el resumen del escaneo).
+    """
+    if df.empty or "estado_dominio" not in df.columns:
+        return df, df.iloc[0:0]
+    inexistente = df["estado_dominio"] == ESTADO_DOMINIO_INEXISTENTE
+    error = df["estado_dominio"] == ESTADO_DOMINIO_ERROR
+    return df[~inexistente & ~error], df[inexistente]
+
+
+# ============================================================================
+# PIPELINE POR ETAPAS
+# ============================================================================
+
+@dataclass
+class SalidaDominio:
+    """Lo que entrega el pipeline por dominio (fila lista para df_resultados)."""
+    dominio: str
+    fila: Optional[Dict] = None
+    resultado: Optional[ResultadoSuperficie] = None  # None: dominio inexistente o error
+    fecha: Optional[datetime] = None
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class _DominioEnCurso:
+    """Un dominio vivo mientras DNS, HTTP y antigüedad corren en paralelo."""
+    dominio: str
+    plazo: Plazo
+    registros: Optional[RegistrosIdentidad] = None
+    sonda: Optional[SondaHTTP] = None
+    fecha: Optional[datetime] = None
+    faltan: int = 3
+
+
+def crear_pipeline_superficie(
+    plazos: Dict[str, Plazo],
+    fechas_guardadas: Optional[Dict[str, datetime]] = None,
+) -> Tuple[Pipeline, EtapaAsync]:
+    """
+    existencia -> (DNS | HTTP | antigüedad) -> puntuación. Retorna el pipeline
+    y su etapa de entrada (recibe dominios). Los inexistentes salen directo
+    con su fila; los vivos entran a puntuación en cuanto sus tres etapas
+    terminaron. Si DNS o HTTP fallan, analizar_dominio consulta por su cuenta.
+    """
+    fechas_guardadas = fechas_guardadas or {}
+    pipeline = Pipeline()
+    lock = threading.Lock()
+
+    # Puntuación: análisis + fila df_resultados (sin red salvo fallbacks)
+    def puntuar(en_curso: _DominioEnCurso) -> Tuple[ResultadoSuperficie, Dict]:
+        r = analizar_dominio(en_curso.dominio, en_curso.registros, en_curso.sonda, en_curso.plazo)
+        return r, fila_df_resultados(r, en_curso.fecha)
+
+    def al_puntuar(en_curso: _DominioEnCurso, resultado, error):
+        r, fila = resultado if resultado is not None else (None, None)
+        pipeline.emitir(SalidaDominio(en_curso.dominio, fila, r, en_curso.fecha, error))
+
+    puntuacion = EtapaHilos("Puntuación", puntuar, al_puntuar, ETAPA_PUNTUACION_CONCURRENCIA)
+
+    def completar(campo: str):
+        def destino(en_curso: _DominioEnCurso, valor, error):
+            setattr(en_curso, campo, valor if error is None else None)
+            with lock:
+                en_curso.faltan -= 1
+                listo = en_curso.faltan == 0
+            if listo:
+                puntuacion.poner(en_curso)
+        return destino
+
+    # DNS de identidad + includes SPF (el expansor se comparte en todo el lote)
+    @contextlib.asynccontextmanager
+    async def abrir_dns():
+        async with resolvedor_identidad() as resolver:
+            expansor = ExpansorSPF()
+
+            async def identidad(en_curso: _DominioEnCurso) -> RegistrosIdentidad:
+                registros = await resolver(en_curso.dominio, en_curso.plazo)
+                try:
+                    await expandir_spf_registros(expansor, en_curso.dominio, registros)
+                except Exception:
+                    pass
+                return registros
+
+            yield identidad
+
+    dns = EtapaAsync("DNS", abrir_dns, completar("registros"), ETAPA_DNS_CONCURRENCIA)
+
+    if HTTP_ASYNC_DISPONIBLE:
+        @contextlib.asynccontextmanager
+        async def abrir_http():
+            async with sondeador() as sondear_async:
+                async def sonda(en_curso: _DominioEnCurso) -> SondaHTTP:
+                    return await sondear_async(en_curso.dominio, en_curso.plazo)
+
+                yield sonda
+
+        http = EtapaAsync("HTTP", abrir_http, completar("sonda"), HTTP_CONCURRENCIA_ASYNC)
+    else:  # Sin httpx: hilos con requests
+        http = EtapaHilos(
+            "HTTP", lambda e: sondear(e.dominio, plazo=e.plazo), completar("sonda"), MAX_WORKERS
+        )
+
+    def antiguedad(en_curso: _DominioEnCurso) -> Optional[datetime]:
+        if en_curso.dominio in fechas_guardadas:
+            return fechas_guardadas[en_curso.dominio]
+        return fecha_creacion_con_plazo(en_curso.dominio, en_curso.plazo)
+
+    edad = EtapaHilos("Antigüedad", antiguedad, completar("fecha"), WHOIS_CONCURRENCIA)
+
+    # Existencia (SOA/A/AAAA/MX): los inexistentes no pasan por HTTP ni WHOIS
+    @contextlib.asynccontextmanager
+    async def abrir_existencia():
+        async with verificador_existencia() as verificar:
+            async def existe(dominio: str) -> bool:
+                return await verificar(dominio, plazos.get(dominio))
+
+            yield existe
+
+    def al_verificar(dominio: str, existe, error):
+        # Ante la duda (error), el dominio pasa a análisis completo
+        if error is None and existe is False:
+            pipeline.emitir(SalidaDominio(dominio, fila_dominio_inexistente(dominio)))
+            return
+        en_curso = _DominioEnCurso(dominio, plazos.setdefault(dominio, Plazo()))
+        dns.poner(en_curso)
+        # HTTP y antigüedad con cola llena no frenan a existencia ni al DNS
+        edad.encargar(en_curso)
+        http.encargar(en_curso)
+
+    existencia = EtapaAsync(
+        "Existencia", abrir_existencia, al_verificar, ETAPA_EXISTENCIA_CONCURRENCIA
+    )
+
+    pipeline.agregar(existencia)
+    for etapa in (dns, http, edad):
+        pipeline.agregar(etapa, previas=[existencia])
+    pipeline.agregar(puntuacion, previas=[dns, http, edad])
+    return pipeline, existencia
+
+
+def resumen_timeouts() -> str:
+    """ "⏱️ DNS 0.6 s · Primer byte 2.5 s (3 al carril lento)": timeouts adaptativos con muestras."""
+    partes = []
+    for e in estadisticas_timeouts().values():
+        if not e["muestras"]:
+            continue
+        texto = f"{e['etapa']} {e['timeout']:.1f} s"
+        if e["vencidos"]:
+            texto += f" ({e['vencidos']} al carril lento)"
+        partes.append(texto)
+    return "⏱️ " + " · ".join(partes) if partes else ""
+
+
+def resumen_etapas(pipeline: Pipeline) -> str:
+    """ "DNS 120/400 · HTTP 80/400 · ..." (y resumen_timeouts) para el caption de progreso."""
+    etapas = " · ".join(
+        f"{e['etapa']} {e['procesados']}/{e['recibidos']}" for e in pipeline.estadisticas()
+    )
+    timeouts = resumen_timeouts()
+    return f"{etapas} | {timeouts}" if timeouts else etapas
+
+
 DF_RESULT_COLUMNS = [
     "dominio",
     "score",
@@ -951,70 +1158,478 @@ DF_RESULT_COLUMNS = [
     "hsts",
     "csp",
     "dominio_antiguedad",
+    "estado_dominio",
+    "catalogo_version",
 ]
 
 
-def analizar_dominios(dominios: List[str]) -> pd.DataFrame:
+@dataclass
+class ResumenEscaneo:
+    """Estado de un escaneo en curso; escanear_dominios lo actualiza en cada fila."""
+    total: int = 0
+    desde_cache: int = 0
+    reanudados: int = 0  # filas del checkpoint de un escaneo anterior
+    pendientes: int = 0
+    completados: int = 0  # nuevos ya entregados (de `pendientes`)
+    inexistentes: List[str] = field(default_factory=list)
+    incompletos: Set[str] = field(default_factory=set)  # DNS sin respuesta
+    parciales: Set[str] = field(default_factory=set)  # plazo agotado o WHOIS limitado
+    errores: Dict[str, str] = field(default_factory=dict)
+    etapas: str = ""  # resumen_etapas() del pipeline
+    lentos: int = 0  # en el carril lento
+
+
+@dataclass
+class Escaneo:
+    """Escaneo de un archivo: run_id, manifiesto y filas del último checkpoint."""
+    run_id: str
+    hash_archivo: str
+    dominios: List[str]  # manifiesto: la lista de dominios con que se creó
+    hechos: List[Dict] = field(default_factory=list)
+    dueno: Optional[str] = None  # quien lo reclamó en Neon (None: un trabajador que lo sigue)
+
+
+def hash_archivo(contenido: bytes) -> str:
+    """Identidad de un archivo subido: el mismo contenido reanuda el mismo escaneo."""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def abrir_escaneo(hash_contenido: str, dominios: List[str], dueno: Optional[str] = None) -> Optional[Escaneo]:
+    """
+    Reanuda el último escaneo sin terminar del mismo archivo (con su
+    manifiesto y checkpoint) o registra uno nuevo. None sin Neon.
+    `dueno` identifica a la sesión: un escaneo que otra sesión está
+    corriendo no se reanuda aquí (se registra uno nuevo).
+    """
+    if not CACHE_AVAILABLE or not dominios:
+        return None
+    dueno = dueno or uuid.uuid4().hex
+    try:
+        previo = buscar_escaneo_pendiente(hash_contenido, dueno)
+        if previo:
+            run_id, manifiesto = previo
+            return Escaneo(run_id, hash_contenido, manifiesto, get_checkpoint(run_id), dueno)
+        run_id = uuid.uuid4().hex
+        if crear_escaneo(run_id, hash_contenido, dominios, dueno):
+            return Escaneo(run_id, hash_contenido, list(dominios), dueno=dueno)
+    except Exception:
+        pass  # Sin checkpoints: el escaneo corre igual
+    return None
+
+
+def _guardar_lote(
+    filas: List[Dict],
+    fechas: Dict[str, datetime],
+    escaneo: Optional[Escaneo] = None,
+    checkpoint: Optional[List[Dict]] = None,
+):
+    """Escritura incremental a Neon: un fallo no detiene el escaneo."""
+    if not CACHE_AVAILABLE:
+        return
+    try:
+        if filas:
+            save_to_cache(pd.DataFrame(filas))
+        if fechas:
+            save_fechas_creacion(fechas)
+        # El checkpoint va después: lo que marca como hecho ya está en el cache
+        if escaneo is not None and checkpoint:
+            save_checkpoint(escaneo.run_id, checkpoint)
+    except Exception:
+        pass
+
+
+def escanear_dominios(
+    dominios: List[str],
+    plazo_segundos: float = PLAZO_DOMINIO_SEGUNDOS,
+    resumen: Optional[ResumenEscaneo] = None,
+    al_esperar: Optional[Callable[[ResumenEscaneo], None]] = None,
+    guardar_cada: int = CACHE_LOTE_FILAS,
+    escaneo: Optional[Escaneo] = None,
+) -> Iterator[Dict]:
+    """
+    Genera cada fila df_resultados en cuanto está lista: primero las del
+    checkpoint (si `escaneo` se reanuda) y las del cache, luego las nuevas
+    según salen del pipeline y al final las del carril lento. Un dominio
+    cuyo análisis falla sale con fila_dominio_error (ni cache ni checkpoint:
+    se reintenta en la próxima carga). Con
+    contrapresión: si quien consume se atrasa, el pipeline se detiene al
+    llenarse su cola de salida. Las filas completas se escriben a Neon de a
+    `guardar_cada`; con `escaneo`, todas las filas nuevas (también las
+    parciales) quedan además en su checkpoint, así que un reinicio a mitad
+    no vuelve a sondear lo ya terminado.
+    `al_esperar(resumen)` se llama cada ~0.5 s sin filas nuevas, en el hilo
+    que consume (sirve para refrescar la UI).
+    """
+    resumen = resumen if resumen is not None else ResumenEscaneo()
+    resumen.total = len(dominios)
     if not dominios:
-        return pd.DataFrame(columns=DF_RESULT_COLUMNS)
+        return
 
-    # 1) Intentar obtener del cache
-    df_cached = pd.DataFrame(columns=DF_RESULT_COLUMNS)
+    # 0) Checkpoint de un escaneo interrumpido del mismo archivo
     pendientes = list(dominios)
-
-    if CACHE_AVAILABLE:
+    if escaneo is not None and escaneo.hechos:
+        hechos = {f["dominio"] for f in escaneo.hechos}
+        resumen.reanudados = len(hechos)
+        yield from escaneo.hechos
+        pendientes = [d for d in pendientes if d not in hechos]
+
+    # 1) Cache: sin re-análisis
+    if CACHE_AVAILABLE and pendientes:
         try:
-            df_cached, pendientes = get_cached_dominios(dominios)
-            if not df_cached.empty:
-                st.success(f"✅ {len(df_cached)} dominios desde cache (sin re-análisis)")
+            df_cached, pendientes = get_cached_dominios(pendientes, obtener_catalogo().version)
+            resumen.desde_cache = len(df_cached)
+            yield from df_cached.to_dict("records")
         except Exception:
             pass  # Continuar sin cache
+    resumen.pendientes = len(pendientes)
 
-    # 2) Analizar solo los pendientes
-    df_nuevos = pd.DataFrame(columns=DF_RESULT_COLUMNS)
-    if pendientes:
-        if CACHE_AVAILABLE and not df_cached.empty:
-            st.info(f"🔍 Analizando {len(pendientes)} dominios nuevos...")
-
-        progreso = st.progress(0)
-        estado = st.empty()
-        total_pendientes = len(pendientes)
-        completados = 0
-
-        resultados: List[ResultadoSuperficie] = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futuros = {executor.submit(analizar_dominio, d): d for d in pendientes}
-            for futuro in concurrent.futures.as_completed(futuros):
-                completados += 1
-                dom = futuros[futuro]
-                estado.text(f"Analizando: {dom} ({completados}/{total_pendientes})")
-                progreso.progress(min(completados / max(total_pendientes, 1), 1.0))
-                try:
-                    resultados.append(futuro.result())
-                except Exception as e:
-                    st.warning(f"Fallo analizando {dom}: {e}")
+    # 2) Pipeline de los pendientes; un plazo por dominio para todas sus etapas
+    plazos = {d: Plazo(plazo_segundos) for d in pendientes}
+    fechas_guardadas: Dict[str, datetime] = {}
+    if CACHE_AVAILABLE and pendientes:
+        try:
+            fechas_guardadas = get_fechas_creacion(pendientes)
+        except Exception:
+            pass
+
+    por_guardar: List[Dict] = []
+    fechas_nuevas: Dict[str, datetime] = {}
+    por_checkpoint: List[Dict] = []
+    ultimo_volcado = time.monotonic()
+
+    def volcar(forzar: bool = False):
+        nonlocal ultimo_volcado
+        if not (por_guardar or fechas_nuevas or por_checkpoint):
+            return
+        if not forzar and len(por_checkpoint) < guardar_cada and len(por_guardar) < guardar_cada:
+            if escaneo is None or time.monotonic() - ultimo_volcado < CHECKPOINT_SEGUNDOS:
+                return
+        _guardar_lote(por_guardar, fechas_nuevas, escaneo, por_checkpoint)
+        por_guardar.clear()
+        fechas_nuevas.clear()
+        por_checkpoint.clear()
+        ultimo_volcado = time.monotonic()
+
+    def entregar(r: Optional[ResultadoSuperficie], fila: Dict, fecha: Optional[datetime]) -> Dict:
+        resumen.completados += 1
+        dominio = fila["dominio"]
+        if r is not None and r.identidad.dns_incompleto:
+            resumen.incompletos.add(dominio)
+        if r is not None and r.parcial:
+            resumen.parciales.add(dominio)
+        if dominio in resumen.errores:
+            return fila  # Solo se muestra: la próxima carga lo vuelve a analizar
+        # Incompletos y parciales se muestran, pero no se cachean: la próxima
+        # carga los vuelve a consultar
+        if dominio not in resumen.incompletos and dominio not in resumen.parciales:
+            por_guardar.append(fila)
+        if escaneo is not None:
+            por_checkpoint.append(fila)
+        if fecha and dominio not in fechas_guardadas:
+            fechas_nuevas[dominio] = fecha
+        volcar()
+        return fila
+
+    lentos: Dict[str, Tuple[ResultadoSuperficie, Dict, Optional[datetime]]] = {}
+    salidas: Optional[Iterator[Optional[SalidaDominio]]] = None
+    executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    try:
+        if pendientes:
+            pipeline, entrada = crear_pipeline_superficie(plazos, fechas_guardadas)
+            salidas = pipeline.ejecutar(pendientes, entrada, intervalo=0.5)
+            for salida in salidas:
+                resumen.etapas = resumen_etapas(pipeline)
+                if salida is None:
+                    volcar()
+                    if al_esperar is not None:
+                        al_esperar(resumen)
+                    continue
+                if salida.error is not None:
+                    resumen.errores[salida.dominio] = str(salida.error)
+                    yield entregar(None, fila_dominio_error(salida.dominio), None)
+                    continue
+                if salida.resultado is None:
+                    resumen.inexistentes.append(salida.dominio)
+                    yield entregar(None, salida.fila, None)
+                    continue
+                plazo = plazos[salida.dominio]
+                if plazo.lentos and not plazo.agotado:
+                    # Se entrega tras el carril lento (o con este resultado si falla)
+                    lentos[salida.dominio] = (salida.resultado, salida.fila, salida.fecha)
+                    resumen.lentos = len(lentos)
                     continue
+                yield entregar(salida.resultado, salida.fila, salida.fecha)
+
+        # 3) Carril lento: lo que venció un timeout adaptativo se reintenta al
+        # final con los timeouts fijos, si al dominio le queda plazo
+        if lentos:
+            # Sin `with`: cerrar el generador no debe esperar a los reintentos en vuelo
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
+            futuros = {
+                # La fecha ya conocida (Neon o primer intento) no se vuelve a consultar
+                executor.submit(
+                    _analizar_carril_lento, d, plazos[d], fechas_guardadas.get(d) or lentos[d][2]
+                ): d
+                for d in lentos
+            }
+            pendientes_lentos = set(futuros)
+            while pendientes_lentos:
+                listos, pendientes_lentos = concurrent.futures.wait(
+                    pendientes_lentos, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                if not listos and al_esperar is not None:
+                    al_esperar(resumen)
+                for futuro in listos:
+                    dom = futuros[futuro]
+                    r, fila, fecha = lentos[dom]
+                    try:
+                        r, fila, fecha = futuro.result()
+                    except Exception:
+                        pass  # Se queda el resultado del primer intento
+                    resumen.lentos -= 1
+                    yield entregar(r, fila, fecha)
+            executor.shutdown(wait=False)
+    except BaseException:
+        # Corte a mitad (generador cerrado, rerun de Streamlit, paso a segundo
+        # plano): el pipeline deja de alimentarse, los reintentos del carril
+        # lento que no empezaron se cancelan y lo ya entregado queda en el
+        # cache y en el checkpoint
+        if salidas is not None:
+            salidas.close()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        volcar(forzar=True)
+        if escaneo is not None and escaneo.dueno is not None:
+            # Libre para que otra sesión (o esta tras recargar) lo reanude
+            try:
+                liberar_escaneo(escaneo.run_id, escaneo.dueno)
+            except Exception:
+                pass
+        raise
 
-        estado.text("✅ Diagnóstico completado")
-        progreso.progress(1.0)
+    volcar(forzar=True)
+    # Solo al terminar de verdad: si el script se corta, el checkpoint queda
+    if escaneo is not None:
+        try:
+            terminar_escaneo(escaneo.run_id)
+        except Exception:
+            pass
 
-        if resultados:
-            df_nuevos = pd.DataFrame([resultado_a_df_resultados(r) for r in resultados])
 
-            # 3) Guardar nuevos en cache
-            if CACHE_AVAILABLE and not df_nuevos.empty:
-                try:
-                    save_to_cache(df_nuevos)
-                except Exception:
-                    pass  # No bloquear si falla el cache
+def _vista_parcial(contenedor, filas: List[Dict]):
+    """Resumen en vivo del escaneo: métricas de vista_global y las últimas filas."""
+    df_parcial, _ = separar_inexistentes(pd.DataFrame(filas))
+    with contenedor.container():
+        if df_parcial.empty:
+            return
+        vista_global(df_parcial)
+        st.dataframe(
+            df_parcial.tail(20)[["dominio", "score", "postura_general", "correo_proveedor", "cdn_waf"]],
+            use_container_width=True,
+            hide_index=True,
+        )
+
 
-    # 4) Combinar cached + nuevos
-    df_resultados = pd.concat([df_cached, df_nuevos], ignore_index=True)
+class _PasarASegundoPlano(Exception):
+    """El escaneo pasó UMBRAL_INTERACTIVO_SEGUNDOS y hay trabajadores para seguirlo."""
+
+
+@st.cache_resource
+def cola_trabajos() -> Optional[ColaTrabajos]:
+    """Cola de trabajos del proceso; None si no se puede abrir el SQLite (disco de solo lectura)."""
+    try:
+        return ColaTrabajos()
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def _avisos_escaneo(
+    plazo_segundos: float,
+    reanudados: int = 0,
+    desde_cache: int = 0,
+    errores: Optional[Dict[str, str]] = None,
+    inexistentes: int = 0,
+    incompletos: int = 0,
+    parciales: int = 0,
+):
+    if reanudados:
+        st.success(f"♻️ {reanudados} dominios reanudados del escaneo interrumpido (sin re-análisis)")
+    if desde_cache:
+        st.success(f"✅ {desde_cache} dominios desde cache (sin re-análisis)")
+    for dominio, error in (errores or {}).items():
+        st.warning(f"Fallo analizando {dominio}: {error}")
+    if inexistentes:
+        st.info(f"🪦 {inexistentes} dominios inexistentes (sin análisis web ni WHOIS)")
+    if incompletos:
+        st.info(f"⏱️ {incompletos} dominios con DNS sin respuesta; se re-analizarán en la próxima carga")
+    if parciales:
+        st.info(
+            f"⌛ {parciales} dominios con resultado parcial (plazo de "
+            f"{plazo_segundos:g} s agotado o WHOIS limitado); se re-analizarán en la próxima carga"
+        )
+
+
+def _df_desde_filas(filas: List[Dict]) -> pd.DataFrame:
+    df_resultados = pd.DataFrame(filas) if filas else pd.DataFrame(columns=DF_RESULT_COLUMNS)
     if not df_resultados.empty:
         df_resultados = df_resultados.sort_values("dominio").reset_index(drop=True)
     return df_resultados
 
 
+def repartir_para_trabajador(dominios: List[str], filas: List[Dict]) -> Tuple[List[str], List[Dict]]:
+    """
+    Al pasar a segundo plano: dominios que faltan y filas que el trabajo
+    recibe como hechas. Las filas de error no cuentan como hechas: el
+    trabajador vuelve a analizar esos dominios.
+    """
+    hechas = [f for f in filas if f.get("estado_dominio") != ESTADO_DOMINIO_ERROR]
+    hechos = {f["dominio"] for f in hechas}
+    return [d for d in dominios if d not in hechos], hechas
+
+
+def analizar_dominios(
+    dominios: List[str],
+    plazo_segundos: float = PLAZO_DOMINIO_SEGUNDOS,
+    escaneo: Optional[Escaneo] = None,
+    en_segundo_plano: bool = False,
+) -> Optional[pd.DataFrame]:
+    """
+    plazo_segundos: tiempo máximo por dominio en DNS + HTTP + WHOIS (0 = sin límite).
+    escaneo: escaneo de archivo con checkpoint (abrir_escaneo); reanuda lo hecho.
+    en_segundo_plano: si el escaneo pasa UMBRAL_INTERACTIVO_SEGUNDOS, lo que
+    falta se encola para un trabajador; retorna None y deja el id del trabajo
+    en st.session_state["trabajo_id"] (seguir_trabajo muestra el progreso).
+    Consume escanear_dominios mostrando progreso y un resumen parcial que se
+    refresca como mucho cada UI_REFRESCO_SEGUNDOS.
+    """
+    if not dominios:
+        return pd.DataFrame(columns=DF_RESULT_COLUMNS)
+
+    resumen = ResumenEscaneo()
+    progreso = st.progress(0)
+    estado = st.empty()
+    estado_etapas = st.empty()
+    contenedor_parcial = st.empty()
+    filas: List[Dict] = []
+    ultimo_refresco = 0.0
+    inicio = time.monotonic()
+    cola = cola_trabajos() if en_segundo_plano and UMBRAL_INTERACTIVO_SEGUNDOS > 0 else None
+
+    def refrescar(dominio: Optional[str] = None):
+        nonlocal ultimo_refresco, cola
+        if resumen.pendientes:
+            hechos = resumen.completados
+            estado.text(
+                f"Analizando: {dominio} ({hechos}/{resumen.pendientes})" if dominio
+                else f"Analizando {resumen.pendientes} dominios ({hechos} listos)"
+            )
+            progreso.progress(min(hechos / max(resumen.pendientes, 1), 1.0))
+        texto_etapas = resumen.etapas
+        if resumen.lentos:
+            texto_etapas += f" · 🐢 carril lento: {resumen.lentos}"
+        estado_etapas.caption(texto_etapas)
+        ahora = time.monotonic()
+        if len(dominios) > 1 and ahora - ultimo_refresco >= UI_REFRESCO_SEGUNDOS:
+            ultimo_refresco = ahora
+            _vista_parcial(contenedor_parcial, filas)
+        if cola is not None and ahora - inicio > UMBRAL_INTERACTIVO_SEGUNDOS:
+            if asegurar_trabajadores(cola):
+                raise _PasarASegundoPlano()
+            cola = None  # Sin trabajadores: se termina en la sesión
+
+    filas_escaneo = escanear_dominios(
+        dominios, plazo_segundos, resumen, al_esperar=lambda _: refrescar(), escaneo=escaneo
+    )
+    try:
+        for fila in filas_escaneo:
+            filas.append(fila)
+            refrescar(fila["dominio"])
+    except _PasarASegundoPlano:
+        # Lo entregado ya quedó en cache/checkpoint; el resto sigue en un trabajador
+        filas_escaneo.close()
+        faltan, hechas = repartir_para_trabajador(dominios, filas)
+        st.session_state["trabajo_id"] = cola.encolar(
+            faltan,
+            plazo_segundos,
+            total=len(dominios),
+            hash_archivo=escaneo.hash_archivo if escaneo else None,
+            run_id=escaneo.run_id if escaneo else None,
+            filas_hechas=hechas,
+        )
+        for elemento in (progreso, estado, estado_etapas, contenedor_parcial):
+            elemento.empty()
+        return None
+
+    contenedor_parcial.empty()
+    estado.text("✅ Diagnóstico completado")
+    progreso.progress(1.0)
+
+    _avisos_escaneo(
+        plazo_segundos,
+        reanudados=resumen.reanudados,
+        desde_cache=resumen.desde_cache,
+        errores=resumen.errores,
+        inexistentes=len(resumen.inexistentes),
+        incompletos=len(resumen.incompletos),
+        parciales=len(resumen.parciales),
+    )
+    return _df_desde_filas(filas)
+
+
+def seguir_trabajo(trabajo_id: str) -> Optional[pd.DataFrame]:
+    """
+    Muestra el progreso y las filas parciales de un trabajo en segundo plano
+    hasta que termina. El escaneo no depende de esta sesión: un rerun o una
+    recarga solo vuelve a empezar la consulta de progreso.
+    Retorna df_resultados; None si el trabajo no existe.
+    """
+    cola = cola_trabajos()
+    trabajo = cola.trabajo(trabajo_id) if cola is not None else None
+    if trabajo is None:
+        return None
+
+    st.info("🛰️ El escaneo sigue en segundo plano: puedes recargar la página o volver a subir el mismo archivo más tarde")
+    progreso = st.progress(0)
+    estado = st.empty()
+    estado_etapas = st.empty()
+    contenedor_parcial = st.empty()
+    filas: List[Dict] = []
+    desde = 0
+    while True:
+        info = cola.estado(trabajo_id)
+        nuevas, desde = cola.filas(trabajo_id, desde)
+        filas.extend(nuevas)
+        progreso.progress(min(info["hechos"] / max(info["total"], 1), 1.0))
+        estado.text(f"En segundo plano: {info['hechos']}/{info['total']} dominios")
+        estado_etapas.caption(info["resumen"].get("etapas", ""))
+        if info["estado"] in (TERMINADO, FALLIDO):
+            break
+        if nuevas:
+            _vista_parcial(contenedor_parcial, filas)
+        if requiere_trabajador(info):
+            # El trabajador pudo haber terminado por ocioso o morir con el trabajo tomado
+            asegurar_trabajadores(cola)
+        time.sleep(TRABAJO_SONDEO_SEGUNDOS)
+
+    contenedor_parcial.empty()
+    if info["estado"] == FALLIDO:
+        st.error(f"El escaneo en segundo plano falló: {info['error']}")
+    else:
+        estado.text("✅ Diagnóstico completado")
+        progreso.progress(1.0)
+    resumen = info["resumen"]
+    _avisos_escaneo(
+        trabajo.plazo,
+        reanudados=resumen.get("reanudados", 0),
+        desde_cache=resumen.get("desde_cache", 0),
+        errores=resumen.get("errores"),
+        inexistentes=resumen.get("inexistentes", 0),
+        incompletos=resumen.get("incompletos", 0),
+        parciales=resumen.get("parciales", 0),
+    )
+    return _df_desde_filas(filas)
+
+
 def generar_graficos_cache(df: pd.DataFrame):
     """Genera gráficos de valor para el dashboard de cache."""
     if df.empty:
@@ -1437,9 +2052,17 @@ def vista_dominio(df: pd.DataFrame):
             st.write(f"{i}. {r}")
 
 
+@st.cache_resource
+def migrar_db() -> bool:
+    """Crea/migra las tablas de Neon una vez por proceso (las consultas leen columnas nuevas)."""
+    return init_db()
+
+
 def main():
     st.set_page_config(layout="wide", page_title="ProspectScan - Diagnóstico de Seguridad")
     st.title("🧠 ProspectScan - Diagnóstico de Superficie Digital")
+    if CACHE_AVAILABLE:
+        migrar_db()
 
     # Tabs: Análisis masivo vs Consulta rápida
     tab1, tab2, tab3 = st.tabs(["📁 Cargar archivo", "🔍 Dominio único", "📊 Reportes (cache)"])
@@ -1447,6 +2070,11 @@ def main():
     with tab1:
         # Quick Start cuando no hay archivo
         archivo = st.file_uploader("Sube archivo CSV o Excel", type=["csv", "xlsx"])
+        plazo_segundos = st.number_input(
+            "⏱️ Plazo por dominio (segundos, 0 = sin límite)",
+            min_value=0, max_value=300, value=int(PLAZO_DOMINIO_SEGUNDOS), step=5,
+            help="Tiempo máximo de DNS + HTTP + WHOIS por dominio; al agotarse el resultado queda parcial",
+        )
         
         if not archivo:
             st.markdown("---")
@@ -1492,7 +2120,8 @@ def main():
         
         elif archivo:
             # Evitar re-análisis en cada rerun: verificar si el archivo cambió
-            archivo_id = f"{archivo.name}_{archivo.size}"
+            # (por contenido: el mismo archivo re-subido reanuda su escaneo)
+            archivo_id = hash_archivo(archivo.getvalue())
             
             if st.session_state.get("archivo_id_last") == archivo_id and isinstance(
                 st.session_state.get("df_resultados_last"), pd.DataFrame
@@ -1500,31 +2129,64 @@ def main():
                 # Reutilizar resultado anterior
                 df_resultados = st.session_state["df_resultados_last"]
             else:
-                # Archivo nuevo: procesar
-                try:
-                    dominios = ingesta_archivo(archivo)
-                except Exception as e:
-                    st.error("No se pudo leer el archivo. Verifica formato y contenido.")
-                    st.caption(f"Detalle: {e}")
-                    return
-                df_resultados = analizar_dominios(dominios)
+                # Escaneo del mismo archivo ya en segundo plano (esta sesión u otra)
+                trabajo_id = None
+                if st.session_state.get("trabajo_archivo") == archivo_id:
+                    trabajo_id = st.session_state.get("trabajo_id")
+                if trabajo_id is None and cola_trabajos() is not None:
+                    trabajo_id = cola_trabajos().activo_por_archivo(archivo_id)
+                df_resultados = seguir_trabajo(trabajo_id) if trabajo_id else None
+
+                if df_resultados is None:
+                    # Archivo nuevo: procesar
+                    try:
+                        dominios = ingesta_archivo(archivo)
+                    except Exception as e:
+                        st.error("No se pudo leer el archivo. Verifica formato y contenido.")
+                        st.caption(f"Detalle: {e}")
+                        return
+                    dueno = st.session_state.setdefault("sesion_escaneo", uuid.uuid4().hex)
+                    escaneo = abrir_escaneo(archivo_id, dominios, dueno)
+                    if escaneo is not None:
+                        dominios = escaneo.dominios
+                    df_resultados = analizar_dominios(dominios, plazo_segundos, escaneo, en_segundo_plano=True)
+                    if df_resultados is None:
+                        # Pasó a segundo plano: esta sesión solo consulta el progreso
+                        st.session_state["trabajo_archivo"] = archivo_id
+                        df_resultados = seguir_trabajo(st.session_state["trabajo_id"])
+                        if df_resultados is None:
+                            st.error("Se perdió el trabajo en segundo plano; vuelve a subir el archivo")
+                            return
 
                 # Guardar en session_state
                 st.session_state["archivo_id_last"] = archivo_id
                 st.session_state["df_resultados_last"] = df_resultados
+                st.session_state.pop("trabajo_id", None)
+                st.session_state.pop("trabajo_archivo", None)
 
             if df_resultados.empty:
                 st.warning("No se pudieron analizar dominios válidos desde el CSV")
                 return
 
-            vista_global(df_resultados)
-            vista_lista_explorable(df_resultados)
-            vista_dominio(df_resultados)
+            # Los dominios inexistentes no entran en métricas ni exploración
+            df_activos, df_inexistentes = separar_inexistentes(df_resultados)
+            if not df_inexistentes.empty:
+                with st.expander(f"🪦 {len(df_inexistentes)} dominios inexistentes", expanded=False):
+                    st.write(", ".join(df_inexistentes["dominio"].tolist()))
+            if df_activos.empty:
+                st.warning("Ninguno de los dominios del archivo existe en DNS")
+                return
+
+            vista_global(df_activos)
+            vista_lista_explorable(df_activos)
+            vista_dominio(df_activos)
         else:
             st.info("Carga un archivo para iniciar el diagnóstico")
             # Limpiar estado si se quitó el archivo
             st.session_state.pop("archivo_id_last", None)
             st.session_state.pop("df_resultados_last", None)
+            st.session_state.pop("trabajo_id", None)
+            st.session_state.pop("trabajo_archivo", None)
 
     with tab2:
         st.markdown("### 🔍 Consulta un dominio específico")
@@ -1574,7 +2236,7 @@ def main():
 
                     # 1) Cache Neon (si está configurado)
                     if df_single.empty and CACHE_AVAILABLE:
-                        row_cached = get_single_domain(dominio_limpio)
+                        row_cached = get_single_domain(dominio_limpio, obtener_catalogo().version)
                         if row_cached is not None:
                             st.success("✅ Resultado desde cache Neon (sin re-análisis)")
                             df_single = pd.DataFrame([row_cached])
@@ -1584,13 +2246,21 @@ def main():
                         with st.spinner(f"🔍 Analizando {dominio_limpio}..."):
                             df_single = analizar_dominios([dominio_limpio])
 
-                    # Persistir en sesión para evitar reruns costosos
-                    if isinstance(df_single, pd.DataFrame) and not df_single.empty:
+                    # Persistir en sesión para evitar reruns costosos (un error se reintenta)
+                    if (
+                        isinstance(df_single, pd.DataFrame) and not df_single.empty
+                        and df_single.iloc[0].get("estado_dominio") != ESTADO_DOMINIO_ERROR
+                    ):
                         st.session_state["single_domain_last"] = dominio_limpio
                         st.session_state["single_domain_df"] = df_single
                 
                 # Mostrar resultados si los hay (de cache o recién analizados)
-                if not df_single.empty:
+                if not df_single.empty and df_single.iloc[0].get("estado_dominio") == ESTADO_DOMINIO_INEXISTENTE:
+                    st.error(f"🪦 **{dominio_limpio}** no existe en DNS: no hay correo ni sitio web que analizar.")
+                elif not df_single.empty and df_single.iloc[0].get("estado_dominio") == ESTADO_DOMINIO_ERROR:
+                    # El detalle ya salió en los avisos del escaneo; sin score ni postura
+                    st.error(f"❌ Falló el análisis de **{dominio_limpio}**: vuelve a presionar **Analizar** para reintentar.")
+                elif not df_single.empty:
                     row = df_single.iloc[0]
                     
                     # Score visual prominente
@@ -1690,8 +2360,8 @@ def main():
                     else:
                         st.success(f"✅ {len(df_cache)} dominios cargados desde cache")
 
-                        # 📊 GRÁFICOS DE VALOR
-                        generar_graficos_cache(df_cache)
+                        # 📊 GRÁFICOS DE VALOR (solo dominios existentes)
+                        generar_graficos_cache(separar_inexistentes(df_cache)[0])
 
                         st.markdown("---")
                         st.markdown("### 📋 Datos Detallados")
@@ -6,14 +6,20 @@ Producto SaaS B2B - Análisis de dominios corporativos
 import pandas as pd
 import streamlit as st
 import re
-import requests
-import dns.resolver
 import concurrent.futures
-from functools import lru_cache
 from dataclasses import dataclass
 from typing import Optional, List, Dict
 from enum import Enum
 from urllib.parse import urlparse
+from dns_cache import EstadoDNS, consultar as consultar_dns
+from sufijos_publicos import dominio_registrable
+from catalogo_vendors import CatalogoVendors, obtener_catalogo
+from http_probe import SondaHTTP, configurar_sesion_http, sondear
+try:
+    from http_async import sondear_lote
+    HTTP_ASYNC_DISPONIBLE = True
+except ImportError:  # Sin httpx: cada hilo sondea con requests
+    HTTP_ASYNC_DISPONIBLE = False
 
 # ============================================================================
 # CONFIGURACIÓN Y CONSTANTES
@@ -22,8 +28,10 @@ from urllib.parse import urlparse
 st.set_page_config(page_title="ProspectScan - Web", page_icon="🌐", layout="wide")
 
 DNS_TIMEOUT = 5
-REQUEST_TIMEOUT = 10
 MAX_WORKERS = 10
+
+# Pool HTTP keep-alive compartido, una conexión por hilo de análisis
+configurar_sesion_http(MAX_WORKERS)
 DOMINIOS_PERSONALES = frozenset([
     "gmail.com", "hotmail.com", "outlook.com", "yahoo.com", 
     "protonmail.com", "icloud.com", "aol.com", "live.com"
@@ -61,41 +69,6 @@ class PosturaGeneral(Enum):
     BASICA = "Básica"
 
 
-# ============================================================================
-# CATÁLOGOS DE TECNOLOGÍAS
-# ============================================================================
-
-TECNOLOGIAS_SERVER = {
-    r'nginx': "Nginx",
-    r'apache': "Apache",
-    r'cloudflare': "Cloudflare",
-    r'microsoft-iis': "Microsoft IIS",
-    r'litespeed': "LiteSpeed",
-    r'openresty': "OpenResty",
-    r'gunicorn': "Gunicorn",
-    r'uvicorn': "Uvicorn",
-}
-
-TECNOLOGIAS_POWERED = {
-    r'php': "PHP",
-    r'asp\.net': "ASP.NET",
-    r'express': "Express.js",
-    r'next\.js': "Next.js",
-    r'wordpress': "WordPress",
-    r'drupal': "Drupal",
-}
-
-CDN_WAF_DETECTADOS = {
-    r'cloudflare': ("Cloudflare", "CDN/WAF"),
-    r'akamai': ("Akamai", "CDN"),
-    r'fastly': ("Fastly", "CDN"),
-    r'cloudfront': ("CloudFront", "CDN"),
-    r'sucuri': ("Sucuri", "WAF"),
-    r'incapsula|imperva': ("Imperva", "WAF"),
-    r'stackpath': ("StackPath", "CDN/WAF"),
-}
-
-
 # ============================================================================
 # ESTRUCTURAS DE DATOS
 # ============================================================================
@@ -131,50 +104,41 @@ class ResultadoAnalisis:
     dns: ResultadoDNS
     postura: PosturaGeneral
     error: Optional[str]
+    catalogo_version: str = ""
 
 
 # ============================================================================
 # FUNCIONES DNS (SPF y DMARC)
 # ============================================================================
 
-@lru_cache(maxsize=1024)
 def obtener_spf(dominio: str) -> str:
     """Obtiene registro SPF del dominio."""
+    resp = consultar_dns(dominio, 'TXT', lifetime=DNS_TIMEOUT)
+    if resp.estado != EstadoDNS.RESPUESTA:
+        return ""  # NXDOMAIN, NoAnswer o fallo transitorio
     try:
-        resp = dns.resolver.resolve(dominio, 'TXT', lifetime=DNS_TIMEOUT)
         for r in resp:
             txt = b''.join(r.strings).decode()
             if "v=spf1" in txt.lower():
                 return txt
-        return ""
-    except dns.resolver.NXDOMAIN:
-        return ""
-    except dns.resolver.NoAnswer:
-        return ""
-    except dns.resolver.Timeout:
-        return ""
     except Exception:
-        return ""
+        pass
+    return ""
 
 
-@lru_cache(maxsize=1024)
 def obtener_dmarc(dominio: str) -> str:
     """Obtiene registro DMARC del dominio."""
+    resp = consultar_dns(f"_dmarc.{dominio}", 'TXT', lifetime=DNS_TIMEOUT)
+    if resp.estado != EstadoDNS.RESPUESTA:
+        return ""  # NXDOMAIN, NoAnswer o fallo transitorio
     try:
-        resp = dns.resolver.resolve(f"_dmarc.{dominio}", 'TXT', lifetime=DNS_TIMEOUT)
         for r in resp:
             txt = b''.join(r.strings).decode()
             if "v=dmarc1" in txt.lower():
                 return txt
-        return ""
-    except dns.resolver.NXDOMAIN:
-        return ""
-    except dns.resolver.NoAnswer:
-        return ""
-    except dns.resolver.Timeout:
-        return ""
     except Exception:
-        return ""
+        pass
+    return ""
 
 
 def evaluar_spf(spf: str) -> EstadoSPF:
@@ -220,113 +184,42 @@ def analizar_dns(dominio: str) -> ResultadoDNS:
 # FUNCIONES DE ANÁLISIS HTTP
 # ============================================================================
 
-def hacer_request(dominio: str) -> Optional[requests.Response]:
-    """Intenta conectar al dominio via HTTPS, luego HTTP."""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; SecurityAudit/1.0)'
-    }
-    
-    # Intentar HTTPS primero
-    try:
-        resp = requests.get(
-            f"https://{dominio}", 
-            timeout=REQUEST_TIMEOUT, 
-            headers=headers,
-            allow_redirects=True,
-            verify=True
-        )
-        return resp
-    except Exception:
-        pass
-    
-    # Intentar HTTP
-    try:
-        resp = requests.get(
-            f"http://{dominio}", 
-            timeout=REQUEST_TIMEOUT, 
-            headers=headers,
-            allow_redirects=True
-        )
-        return resp
-    except Exception:
-        return None
-
-
-def evaluar_https(dominio: str) -> EstadoHTTPS:
-    """Evalúa si el dominio fuerza HTTPS."""
-    headers = {'User-Agent': 'Mozilla/5.0 (compatible; SecurityAudit/1.0)'}
-    
-    # Verificar si HTTPS está disponible
-    https_disponible = False
-    try:
-        resp = requests.get(
-            f"https://{dominio}", 
-            timeout=REQUEST_TIMEOUT, 
-            headers=headers,
-            allow_redirects=False,
-            verify=True
-        )
-        https_disponible = True
-    except Exception:
-        pass
-    
-    if not https_disponible:
-        return EstadoHTTPS.NO_DISPONIBLE
-    
-    # Verificar si HTTP redirige a HTTPS
-    try:
-        resp = requests.get(
-            f"http://{dominio}", 
-            timeout=REQUEST_TIMEOUT, 
-            headers=headers,
-            allow_redirects=True
-        )
-        if resp.url.startswith("https://"):
-            return EstadoHTTPS.FORZADO
-    except Exception:
-        # Si HTTP falla pero HTTPS funciona, consideramos HTTPS forzado
-        return EstadoHTTPS.FORZADO
-    
-    return EstadoHTTPS.DISPONIBLE
-
-
-def detectar_servidor(headers: Dict) -> Optional[str]:
+def detectar_servidor(headers: Dict, catalogo: Optional[CatalogoVendors] = None) -> Optional[str]:
     """Detecta el servidor web."""
     server = headers.get('Server', '').lower()
     
-    for patron, nombre in TECNOLOGIAS_SERVER.items():
-        if re.search(patron, server, re.IGNORECASE):
-            return nombre
+    nombre = (catalogo or obtener_catalogo()).tecnologias_server.primero([server])
+    if nombre:
+        return nombre
     
     if server:
         return server.split('/')[0].title()
     return None
 
 
-def detectar_tecnologia(headers: Dict) -> Optional[str]:
+def detectar_tecnologia(headers: Dict, catalogo: Optional[CatalogoVendors] = None) -> Optional[str]:
     """Detecta la tecnología/framework."""
     powered = headers.get('X-Powered-By', '').lower()
     
-    for patron, nombre in TECNOLOGIAS_POWERED.items():
-        if re.search(patron, powered, re.IGNORECASE):
-            return nombre
+    nombre = (catalogo or obtener_catalogo()).tecnologias_powered.primero([powered])
+    if nombre:
+        return nombre
     
     if powered:
         return powered.split('/')[0].title()
     return None
 
 
-def detectar_cdn_waf(headers: Dict, dominio: str) -> Optional[str]:
+def detectar_cdn_waf(
+    headers: Dict, dominio: str, catalogo: Optional[CatalogoVendors] = None
+) -> Optional[str]:
     """Detecta CDN o WAF."""
-    # Buscar en headers
-    all_headers = ' '.join(str(v) for v in headers.values()).lower()
-    server = headers.get('Server', '').lower()
-    
-    for patron, (nombre, tipo) in CDN_WAF_DETECTADOS.items():
-        if re.search(patron, server, re.IGNORECASE):
-            return f"{nombre} ({tipo})"
-        if re.search(patron, all_headers, re.IGNORECASE):
-            return f"{nombre} ({tipo})"
+    catalogo = catalogo or obtener_catalogo()
+    # Buscar en headers (Server incluido): una sola pasada por valor
+    detectados = catalogo.cdn_waf.todos(str(v) for v in headers.values())
+    if detectados:
+        nombre = detectados[0]
+        return f"{nombre} ({catalogo.tipos_cdn_waf[nombre]})"
     
     # Headers específicos de CDN/WAF
     if 'cf-ray' in headers:
@@ -442,18 +335,20 @@ def calcular_postura_general(
 # FUNCIÓN PRINCIPAL DE ANÁLISIS
 # ============================================================================
 
-def analizar_dominio(dominio: str) -> ResultadoAnalisis:
+def analizar_dominio(dominio: str, sonda: Optional[SondaHTTP] = None) -> ResultadoAnalisis:
     """Analiza un dominio y retorna el resultado completo."""
-    # Evaluar HTTPS
-    estado_https = evaluar_https(dominio)
+    # Una sola traza http:// + https:// (estado HTTPS y headers finales);
+    # en lote llega ya hecha por el motor asíncrono
+    if sonda is None:
+        sonda = sondear(dominio)
+    estado_https = EstadoHTTPS(sonda.estado_https)
     
     # Analizar DNS (SPF y DMARC)
     dns_resultado = analizar_dns(dominio)
     
-    # Hacer request para obtener headers
-    resp = hacer_request(dominio)
+    headers_dict = sonda.headers
     
-    if not resp:
+    if headers_dict is None:
         return ResultadoAnalisis(
             dominio=dominio,
             https=estado_https,
@@ -473,12 +368,11 @@ def analizar_dominio(dominio: str) -> ResultadoAnalisis:
             error="No se pudo conectar"
         )
     
-    headers_dict = dict(resp.headers)
-    
-    # Detecciones
-    servidor = detectar_servidor(headers_dict)
-    tecnologia = detectar_tecnologia(headers_dict)
-    cdn_waf = detectar_cdn_waf(headers_dict, dominio)
+    # Detecciones (una sola versión del catálogo para todo el dominio)
+    catalogo = obtener_catalogo()
+    servidor = detectar_servidor(headers_dict, catalogo)
+    tecnologia = detectar_tecnologia(headers_dict, catalogo)
+    cdn_waf = detectar_cdn_waf(headers_dict, dominio, catalogo)
     
     # Headers de seguridad
     headers_seg = analizar_headers_seguridad(headers_dict)
@@ -495,7 +389,8 @@ def analizar_dominio(dominio: str) -> ResultadoAnalisis:
         headers=headers_seg,
         dns=dns_resultado,
         postura=postura,
-        error=None
+        error=None,
+        catalogo_version=catalogo.version,
     )
 
 
@@ -518,7 +413,8 @@ def resultado_a_dict_tecnico(resultado: ResultadoAnalisis) -> Dict:
         "X-XSS-Protection": resultado.headers.x_xss_protection.value,
         "Referrer-Policy": resultado.headers.referrer_policy.value,
         "Postura General": resultado.postura.value,
-        "Error": resultado.error or ""
+        "Error": resultado.error or "",
+        "Versión Catálogo": resultado.catalogo_version,
     }
 
 
@@ -545,13 +441,15 @@ def validar_email(email: str) -> bool:
     """Valida formato básico de email."""
     if not isinstance(email, str):
         return False
-    return bool(re.match(r'^[\w\.\-\+]+@[a-zA-Z\d\.\-]+\.[a-zA-Z]{2,}$', email))
+    # \w acepta dominios Unicode (IDN); el TLD puede venir ya en punycode (xn--)
+    return bool(re.match(r'^[\w\.\-\+]+@[\w\.\-]+\.(?:[^\W\d_]{2,}|xn--[a-z\d\-]+)$', email))
 
 
 def extraer_dominio(email: str) -> str:
     """Extrae el dominio de un email."""
     if validar_email(email):
-        return email.split("@")[-1].lower().strip()
+        # Dominio registrable (eTLD+1): ventas.empresa.com.mx -> empresa.com.mx
+        return dominio_registrable(email.split("@")[-1].lower().strip())
     return ""
 
 
@@ -620,9 +518,18 @@ def main():
         
         resultados: List[ResultadoAnalisis] = []
         
+        # Sondas HTTP de todo el lote en paralelo (asyncio)
+        sondas: Dict[str, SondaHTTP] = {}
+        if HTTP_ASYNC_DISPONIBLE:
+            estado.text(f"Sondeando HTTP/HTTPS de {len(dominios_corporativos)} dominios...")
+            try:
+                sondas = sondear_lote(dominios_corporativos)
+            except Exception:
+                sondas = {}
+        
         with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             futuros = {
-                executor.submit(analizar_dominio, dom): dom 
+                executor.submit(analizar_dominio, dom, sondas.get(dom)): dom 
                 for dom in dominios_corporativos
             }
             
@@ -0,0 +1,124 @@
+"""
+ProspectScan - Catálogo de vendors compartido (data/catalogo_vendors.json)
+Una sola fuente de patrones para app.py, app_web.py y app_superficie.py,
+compilada en matchers de una pasada (vendor_matcher). Si el archivo cambia
+se recarga sin reiniciar Streamlit (y sin perder los caches en memoria).
+Cada resultado guarda la versión del catálogo con que se clasificó.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from vendor_matcher import MatcherVendors
+
+CATALOGO_PATH = os.environ.get(
+    "PROSPECTSCAN_CATALOGO_VENDORS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "catalogo_vendors.json"),
+)
+# Cada cuánto se revisa el mtime del archivo (no en cada dominio)
+CATALOGO_RECARGA_SEGUNDOS = 5.0
+
+SECCIONES = (
+    "correo_mx",
+    "seguridad_mx",
+    "seguridad_spf",
+    "envio_spf",
+    "cdn_waf",
+    "tecnologias_server",
+    "tecnologias_powered",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogoVendors:
+    """Matchers ya compilados de una versión concreta del catálogo."""
+
+    def __init__(self, datos: Dict, version: str):
+        self.version = version
+        self.matchers: Dict[str, MatcherVendors] = {}
+        for seccion in SECCIONES:
+            entradas: List[Dict] = datos.get(seccion, [])
+            self.matchers[seccion] = MatcherVendors({e["patron"]: e["vendor"] for e in entradas})
+        # Tipo (CDN, WAF, CDN/WAF) de cada vendor de cdn_waf
+        self.tipos_cdn_waf = {e["vendor"]: e.get("tipo", "CDN") for e in datos.get("cdn_waf", [])}
+
+    @property
+    def correo_mx(self) -> MatcherVendors:
+        return self.matchers["correo_mx"]
+
+    @property
+    def seguridad_mx(self) -> MatcherVendors:
+        return self.matchers["seguridad_mx"]
+
+    @property
+    def seguridad_spf(self) -> MatcherVendors:
+        return self.matchers["seguridad_spf"]
+
+    @property
+    def envio_spf(self) -> MatcherVendors:
+        return self.matchers["envio_spf"]
+
+    @property
+    def cdn_waf(self) -> MatcherVendors:
+        return self.matchers["cdn_waf"]
+
+    @property
+    def tecnologias_server(self) -> MatcherVendors:
+        return self.matchers["tecnologias_server"]
+
+    @property
+    def tecnologias_powered(self) -> MatcherVendors:
+        return self.matchers["tecnologias_powered"]
+
+
+def cargar_catalogo(path: str = CATALOGO_PATH) -> CatalogoVendors:
+    """Lee y compila el catálogo. Sin campo "version" se usa un hash del contenido."""
+    with open(path, "rb") as f:
+        contenido = f.read()
+    datos = json.loads(contenido.decode("utf-8"))
+    version = str(datos.get("version") or hashlib.sha256(contenido).hexdigest()[:12])
+    return CatalogoVendors(datos, version)
+
+
+class _CatalogoRecargable:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._catalogo: Optional[CatalogoVendors] = None
+        self._mtime: Optional[float] = None
+        self._revisado = 0.0
+
+    def obtener(self) -> CatalogoVendors:
+        ahora = time.monotonic()
+        if self._catalogo is not None and ahora - self._revisado < CATALOGO_RECARGA_SEGUNDOS:
+            return self._catalogo
+        with self._lock:
+            if self._catalogo is not None and ahora - self._revisado < CATALOGO_RECARGA_SEGUNDOS:
+                return self._catalogo
+            self._revisado = ahora
+            try:
+                mtime = os.path.getmtime(self.path)
+                if self._catalogo is None or mtime != self._mtime:
+                    self._catalogo = cargar_catalogo(self.path)
+                    self._mtime = mtime
+            except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+                # Archivo a medio editar o inválido: seguir con la última versión buena
+                if self._catalogo is None:
+                    raise
+                logger.warning("Catálogo de vendors inválido, se mantiene v%s: %s", self._catalogo.version, e)
+            return self._catalogo
+
+
+_RECARGABLE = _CatalogoRecargable(CATALOGO_PATH)
+
+
+def obtener_catalogo() -> CatalogoVendors:
+    """Catálogo vigente; se recarga solo si el archivo cambió."""
+    return _RECARGABLE.obtener()
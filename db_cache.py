@@ -1,17 +1,30 @@
 """
 ProspectScan - Cache de dominios en Neon PostgreSQL
 Solo analiza dominios nuevos o con cache vencido (TTL configurable).
+Las fechas de creación (RDAP/WHOIS) no cambian: van en su propia tabla, sin TTL.
+Los escaneos por archivo guardan checkpoints para reanudarse tras un reinicio.
+
+Estas funciones también corren en hilos del escaneo y en los procesos de
+trabajador.py (sin contexto de Streamlit): los errores van al log.
 """
 
+import json
+import logging
 import os
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import streamlit as st
 
+logger = logging.getLogger(__name__)
+
 # TTL por defecto: 7 días
 CACHE_TTL_DAYS = int(os.environ.get("PROSPECTSCAN_CACHE_TTL_DAYS", "7"))
 
+# Un escaneo reclamado sin checkpoints en este tiempo se da por abandonado
+# (la sesión que lo corría murió sin liberarlo)
+ESCANEO_RECLAMO_MINUTOS = int(os.environ.get("PROSPECTSCAN_ESCANEO_RECLAMO_MINUTOS", "10"))
+
 # Columnas del contrato df_resultados
 DF_COLUMNS = [
     "dominio",
@@ -29,9 +42,11 @@ DF_COLUMNS = [
     "hsts",
     "csp",
     "dominio_antiguedad",
+    "estado_dominio",
+    "catalogo_version",
 ]
 
-# SQL para crear la tabla (ejecutar una vez en Neon)
+# SQL para crear y migrar las tablas (idempotente: init_db lo corre al arrancar)
 CREATE_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS dominios_cache (
     dominio             TEXT PRIMARY KEY,
@@ -49,12 +64,51 @@ CREATE TABLE IF NOT EXISTS dominios_cache (
     hsts                BOOLEAN,
     csp                 BOOLEAN,
     dominio_antiguedad  TEXT,
+    estado_dominio      TEXT DEFAULT 'Activo',
+    catalogo_version    TEXT,
     updated_at          TIMESTAMP DEFAULT NOW()
 );
 
+-- Tablas creadas con versiones anteriores: columnas agregadas después
+ALTER TABLE dominios_cache ADD COLUMN IF NOT EXISTS score INTEGER DEFAULT 0;
+ALTER TABLE dominios_cache ADD COLUMN IF NOT EXISTS estado_dominio TEXT DEFAULT 'Activo';
+ALTER TABLE dominios_cache ADD COLUMN IF NOT EXISTS catalogo_version TEXT;
+
 CREATE INDEX IF NOT EXISTS idx_dominios_updated ON dominios_cache(updated_at);
 CREATE INDEX IF NOT EXISTS idx_dominios_postura ON dominios_cache(postura_general);
 CREATE INDEX IF NOT EXISTS idx_dominios_score ON dominios_cache(score);
+
+-- Fecha de creación del dominio: permanente, no vence con CACHE_TTL_DAYS
+CREATE TABLE IF NOT EXISTS fechas_creacion (
+    dominio         TEXT PRIMARY KEY,
+    fecha_creacion  DATE NOT NULL,
+    updated_at      TIMESTAMP DEFAULT NOW()
+);
+
+-- Escaneos por archivo: manifiesto (lista de dominios) + filas ya terminadas
+CREATE TABLE IF NOT EXISTS escaneos (
+    run_id          TEXT PRIMARY KEY,
+    hash_archivo    TEXT NOT NULL,
+    dominios        JSONB NOT NULL,
+    total           INTEGER NOT NULL,
+    terminado       BOOLEAN DEFAULT FALSE,
+    dueno           TEXT,
+    created_at      TIMESTAMP DEFAULT NOW(),
+    updated_at      TIMESTAMP DEFAULT NOW()
+);
+
+-- Sesión que está corriendo el escaneo (NULL: libre para reanudarse)
+ALTER TABLE escaneos ADD COLUMN IF NOT EXISTS dueno TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_escaneos_hash ON escaneos(hash_archivo, terminado);
+
+CREATE TABLE IF NOT EXISTS escaneo_filas (
+    run_id      TEXT REFERENCES escaneos(run_id) ON DELETE CASCADE,
+    dominio     TEXT NOT NULL,
+    fila        JSONB NOT NULL,
+    updated_at  TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (run_id, dominio)
+);
 """
 
 
@@ -63,7 +117,7 @@ def _get_connection():
     try:
         import psycopg2
     except ImportError:
-        st.error("❌ psycopg2 no está instalado")
+        logger.error("psycopg2 no está instalado")
         return None
 
     # Intentar desde Streamlit secrets primero
@@ -78,7 +132,7 @@ def _get_connection():
         # No hay archivo secrets.toml (común en desarrollo sin secrets)
         pass
     except Exception as e:
-        st.warning(f"Error leyendo secrets: {e}")
+        logger.warning("Error leyendo secrets: %s", e)
 
     # Fallback a variable de entorno
     if not db_url:
@@ -90,12 +144,12 @@ def _get_connection():
     try:
         return psycopg2.connect(db_url, connect_timeout=10)
     except Exception as e:
-        st.warning(f"No se pudo conectar a Neon: {e}")
+        logger.warning("No se pudo conectar a Neon: %s", e)
         return None
 
 
 def init_db():
-    """Crea la tabla si no existe y migra si falta columna score."""
+    """Crea las tablas que falten y agrega las columnas nuevas a las existentes."""
     conn = _get_connection()
     if not conn:
         return False
@@ -103,35 +157,33 @@ def init_db():
     try:
         with conn.cursor() as cur:
             cur.execute(CREATE_TABLE_SQL)
-            
-            # Migración: agregar columna score si no existe (tablas antiguas)
-            cur.execute("""
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (
-                        SELECT 1 FROM information_schema.columns 
-                        WHERE table_name = 'dominios_cache' AND column_name = 'score'
-                    ) THEN
-                        ALTER TABLE dominios_cache ADD COLUMN score INTEGER DEFAULT 0;
-                        CREATE INDEX IF NOT EXISTS idx_dominios_score ON dominios_cache(score);
-                    END IF;
-                END $$;
-            """)
         conn.commit()
         return True
     except Exception as e:
-        st.warning(f"Error inicializando BD: {e}")
+        logger.warning("Error inicializando BD: %s", e)
         return False
     finally:
         conn.close()
 
 
-def get_cached_dominios(dominios: List[str]) -> Tuple[pd.DataFrame, List[str]]:
+# Fila vigente para `catalogo_version`: inexistentes y sin versión pedida
+# siempre; activos solo si se clasificaron con esa versión del catálogo
+_CONDICION_CATALOGO = """
+              AND (%s IS NULL OR COALESCE(estado_dominio, 'Activo') <> 'Activo'
+                   OR catalogo_version = %s)
+"""
+
+
+def get_cached_dominios(
+    dominios: List[str], catalogo_version: Optional[str] = None
+) -> Tuple[pd.DataFrame, List[str]]:
     """
     Busca dominios en cache.
     Retorna: (df_cacheados, dominios_pendientes)
     - df_cacheados: DataFrame con los dominios que están en cache y no han vencido
     - dominios_pendientes: lista de dominios que hay que analizar
+    Con `catalogo_version`, un dominio activo clasificado con otra versión del
+    catálogo de vendors queda pendiente: se vuelve a analizar y clasificar.
     """
     conn = _get_connection()
     if not conn or not dominios:
@@ -144,14 +196,15 @@ def get_cached_dominios(dominios: List[str]) -> Tuple[pd.DataFrame, List[str]]:
         query = f"""
             SELECT dominio, score, postura_identidad, postura_exposicion, postura_general,
                    correo_proveedor, correo_gateway, correo_envio, spf_estado,
-                   dmarc_estado, https_estado, cdn_waf, hsts, csp, dominio_antiguedad
+                   dmarc_estado, https_estado, cdn_waf, hsts, csp, dominio_antiguedad,
+                   estado_dominio, catalogo_version
             FROM dominios_cache
             WHERE dominio IN ({placeholders})
               AND updated_at > %s
-        """
+        """ + _CONDICION_CATALOGO
 
         with conn.cursor() as cur:
-            cur.execute(query, tuple(dominios) + (cutoff,))
+            cur.execute(query, tuple(dominios) + (cutoff, catalogo_version, catalogo_version))
             rows = cur.fetchall()
 
         if not rows:
@@ -164,7 +217,7 @@ def get_cached_dominios(dominios: List[str]) -> Tuple[pd.DataFrame, List[str]]:
         return df_cached, pendientes
 
     except Exception as e:
-        st.warning(f"Error leyendo cache: {e}")
+        logger.warning("Error leyendo cache: %s", e)
         return pd.DataFrame(columns=DF_COLUMNS), list(dominios)
     finally:
         conn.close()
@@ -185,8 +238,8 @@ def save_to_cache(df: pd.DataFrame):
                         dominio, score, postura_identidad, postura_exposicion, postura_general,
                         correo_proveedor, correo_gateway, correo_envio, spf_estado,
                         dmarc_estado, https_estado, cdn_waf, hsts, csp, dominio_antiguedad,
-                        updated_at
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                        estado_dominio, catalogo_version, updated_at
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
                     ON CONFLICT (dominio) DO UPDATE SET
                         score = EXCLUDED.score,
                         postura_identidad = EXCLUDED.postura_identidad,
@@ -202,6 +255,8 @@ def save_to_cache(df: pd.DataFrame):
                         hsts = EXCLUDED.hsts,
                         csp = EXCLUDED.csp,
                         dominio_antiguedad = EXCLUDED.dominio_antiguedad,
+                        estado_dominio = EXCLUDED.estado_dominio,
+                        catalogo_version = EXCLUDED.catalogo_version,
                         updated_at = NOW()
                 """, (
                     row["dominio"],
@@ -219,10 +274,205 @@ def save_to_cache(df: pd.DataFrame):
                     bool(row["hsts"]),
                     bool(row["csp"]),
                     row["dominio_antiguedad"],
+                    row.get("estado_dominio") or "Activo",
+                    row.get("catalogo_version") or None,
                 ))
         conn.commit()
     except Exception as e:
-        st.warning(f"Error guardando en cache: {e}")
+        logger.warning("Error guardando en cache: %s", e)
+    finally:
+        conn.close()
+
+
+def get_fechas_creacion(dominios: List[str]) -> Dict[str, datetime]:
+    """Fechas de creación ya conocidas (sin TTL: una fecha de creación no cambia)."""
+    conn = _get_connection()
+    if not conn or not dominios:
+        return {}
+
+    try:
+        placeholders = ",".join(["%s"] * len(dominios))
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT dominio, fecha_creacion FROM fechas_creacion WHERE dominio IN ({placeholders})",
+                tuple(dominios),
+            )
+            rows = cur.fetchall()
+        return {d: datetime(f.year, f.month, f.day) for d, f in rows}
+    except Exception as e:
+        logger.warning("Error leyendo fechas de creación: %s", e)
+        return {}
+    finally:
+        conn.close()
+
+
+def save_fechas_creacion(fechas: Dict[str, datetime]):
+    """Guarda fechas de creación encontradas (solo las que existen)."""
+    conn = _get_connection()
+    fechas = {d: f for d, f in (fechas or {}).items() if f}
+    if not conn or not fechas:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            for dominio, fecha in fechas.items():
+                cur.execute("""
+                    INSERT INTO fechas_creacion (dominio, fecha_creacion, updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (dominio) DO UPDATE SET
+                        fecha_creacion = EXCLUDED.fecha_creacion,
+                        updated_at = NOW()
+                """, (dominio, fecha.date()))
+        conn.commit()
+    except Exception as e:
+        logger.warning("Error guardando fechas de creación: %s", e)
+    finally:
+        conn.close()
+
+
+def _fila_json(fila: dict) -> str:
+    """Fila df_resultados como JSON (tipos numpy a nativos, NaN a null)."""
+    limpia = {}
+    for col in DF_COLUMNS:
+        valor = fila.get(col)
+        if hasattr(valor, "item"):
+            valor = valor.item()
+        if isinstance(valor, float) and valor != valor:
+            valor = None
+        limpia[col] = valor
+    return json.dumps(limpia, default=str)
+
+
+def crear_escaneo(run_id: str, hash_archivo: str, dominios: List[str], dueno: Optional[str] = None) -> bool:
+    """Registra un escaneo con su manifiesto (la lista de dominios del archivo), ya reclamado por `dueno`."""
+    conn = _get_connection()
+    if not conn:
+        return False
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO escaneos (run_id, hash_archivo, dominios, total, dueno)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (run_id, hash_archivo, json.dumps(dominios), len(dominios), dueno))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.warning("Error registrando escaneo: %s", e)
+        return False
+    finally:
+        conn.close()
+
+
+def buscar_escaneo_pendiente(hash_archivo: str, dueno: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Reclama el último escaneo sin terminar del mismo archivo (dentro del TTL
+    del cache) que esté libre, sea ya de `dueno` o lleve ESCANEO_RECLAMO_MINUTOS
+    sin checkpoints. El UPDATE ... RETURNING lo reclama de forma atómica: dos
+    sesiones con el mismo archivo nunca reciben el mismo escaneo.
+    Retorna: (run_id, dominios del manifiesto) o None
+    """
+    conn = _get_connection()
+    if not conn:
+        return None
+
+    try:
+        cutoff = datetime.now() - timedelta(days=CACHE_TTL_DAYS)
+        abandonado = datetime.now() - timedelta(minutes=ESCANEO_RECLAMO_MINUTOS)
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE escaneos SET dueno = %(dueno)s, updated_at = NOW()
+                WHERE run_id = (
+                    SELECT run_id FROM escaneos
+                    WHERE hash_archivo = %(hash)s AND NOT terminado AND updated_at > %(cutoff)s
+                      AND (dueno IS NULL OR dueno = %(dueno)s OR updated_at < %(abandonado)s)
+                    ORDER BY updated_at DESC
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                  AND (dueno IS NULL OR dueno = %(dueno)s OR updated_at < %(abandonado)s)
+                RETURNING run_id, dominios
+            """, {"dueno": dueno, "hash": hash_archivo, "cutoff": cutoff, "abandonado": abandonado})
+            row = cur.fetchone()
+        conn.commit()
+        return (row[0], list(row[1])) if row else None
+    except Exception as e:
+        logger.warning("Error buscando escaneo: %s", e)
+        return None
+    finally:
+        conn.close()
+
+
+def liberar_escaneo(run_id: str, dueno: str):
+    """Suelta el escaneo (interrumpido sin terminar) para que otra sesión lo reanude."""
+    conn = _get_connection()
+    if not conn:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE escaneos SET dueno = NULL WHERE run_id = %s AND dueno = %s", (run_id, dueno))
+        conn.commit()
+    except Exception as e:
+        logger.warning("Error liberando escaneo: %s", e)
+    finally:
+        conn.close()
+
+
+def get_checkpoint(run_id: str) -> List[dict]:
+    """Filas ya terminadas de un escaneo."""
+    conn = _get_connection()
+    if not conn:
+        return []
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT fila FROM escaneo_filas WHERE run_id = %s", (run_id,))
+            return [r[0] for r in cur.fetchall()]
+    except Exception as e:
+        logger.warning("Error leyendo checkpoint: %s", e)
+        return []
+    finally:
+        conn.close()
+
+
+def save_checkpoint(run_id: str, filas: List[dict]):
+    """Guarda filas terminadas del escaneo (incluye parciales, que no van al cache)."""
+    conn = _get_connection()
+    if not conn or not filas:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            for fila in filas:
+                cur.execute("""
+                    INSERT INTO escaneo_filas (run_id, dominio, fila, updated_at)
+                    VALUES (%s, %s, %s, NOW())
+                    ON CONFLICT (run_id, dominio) DO UPDATE SET
+                        fila = EXCLUDED.fila,
+                        updated_at = NOW()
+                """, (run_id, fila["dominio"], _fila_json(fila)))
+            cur.execute("UPDATE escaneos SET updated_at = NOW() WHERE run_id = %s", (run_id,))
+        conn.commit()
+    except Exception as e:
+        logger.warning("Error guardando checkpoint: %s", e)
+    finally:
+        conn.close()
+
+
+def terminar_escaneo(run_id: str):
+    """Marca el escaneo como terminado y borra sus filas (lo completo ya está en dominios_cache)."""
+    conn = _get_connection()
+    if not conn:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE escaneos SET terminado = TRUE, updated_at = NOW() WHERE run_id = %s", (run_id,))
+            cur.execute("DELETE FROM escaneo_filas WHERE run_id = %s", (run_id,))
+        conn.commit()
+    except Exception as e:
+        logger.warning("Error cerrando escaneo: %s", e)
     finally:
         conn.close()
 
@@ -246,7 +496,8 @@ def query_all_cached(filtros: Optional[dict] = None) -> pd.DataFrame:
         query = """
             SELECT dominio, score, postura_identidad, postura_exposicion, postura_general,
                    correo_proveedor, correo_gateway, correo_envio, spf_estado,
-                   dmarc_estado, https_estado, cdn_waf, hsts, csp, dominio_antiguedad
+                   dmarc_estado, https_estado, cdn_waf, hsts, csp, dominio_antiguedad,
+                   estado_dominio, catalogo_version
             FROM dominios_cache
         """
         params = []
@@ -269,7 +520,7 @@ def query_all_cached(filtros: Optional[dict] = None) -> pd.DataFrame:
         return pd.DataFrame(rows, columns=DF_COLUMNS) if rows else pd.DataFrame(columns=DF_COLUMNS)
 
     except Exception as e:
-        st.warning(f"Error consultando cache: {e}")
+        logger.warning("Error consultando cache: %s", e)
         return pd.DataFrame(columns=DF_COLUMNS)
     finally:
         conn.close()
@@ -303,10 +554,11 @@ def get_cache_stats() -> dict:
         conn.close()
 
 
-def get_single_domain(dominio: str) -> Optional[pd.Series]:
+def get_single_domain(dominio: str, catalogo_version: Optional[str] = None) -> Optional[pd.Series]:
     """
     Busca UN dominio en cache.
-    Retorna la fila como pd.Series si existe y no está vencido, None si no.
+    Retorna la fila como pd.Series si existe y no está vencido (ni clasificado
+    con otra `catalogo_version`), None si no.
     """
     conn = _get_connection()
     if not conn or not dominio:
@@ -318,14 +570,15 @@ def get_single_domain(dominio: str) -> Optional[pd.Series]:
         query = """
             SELECT dominio, score, postura_identidad, postura_exposicion, postura_general,
                    correo_proveedor, correo_gateway, correo_envio, spf_estado,
-                   dmarc_estado, https_estado, cdn_waf, hsts, csp, dominio_antiguedad
+                   dmarc_estado, https_estado, cdn_waf, hsts, csp, dominio_antiguedad,
+                   estado_dominio, catalogo_version
             FROM dominios_cache
             WHERE dominio = %s
               AND updated_at > %s
-        """
+        """ + _CONDICION_CATALOGO
 
         with conn.cursor() as cur:
-            cur.execute(query, (dominio.lower().strip(), cutoff))
+            cur.execute(query, (dominio.lower().strip(), cutoff, catalogo_version, catalogo_version))
             row = cur.fetchone()
 
         if row:
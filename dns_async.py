@@ -0,0 +1,196 @@
+"""
+ProspectScan - Motor DNS asíncrono por lotes
+Resuelve MX, TXT (SPF) y _dmarc TXT con concurrencia acotada (cientos de
+consultas en vuelo para todo el lote) sobre dns.asyncresolver a través del
+pool de resolvers (dns_pool).
+Las respuestas pasan por el cache compartido (dns_cache.CACHE_DNS).
+Cada dominio puede traer su plazo (plazo.Plazo), compartido con HTTP y WHOIS.
+Las etapas del pipeline usan resolvedor_identidad y verificador_existencia:
+entregan la consulta de UN dominio con el límite de consultas del lote.
+"""
+
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from plazo import Plazo
+from dns_cache import (
+    DNS_TIMEOUT, EstadoDNS, RespuestaDNS, PresupuestoReintentos,
+    ESTADOS_REINTENTABLES, consultar, consultar_async
+)
+
+# Consultas DNS simultáneas para todo el lote (no por dominio)
+DNS_CONCURRENCIA = 300
+
+
+@dataclass
+class RegistrosIdentidad:
+    """Registros crudos que usa analizar_identidad."""
+    mx: List[str]
+    spf: str
+    dmarc: str
+    # Resultado de cada consulta: distingue "no existe" de "no respondió"
+    estado_mx: EstadoDNS = EstadoDNS.RESPUESTA
+    estado_txt: EstadoDNS = EstadoDNS.RESPUESTA
+    estado_dmarc: EstadoDNS = EstadoDNS.RESPUESTA
+    # Completados por spf_resolver (include:/redirect= recursivos)
+    spf_incluidos: List[str] = field(default_factory=list)
+    spf_lookups: int = 0
+
+    @property
+    def incompleto(self) -> bool:
+        """True si alguna consulta terminó en timeout/SERVFAIL tras los reintentos."""
+        return any(
+            e in ESTADOS_REINTENTABLES
+            for e in (self.estado_mx, self.estado_txt, self.estado_dmarc)
+        )
+
+
+# ============================================================================
+# EXTRACCIÓN (compartida con spf_resolver)
+# ============================================================================
+
+def extraer_mx(respuesta) -> List[str]:
+    return [r.exchange.to_text().rstrip('.').lower() for r in respuesta]
+
+
+def _extraer_txt(respuesta, marcador: str) -> str:
+    for r in respuesta:
+        txt = b''.join(r.strings).decode()
+        if marcador in txt.lower():
+            return txt
+    return ""
+
+
+def extraer_spf(respuesta) -> str:
+    return _extraer_txt(respuesta, "v=spf1")
+
+
+def extraer_dmarc(respuesta) -> str:
+    return _extraer_txt(respuesta, "v=dmarc1")
+
+
+def registros_desde_respuestas(
+    resp_mx: RespuestaDNS,
+    resp_txt: RespuestaDNS,
+    resp_dmarc: RespuestaDNS,
+) -> RegistrosIdentidad:
+    registros = RegistrosIdentidad(
+        mx=[], spf="", dmarc="",
+        estado_mx=resp_mx.estado,
+        estado_txt=resp_txt.estado,
+        estado_dmarc=resp_dmarc.estado,
+    )
+    try:
+        if resp_mx.estado == EstadoDNS.RESPUESTA:
+            registros.mx = extraer_mx(resp_mx)
+        if resp_txt.estado == EstadoDNS.RESPUESTA:
+            registros.spf = extraer_spf(resp_txt)
+        if resp_dmarc.estado == EstadoDNS.RESPUESTA:
+            registros.dmarc = extraer_dmarc(resp_dmarc)
+    except Exception:
+        pass  # Registro malformado: se queda lo que ya se extrajo
+    return registros
+
+
+def resolver_identidad(dominio: str, plazo: Optional[Plazo] = None) -> RegistrosIdentidad:
+    """Versión síncrona para un solo dominio (mismo presupuesto de reintentos)."""
+    presupuesto = PresupuestoReintentos(plazo=plazo)
+    return registros_desde_respuestas(
+        consultar(dominio, 'MX', lifetime=DNS_TIMEOUT, presupuesto=presupuesto),
+        consultar(dominio, 'TXT', lifetime=DNS_TIMEOUT, presupuesto=presupuesto),
+        consultar(f"_dmarc.{dominio}", 'TXT', lifetime=DNS_TIMEOUT, presupuesto=presupuesto),
+    )
+
+
+# ============================================================================
+# MOTOR ASÍNCRONO
+# ============================================================================
+
+async def _consultar(
+    semaforo: asyncio.Semaphore,
+    nombre: str,
+    rdtype: str,
+    presupuesto: PresupuestoReintentos,
+) -> RespuestaDNS:
+    async with semaforo:
+        return await consultar_async(
+            nombre, rdtype, lifetime=DNS_TIMEOUT, presupuesto=presupuesto
+        )
+
+
+async def _resolver_dominio(
+    semaforo: asyncio.Semaphore,
+    dominio: str,
+    plazo: Optional[Plazo] = None,
+) -> RegistrosIdentidad:
+    # Un solo presupuesto de reintentos para las tres consultas del dominio
+    presupuesto = PresupuestoReintentos(plazo=plazo)
+    resp_mx, resp_txt, resp_dmarc = await asyncio.gather(
+        _consultar(semaforo, dominio, 'MX', presupuesto),
+        _consultar(semaforo, dominio, 'TXT', presupuesto),
+        _consultar(semaforo, f"_dmarc.{dominio}", 'TXT', presupuesto),
+    )
+    return registros_desde_respuestas(resp_mx, resp_txt, resp_dmarc)
+
+
+@contextlib.asynccontextmanager
+async def resolvedor_identidad(
+    concurrencia: int = DNS_CONCURRENCIA,
+) -> AsyncIterator[Callable[[str, Optional[Plazo]], Awaitable[RegistrosIdentidad]]]:
+    """resolver(dominio, plazo) con un solo límite de consultas para todos los dominios."""
+    semaforo = asyncio.Semaphore(max(concurrencia, 1))
+
+    async def resolver(dominio: str, plazo: Optional[Plazo] = None) -> RegistrosIdentidad:
+        return await _resolver_dominio(semaforo, dominio, plazo)
+
+    yield resolver
+
+
+# ============================================================================
+# PRE-CHEQUEO DE EXISTENCIA (LIVENESS)
+# ============================================================================
+
+def dominio_inexistente(respuestas: List[RespuestaDNS]) -> bool:
+    """
+    Inexistente = algún NXDOMAIN, o todas las consultas negativas (sin SOA, A,
+    AAAA ni MX). Un timeout/SERVFAIL nunca declara muerto al dominio.
+    """
+    if any(r.estado == EstadoDNS.NXDOMAIN for r in respuestas):
+        return True
+    return bool(respuestas) and all(r.es_negativa for r in respuestas)
+
+
+async def _verificar_existencia(
+    semaforo: asyncio.Semaphore,
+    dominio: str,
+    plazo: Optional[Plazo] = None,
+) -> bool:
+    presupuesto = PresupuestoReintentos(plazo=plazo)
+    # SOA primero: un NXDOMAIN aquí ahorra las otras tres consultas
+    soa = await _consultar(semaforo, dominio, 'SOA', presupuesto)
+    if soa.estado == EstadoDNS.NXDOMAIN:
+        return False
+    if soa.estado == EstadoDNS.RESPUESTA:
+        return True
+    # Sin SOA propio (subdominio, delegación rara): basta con A, AAAA o MX
+    resto = await asyncio.gather(
+        _consultar(semaforo, dominio, 'A', presupuesto),
+        _consultar(semaforo, dominio, 'AAAA', presupuesto),
+        _consultar(semaforo, dominio, 'MX', presupuesto),
+    )
+    return not dominio_inexistente([soa, *resto])
+
+
+@contextlib.asynccontextmanager
+async def verificador_existencia(
+    concurrencia: int = DNS_CONCURRENCIA,
+) -> AsyncIterator[Callable[[str, Optional[Plazo]], Awaitable[bool]]]:
+    """verificar(dominio, plazo) -> existe, con un solo límite de consultas."""
+    semaforo = asyncio.Semaphore(max(concurrencia, 1))
+
+    async def verificar(dominio: str, plazo: Optional[Plazo] = None) -> bool:
+        return await _verificar_existencia(semaforo, dominio, plazo)
+
+    yield verificar
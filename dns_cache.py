@@ -0,0 +1,405 @@
+"""
+ProspectScan - Cache DNS compartido del proceso
+Clave (nombre, tipo), respeta el TTL de cada respuesta, guarda las respuestas
+negativas (NXDOMAIN/NoAnswer) aparte de los fallos transitorios y acota el
+tamaño con desalojo LRU. app.py, app_web.py y app_superficie.py leen de aquí.
+
+Cada consulta devuelve un resultado tipado (RespuestaDNS): respuesta, NXDOMAIN,
+NoAnswer, timeout o SERVFAIL. Solo timeout y SERVFAIL se reintentan, con
+backoff con jitter y dentro de un presupuesto de reintentos por dominio.
+Las consultas idénticas simultáneas se coalescen (single-flight).
+Las consultas que sí salen a la red pasan por el pool de resolvers (dns_pool).
+El presupuesto del dominio lleva también su plazo (plazo.Plazo): cada consulta
+espera como mucho lo que le queda y un timeout por plazo no se cachea.
+El lifetime real sale de las latencias observadas (latencias.TimeoutAdaptativo);
+un timeout por ese límite tampoco se cachea: el dominio va al carril lento.
+Las fases HTTP toman de aquí las IPs de destino (A/AAAA), así el host se
+resuelve una sola vez y nunca por el getaddrinfo del sistema.
+"""
+
+import asyncio
+import ipaddress
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional, Tuple
+
+import dns.exception
+import dns.rdatatype
+import dns.resolver
+
+from dns_pool import obtener_pool
+from latencias import ETAPA_LAT_DNS, timeout_adaptativo
+from plazo import ETAPA_DNS, Plazo
+from single_flight import SingleFlight
+
+DNS_TIMEOUT = 5
+# Piso del timeout adaptativo (el techo es el lifetime pedido, DNS_TIMEOUT)
+DNS_TIMEOUT_MIN = 0.5
+
+# Límite de entradas (nombre, tipo); listas de 50k dominios generan ~150k consultas
+DNS_CACHE_MAX = int(os.environ.get("PROSPECTSCAN_DNS_CACHE_MAX", "200000"))
+# TTL máximo que aceptamos de una respuesta (algunos servidores anuncian semanas)
+DNS_TTL_MAX = 86400
+# TTL negativo si la respuesta no trae SOA (RFC 2308)
+DNS_TTL_NEGATIVO = 300
+# Un timeout/SERVFAIL solo se recuerda unos segundos, nunca "para siempre"
+DNS_TTL_FALLO = 30
+
+# Reintentos: solo para fallos transitorios y acotados por dominio
+DNS_REINTENTOS_CONSULTA = 2   # máx. reintentos de una misma consulta
+DNS_REINTENTOS_DOMINIO = 3    # máx. reintentos sumando todas las consultas del dominio
+DNS_PRESUPUESTO_SEGUNDOS = 20.0
+DNS_BACKOFF_BASE = 0.25
+DNS_BACKOFF_MAX = 2.0
+
+
+class EstadoDNS(Enum):
+    RESPUESTA = "Respuesta"
+    NXDOMAIN = "NXDOMAIN"
+    NOANSWER = "NoAnswer"
+    TIMEOUT = "Timeout"
+    SERVFAIL = "SERVFAIL"  # Incluye REFUSED / errores de red del resolver
+
+
+ESTADOS_REINTENTABLES = frozenset([EstadoDNS.TIMEOUT, EstadoDNS.SERVFAIL])
+
+
+@dataclass(frozen=True)
+class RespuestaDNS:
+    estado: EstadoDNS
+    registros: Tuple = ()  # rdata de dnspython (r.exchange, r.strings, ...)
+    ttl: int = 0
+
+    @property
+    def es_negativa(self) -> bool:
+        return self.estado in (EstadoDNS.NXDOMAIN, EstadoDNS.NOANSWER)
+
+    @property
+    def es_reintentable(self) -> bool:
+        """Timeout o SERVFAIL: no sabemos si el registro existe."""
+        return self.estado in ESTADOS_REINTENTABLES
+
+    def __iter__(self):
+        return iter(self.registros)
+
+
+class CacheDNS:
+    """Cache LRU con expiración por TTL, seguro entre hilos."""
+
+    def __init__(self, max_entradas: int = DNS_CACHE_MAX):
+        self.max_entradas = max(max_entradas, 1)
+        self._datos: "OrderedDict[Tuple[str, str], Tuple[float, RespuestaDNS]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.desalojados = 0
+
+    @staticmethod
+    def clave(nombre: str, rdtype: str) -> Tuple[str, str]:
+        return nombre.strip().rstrip(".").lower(), rdtype.upper()
+
+    def get(self, nombre: str, rdtype: str) -> Optional[RespuestaDNS]:
+        k = self.clave(nombre, rdtype)
+        with self._lock:
+            entrada = self._datos.get(k)
+            if entrada is None:
+                self.misses += 1
+                return None
+            expira, respuesta = entrada
+            if expira <= time.monotonic():
+                del self._datos[k]
+                self.expirados += 1
+                self.misses += 1
+                return None
+            self._datos.move_to_end(k)
+            self.hits += 1
+            return respuesta
+
+    def set(self, nombre: str, rdtype: str, respuesta: RespuestaDNS):
+        if respuesta.ttl <= 0:
+            return
+        k = self.clave(nombre, rdtype)
+        with self._lock:
+            self._datos[k] = (time.monotonic() + respuesta.ttl, respuesta)
+            self._datos.move_to_end(k)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.desalojados += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            por_estado = {e.value: 0 for e in EstadoDNS}
+            for _, respuesta in self._datos.values():
+                por_estado[respuesta.estado.value] += 1
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "expirados": self.expirados,
+                "desalojados": self.desalojados,
+                "por_estado": por_estado,
+            }
+
+
+# Instancias únicas del proceso
+CACHE_DNS = CacheDNS()
+VUELOS_DNS = SingleFlight()
+TIMEOUT_DNS = timeout_adaptativo(ETAPA_LAT_DNS, techo=DNS_TIMEOUT, piso=DNS_TIMEOUT_MIN)
+
+
+class PresupuestoReintentos:
+    """
+    Reintentos disponibles para TODAS las consultas de un dominio.
+    Evita que un dominio con el resolver caído consuma el lote entero.
+    `plazo` es el del dominio completo (DNS + HTTP + WHOIS), si lo hay.
+    """
+
+    def __init__(
+        self,
+        reintentos: int = DNS_REINTENTOS_DOMINIO,
+        segundos: float = DNS_PRESUPUESTO_SEGUNDOS,
+        plazo: Optional[Plazo] = None,
+    ):
+        self.restantes = reintentos
+        self.limite = time.monotonic() + segundos
+        self.plazo = plazo if plazo is not None else Plazo()
+        self._lock = threading.Lock()
+
+    def consumir(self) -> bool:
+        with self._lock:
+            if self.restantes <= 0 or time.monotonic() >= self.limite or self.plazo.agotado:
+                return False
+            self.restantes -= 1
+            return True
+
+
+def espera_backoff(intento: int) -> float:
+    """Backoff exponencial con jitter completo: U(0, base * 2^intento)."""
+    return random.uniform(0, min(DNS_BACKOFF_MAX, DNS_BACKOFF_BASE * (2 ** intento)))
+
+
+# ============================================================================
+# CLASIFICACIÓN DE RESPUESTAS
+# ============================================================================
+
+def _ttl_negativo(exc: Exception) -> int:
+    """TTL negativo = min(TTL del SOA, SOA.minimum) de la sección authority."""
+    respuestas = []
+    try:
+        if isinstance(exc, dns.resolver.NXDOMAIN):
+            respuestas = list(exc.responses().values())
+        elif isinstance(exc, dns.resolver.NoAnswer):
+            respuestas = [exc.response()]
+    except Exception:
+        respuestas = []
+
+    for resp in respuestas:
+        for rrset in getattr(resp, "authority", []):
+            if rrset.rdtype == dns.rdatatype.SOA and len(rrset):
+                return min(rrset.ttl, rrset[0].minimum, DNS_TTL_MAX)
+    return DNS_TTL_NEGATIVO
+
+
+def respuesta_desde_answer(answer: dns.resolver.Answer) -> RespuestaDNS:
+    ttl = min(answer.rrset.ttl, DNS_TTL_MAX) if answer.rrset is not None else 0
+    return RespuestaDNS(EstadoDNS.RESPUESTA, tuple(answer), ttl)
+
+
+def respuesta_desde_excepcion(exc: Exception) -> RespuestaDNS:
+    if isinstance(exc, dns.resolver.NXDOMAIN):
+        return RespuestaDNS(EstadoDNS.NXDOMAIN, (), _ttl_negativo(exc))
+    if isinstance(exc, dns.resolver.NoAnswer):
+        return RespuestaDNS(EstadoDNS.NOANSWER, (), _ttl_negativo(exc))
+    if isinstance(exc, dns.exception.Timeout):
+        return RespuestaDNS(EstadoDNS.TIMEOUT, (), DNS_TTL_FALLO)
+    return RespuestaDNS(EstadoDNS.SERVFAIL, (), DNS_TTL_FALLO)
+
+
+# ============================================================================
+# CONSULTAS (SÍNCRONA Y ASÍNCRONA) A TRAVÉS DEL CACHE
+# ============================================================================
+
+def _medir(respuesta: RespuestaDNS, inicio: float) -> RespuestaDNS:
+    # Solo respuestas definitivas alimentan el histograma
+    if not respuesta.es_reintentable:
+        TIMEOUT_DNS.registrar(time.monotonic() - inicio)
+    return respuesta
+
+
+def _resolver_una_vez(nombre: str, rdtype: str, lifetime: float) -> RespuestaDNS:
+    inicio = time.monotonic()
+    try:
+        respuesta = respuesta_desde_answer(obtener_pool().resolver(nombre, rdtype, lifetime))
+    except Exception as e:
+        respuesta = respuesta_desde_excepcion(e)
+    return _medir(respuesta, inicio)
+
+
+async def _resolver_una_vez_async(nombre: str, rdtype: str, lifetime: float) -> RespuestaDNS:
+    inicio = time.monotonic()
+    try:
+        respuesta = respuesta_desde_answer(await obtener_pool().resolver_async(nombre, rdtype, lifetime))
+    except Exception as e:
+        respuesta = respuesta_desde_excepcion(e)
+    return _medir(respuesta, inicio)
+
+
+def _guardar(nombre: str, rdtype: str, respuesta: RespuestaDNS, plazo: Plazo, limite: float, lifetime: float):
+    """Cachea la respuesta salvo que el timeout sea por plazo o por timeout adaptativo."""
+    if respuesta.es_reintentable and plazo.agotado:
+        plazo.cortar(ETAPA_DNS)
+        return  # El timeout fue nuestro, no del servidor
+    if respuesta.estado == EstadoDNS.TIMEOUT and limite < lifetime:
+        TIMEOUT_DNS.vencido()
+        plazo.marcar_lento(ETAPA_DNS)
+        return  # Se reintenta con el lifetime completo en el carril lento
+    CACHE_DNS.set(nombre, rdtype, respuesta)
+
+
+def _consultar_red(
+    nombre: str, rdtype: str, lifetime: float, presupuesto: PresupuestoReintentos
+) -> RespuestaDNS:
+    plazo = presupuesto.plazo
+    limite = TIMEOUT_DNS.limite(lifetime, plazo.carril_lento)
+    with plazo.activo():
+        respuesta = _resolver_una_vez(nombre, rdtype, plazo.acotar(limite))
+        intento = 0
+        while respuesta.es_reintentable and intento < DNS_REINTENTOS_CONSULTA and presupuesto.consumir():
+            time.sleep(espera_backoff(intento))
+            intento += 1
+            respuesta = _resolver_una_vez(nombre, rdtype, plazo.acotar(limite))
+
+    _guardar(nombre, rdtype, respuesta, plazo, limite, lifetime)
+    return respuesta
+
+
+async def _consultar_red_async(
+    nombre: str, rdtype: str, lifetime: float, presupuesto: PresupuestoReintentos
+) -> RespuestaDNS:
+    plazo = presupuesto.plazo
+    limite = TIMEOUT_DNS.limite(lifetime, plazo.carril_lento)
+    with plazo.activo():
+        respuesta = await _resolver_una_vez_async(nombre, rdtype, plazo.acotar(limite))
+        intento = 0
+        while respuesta.es_reintentable and intento < DNS_REINTENTOS_CONSULTA and presupuesto.consumir():
+            await asyncio.sleep(espera_backoff(intento))
+            intento += 1
+            respuesta = await _resolver_una_vez_async(nombre, rdtype, plazo.acotar(limite))
+
+    _guardar(nombre, rdtype, respuesta, plazo, limite, lifetime)
+    return respuesta
+
+
+def _sin_plazo(plazo: Plazo) -> RespuestaDNS:
+    plazo.cortar(ETAPA_DNS)
+    return RespuestaDNS(EstadoDNS.TIMEOUT)  # ttl=0: nunca entra al cache
+
+
+def consultar(
+    nombre: str,
+    rdtype: str,
+    lifetime: float = DNS_TIMEOUT,
+    presupuesto: Optional[PresupuestoReintentos] = None,
+) -> RespuestaDNS:
+    """
+    Resuelve (nombre, tipo) pasando por CACHE_DNS.
+    Reintenta timeout/SERVFAIL mientras quede presupuesto; NXDOMAIN y NoAnswer
+    son definitivos y se devuelven al primer intento. Si otra llamada ya está
+    resolviendo la misma clave, espera ese resultado en vez de repetirla.
+    Con el plazo del dominio agotado retorna Timeout sin salir a la red.
+    """
+    cacheada = CACHE_DNS.get(nombre, rdtype)
+    if cacheada is not None:
+        return cacheada
+    if presupuesto is None:
+        presupuesto = PresupuestoReintentos()
+    if presupuesto.plazo.agotado:
+        return _sin_plazo(presupuesto.plazo)
+    return VUELOS_DNS.hacer(
+        CacheDNS.clave(nombre, rdtype), _consultar_red, nombre, rdtype, lifetime, presupuesto,
+        plazo=presupuesto.plazo,
+    )
+
+
+async def consultar_async(
+    nombre: str,
+    rdtype: str,
+    lifetime: float = DNS_TIMEOUT,
+    presupuesto: Optional[PresupuestoReintentos] = None,
+) -> RespuestaDNS:
+    """Igual que consultar() pero dentro de un event loop."""
+    cacheada = CACHE_DNS.get(nombre, rdtype)
+    if cacheada is not None:
+        return cacheada
+    if presupuesto is None:
+        presupuesto = PresupuestoReintentos()
+    if presupuesto.plazo.agotado:
+        return _sin_plazo(presupuesto.plazo)
+    return await VUELOS_DNS.hacer_async(
+        CacheDNS.clave(nombre, rdtype), _consultar_red_async,
+        nombre, rdtype, lifetime, presupuesto, plazo=presupuesto.plazo,
+    )
+
+
+# ============================================================================
+# DIRECCIONES DE DESTINO (A/AAAA) PARA LAS FASES HTTP
+# ============================================================================
+
+def _es_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _direcciones(respuesta: RespuestaDNS) -> List[str]:
+    if respuesta.estado != EstadoDNS.RESPUESTA:
+        return []
+    return [r.address for r in respuesta]
+
+
+def direcciones_en_cache(host: str) -> List[str]:
+    """IPs ya resueltas del host (A primero, luego AAAA) sin salir a la red."""
+    if _es_ip(host):
+        return [host]
+    ips: List[str] = []
+    for rdtype in ('A', 'AAAA'):
+        cacheada = CACHE_DNS.get(host, rdtype)
+        if cacheada is not None:
+            ips += _direcciones(cacheada)
+    return ips
+
+
+def resolver_destino(host: str, presupuesto: Optional[PresupuestoReintentos] = None) -> List[str]:
+    """A del host (AAAA si no tiene A) a través del cache; [] si no resolvió."""
+    if _es_ip(host):
+        return [host]
+    ips = _direcciones(consultar(host, 'A', presupuesto=presupuesto))
+    if not ips:
+        ips = _direcciones(consultar(host, 'AAAA', presupuesto=presupuesto))
+    return ips
+
+
+async def resolver_destino_async(
+    host: str, presupuesto: Optional[PresupuestoReintentos] = None
+) -> List[str]:
+    if _es_ip(host):
+        return [host]
+    ips = _direcciones(await consultar_async(host, 'A', presupuesto=presupuesto))
+    if not ips:
+        ips = _direcciones(await consultar_async(host, 'AAAA', presupuesto=presupuesto))
+    return ips
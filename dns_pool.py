@@ -0,0 +1,301 @@
+"""
+ProspectScan - Pool de resolvers DNS con salud, límites y consultas hedged
+Reparte las consultas entre varios nameservers según su latencia y tasa de
+errores, limita las consultas por segundo de cada uno y, si una consulta pasa
+el p95 observado del upstream, lanza una segunda a otro upstream sano y se
+queda con la primera respuesta definitiva. La segunda consulta recibe solo lo
+que queda del lifetime: el hedge nunca alarga la consulta.
+
+Las llamadas síncronas (hilos de análisis) corren en un único event loop de
+fondo del pool en vez de crear uno por consulta.
+
+Configuración: PROSPECTSCAN_DNS_SERVIDORES="1.1.1.1,8.8.8.8,127.0.0.1:5353".
+Sin configurar se usan los nameservers del sistema (/etc/resolv.conf).
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+DNS_SERVIDORES = os.environ.get("PROSPECTSCAN_DNS_SERVIDORES", "")
+# Consultas por segundo permitidas por upstream (token bucket)
+DNS_QPS_UPSTREAM = float(os.environ.get("PROSPECTSCAN_DNS_QPS", "300"))
+DNS_RAFAGA_UPSTREAM = 50
+
+# Hedging: umbral = p95 del upstream, acotado; sin muestras suficientes se usa el inicial
+DNS_HEDGE_INICIAL = 0.5
+DNS_HEDGE_MIN = 0.05
+DNS_HEDGE_MUESTRAS_MIN = 20
+DNS_VENTANA_LATENCIAS = 256
+
+# Salud: EWMA de errores; por encima del umbral el upstream descansa un rato
+DNS_EWMA_ALFA = 0.1
+DNS_ERROR_UMBRAL = 0.5
+DNS_ENFRIAMIENTO = 30.0
+
+# Respuestas definitivas: el upstream funcionó aunque el nombre no exista
+_EXCEPCIONES_DEFINITIVAS = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.YXDOMAIN)
+
+
+def _es_definitiva(exc: Optional[BaseException]) -> bool:
+    return exc is None or isinstance(exc, _EXCEPCIONES_DEFINITIVAS)
+
+
+class Upstream:
+    """Un nameserver con su historial de latencia, errores y límite de QPS."""
+
+    def __init__(self, ip: str, puerto: int = 53, qps: float = DNS_QPS_UPSTREAM):
+        self.ip = ip
+        self.puerto = puerto
+        self.resolver = dns.asyncresolver.Resolver(configure=False)
+        self.resolver.nameservers = [ip]
+        self.resolver.port = puerto
+
+        self._lock = threading.Lock()
+        self.latencias: deque = deque(maxlen=DNS_VENTANA_LATENCIAS)
+        self.tasa_error = 0.0
+        self.ultimo_error = 0.0
+        self.consultas = 0
+        self.errores = 0
+        self.en_vuelo = 0
+
+        self.qps = qps
+        self._tokens = float(DNS_RAFAGA_UPSTREAM)
+        self._recarga = time.monotonic()
+
+    def __repr__(self):
+        return f"{self.ip}:{self.puerto}"
+
+    # -- límite de tasa -----------------------------------------------------
+
+    def tomar_token(self) -> float:
+        """Consume un token; si no hay, retorna los segundos a esperar (sin consumir)."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(DNS_RAFAGA_UPSTREAM, self._tokens + (ahora - self._recarga) * self.qps)
+            self._recarga = ahora
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.qps
+
+    # -- salud ---------------------------------------------------------------
+
+    def registrar(self, latencia: float, ok: bool):
+        with self._lock:
+            self.consultas += 1
+            self.tasa_error = (1 - DNS_EWMA_ALFA) * self.tasa_error + DNS_EWMA_ALFA * (0.0 if ok else 1.0)
+            if ok:
+                self.latencias.append(latencia)
+            else:
+                self.errores += 1
+                self.ultimo_error = time.monotonic()
+
+    def percentil(self, p: float) -> Optional[float]:
+        with self._lock:
+            muestras = sorted(self.latencias)
+        if not muestras:
+            return None
+        return muestras[min(int(p * len(muestras)), len(muestras) - 1)]
+
+    def sano(self) -> bool:
+        return not (
+            self.tasa_error > DNS_ERROR_UMBRAL
+            and time.monotonic() - self.ultimo_error < DNS_ENFRIAMIENTO
+        )
+
+    def puntaje(self) -> float:
+        """Menor es mejor: latencia típica penalizada por errores y carga."""
+        p50 = self.percentil(0.5)
+        base = p50 if p50 is not None else DNS_HEDGE_INICIAL / 2
+        return base * (1 + 10 * self.tasa_error) * (1 + 0.01 * self.en_vuelo)
+
+    def umbral_hedge(self, lifetime: float) -> float:
+        if len(self.latencias) < DNS_HEDGE_MUESTRAS_MIN:
+            umbral = DNS_HEDGE_INICIAL
+        else:
+            umbral = self.percentil(0.95) or DNS_HEDGE_INICIAL
+        return max(DNS_HEDGE_MIN, min(umbral, lifetime / 2))
+
+    # -- consulta ------------------------------------------------------------
+
+    async def resolver_async(self, nombre: str, rdtype: str, lifetime: float) -> dns.resolver.Answer:
+        espera = self.tomar_token()
+        while espera > 0:
+            await asyncio.sleep(espera)
+            espera = self.tomar_token()
+
+        with self._lock:
+            self.en_vuelo += 1
+        inicio = time.monotonic()
+        try:
+            respuesta = await self.resolver.resolve(nombre, rdtype, lifetime=lifetime, search=False)
+        except asyncio.CancelledError:
+            # Perdió contra el hedge: lo tardado no es su latencia (sería el
+            # propio umbral de hedge y arrastraría el p95 hacia él)
+            raise
+        except Exception as e:
+            self.registrar(time.monotonic() - inicio, _es_definitiva(e))
+            raise
+        else:
+            self.registrar(time.monotonic() - inicio, True)
+            return respuesta
+        finally:
+            with self._lock:
+                self.en_vuelo -= 1
+
+    def estadisticas(self) -> dict:
+        p50, p95 = self.percentil(0.5), self.percentil(0.95)
+        return {
+            "upstream": repr(self),
+            "consultas": self.consultas,
+            "errores": self.errores,
+            "tasa_error": round(self.tasa_error, 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "sano": self.sano(),
+        }
+
+
+class PoolResolvers:
+    def __init__(self, upstreams: List[Upstream]):
+        if not upstreams:
+            raise ValueError("El pool DNS necesita al menos un upstream")
+        self.upstreams = upstreams
+        self.hedges = 0
+        self.hedges_ganados = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    def elegir(self, excluir: Iterable[Upstream] = ()) -> Optional[Upstream]:
+        """Mejor upstream sano (si no hay sanos, el menos malo)."""
+        excluidos = set(excluir)
+        candidatos = [u for u in self.upstreams if u not in excluidos]
+        if not candidatos:
+            return None
+        sanos = [u for u in candidatos if u.sano()] or candidatos
+        return min(sanos, key=lambda u: u.puntaje())
+
+    async def resolver_async(
+        self, nombre: str, rdtype: str, lifetime: float
+    ) -> dns.resolver.Answer:
+        """
+        Misma interfaz que dns.asyncresolver.Resolver.resolve: devuelve Answer o
+        lanza NXDOMAIN/NoAnswer/Timeout/NoNameservers.
+        """
+        inicio = time.monotonic()
+        primario = self.elegir()
+        t1 = asyncio.ensure_future(primario.resolver_async(nombre, rdtype, lifetime))
+        hechas, _ = await asyncio.wait({t1}, timeout=primario.umbral_hedge(lifetime))
+
+        # Terminó a tiempo con respuesta definitiva: caso común
+        if hechas and _es_definitiva(t1.exception()):
+            return t1.result()
+
+        restante = lifetime - (time.monotonic() - inicio)
+        secundario = self.elegir(excluir=[primario])
+        if secundario is None or not secundario.sano() or restante <= 0:
+            return await t1
+
+        # Lento (pasó el p95) o falló rápido: segunda consulta a otro upstream,
+        # con lo que queda del lifetime (el plazo del dominio ya lo acotó)
+        self.hedges += 1
+        t2 = asyncio.ensure_future(secundario.resolver_async(nombre, rdtype, restante))
+        pendientes = {t2} if hechas else {t1, t2}
+        try:
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for t in hechas:
+                    if _es_definitiva(t.exception()):
+                        if t is t2:
+                            self.hedges_ganados += 1
+                        return t.result()
+            # Ambos fallaron de forma transitoria: se propaga el error del primario
+            return t1.result()
+        finally:
+            for t in (t1, t2):
+                if not t.done():
+                    t.cancel()
+
+    def _loop_fondo(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="dns-pool", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def resolver(self, nombre: str, rdtype: str, lifetime: float) -> dns.resolver.Answer:
+        """Versión síncrona (hilos de análisis): corre en el event loop de fondo del pool."""
+        futuro = asyncio.run_coroutine_threadsafe(
+            self.resolver_async(nombre, rdtype, lifetime), self._loop_fondo()
+        )
+        try:
+            # resolver_async ya respeta lifetime; el margen solo cubre un loop atascado
+            return futuro.result(timeout=lifetime + 1.0)
+        except concurrent.futures.TimeoutError:
+            futuro.cancel()
+            raise dns.exception.Timeout(timeout=lifetime)
+
+    def estadisticas(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "hedges_ganados": self.hedges_ganados,
+            "upstreams": [u.estadisticas() for u in self.upstreams],
+        }
+
+
+def parsear_servidores(texto: str) -> List[Tuple[str, int]]:
+    """ "1.1.1.1, 127.0.0.1:5353, [::1]:53" -> [(ip, puerto), ...] """
+    servidores = []
+    for item in (texto or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if item.startswith("["):  # IPv6 con puerto
+            ip, _, puerto = item[1:].partition("]:")
+            servidores.append((ip.rstrip("]"), int(puerto or 53)))
+        elif item.count(":") == 1:
+            ip, puerto = item.split(":")
+            servidores.append((ip, int(puerto)))
+        else:
+            servidores.append((item, 53))
+    return servidores
+
+
+def _servidores_sistema() -> List[Tuple[str, int]]:
+    try:
+        sistema = dns.resolver.Resolver()
+        return [(ns, sistema.port) for ns in sistema.nameservers]
+    except Exception:
+        return []
+
+
+_POOL: Optional[PoolResolvers] = None
+_POOL_LOCK = threading.Lock()
+
+
+def configurar_pool(servidores: List[Tuple[str, int]], qps: float = DNS_QPS_UPSTREAM) -> PoolResolvers:
+    """Reemplaza el pool del proceso (ej. para apuntar a un resolver local de prueba)."""
+    global _POOL
+    with _POOL_LOCK:
+        _POOL = PoolResolvers([Upstream(ip, puerto, qps) for ip, puerto in servidores])
+        return _POOL
+
+
+def obtener_pool() -> PoolResolvers:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                servidores = parsear_servidores(DNS_SERVIDORES) or _servidores_sistema()
+                _POOL = PoolResolvers([Upstream(ip, puerto) for ip, puerto in servidores])
+    return _POOL
@@ -0,0 +1,352 @@
+"""
+ProspectScan - Motor HTTP asíncrono para la fase de exposición
+Las mismas sondas que http_probe (HEAD/GET en streaming, cadena http:// y
+https://, cuerpo acotado) pero sobre httpx + asyncio: cientos de sondas en
+vuelo con un límite global, un límite por IP de destino (muchos prospectos
+comparten hosting) y timeouts separados de conexión y lectura. Un sitio
+lento ya no bloquea un hilo del ThreadPoolExecutor.
+Cada petición se corta, además, cuando se agota el plazo de su dominio.
+Los timeouts por petición son los adaptativos de http_probe; aquí se miden
+por separado la conexión (TCP + TLS) y el primer byte con el trace de httpcore.
+Las conexiones van a las IPs del cache DNS compartido (la primera decide el
+límite por IP; las demás son respaldo si la conexión falla), resueltas con
+el plazo y los reintentos del dominio; SNI, certificado y Host siguen
+siendo los del nombre.
+El certificado y la versión TLS se leen del network_stream de la respuesta.
+Para el pipeline por etapas, sondeador() mantiene abierto el cliente y
+entrega la sonda de UN dominio con los límites globales y por IP del lote.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpcore
+import httpx
+
+from dns_cache import PresupuestoReintentos, direcciones_en_cache, resolver_destino_async
+from http_probe import (
+    HTTP_BYTES_CUERPO, HTTP_BYTES_DRENAR, HTTP_HEAD_NO_SOPORTADO,
+    HTTP_TIMEOUT_CONEXION, MAX_REDIRECTS, REQUEST_TIMEOUT, USER_AGENT,
+    TIMEOUT_CONEXION, TIMEOUT_PRIMER_BYTE,
+    SaltoHTTP, SondaHTTP, TrazaHTTP, registrar_vencido, timeouts_http,
+)
+from plazo import ETAPA_HTTP, Plazo, PlazoAgotado
+from tls_info import InfoTLS, info_desde_ssl
+
+# Sondas de dominio simultáneas para todo el lote
+HTTP_CONCURRENCIA_ASYNC = 200
+# Peticiones simultáneas hacia una misma IP (hosting compartido, WAFs con rate limit)
+HTTP_CONCURRENCIA_POR_IP = 6
+
+
+# Presupuesto DNS del dominio que se está sondeando: el backend de red lo
+# usa al resolver el destino (httpcore conecta dentro de la tarea que pide)
+_PRESUPUESTO_SONDA: "contextvars.ContextVar[Optional[PresupuestoReintentos]]" = contextvars.ContextVar(
+    "presupuesto_sonda", default=None
+)
+
+
+async def _resolver_con_dominio(host: str) -> List[str]:
+    """IPs del host con el plazo y los reintentos del dominio en curso (cache + single-flight)."""
+    return direcciones_en_cache(host) or await resolver_destino_async(host, _PRESUPUESTO_SONDA.get())
+
+
+class LimitesDestino:
+    """Un semáforo por IP de destino (o por host si no se pudo resolver)."""
+
+    def __init__(self, por_ip: int = HTTP_CONCURRENCIA_POR_IP):
+        self.por_ip = max(por_ip, 1)
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+        self._claves: Dict[str, str] = {}
+
+    async def _resolver_clave(self, host: str) -> str:
+        ips = await _resolver_con_dominio(host)
+        return ips[0] if ips else host
+
+    async def semaforo(self, host: str) -> asyncio.Semaphore:
+        clave = self._claves.get(host)
+        if clave is None:
+            # Consultas simultáneas del mismo host se coalescen en VUELOS_DNS
+            clave = self._claves.setdefault(host, await self._resolver_clave(host))
+        if clave not in self._semaforos:
+            self._semaforos[clave] = asyncio.Semaphore(self.por_ip)
+        return self._semaforos[clave]
+
+
+class BackendIPFijada(httpcore.AsyncNetworkBackend):
+    """
+    Backend de red de httpcore que abre el TCP contra las IPs de CACHE_DNS,
+    en orden, pasando a la siguiente si la conexión falla.
+    httpcore sigue haciendo el TLS con el nombre del origen (SNI y
+    verificación) y el pool sigue siendo por host, no por IP.
+    """
+
+    def __init__(self, base: Optional[httpcore.AsyncNetworkBackend] = None):
+        self._base = base if base is not None else httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        ips = await _resolver_con_dominio(host) or [host]
+        for i, ip in enumerate(ips):
+            try:
+                return await self._base.connect_tcp(
+                    ip, port, timeout=timeout,
+                    local_address=local_address, socket_options=socket_options,
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if i == len(ips) - 1:
+                    raise
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._base.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._base.sleep(seconds)
+
+
+class TransporteIPFijada(httpx.AsyncHTTPTransport):
+    """
+    AsyncHTTPTransport cuyo pool de httpcore se crea con BackendIPFijada.
+    httpx no acepta network_backend: el pool se arma con la API pública de
+    httpcore y reemplaza al que httpx crea para el caso sin proxy.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        super().__init__(verify=True, limits=limits)
+        if not isinstance(getattr(self, "_pool", None), httpcore.AsyncConnectionPool):
+            raise RuntimeError("httpx cambió su transporte: no se puede fijar la IP de destino")
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(verify=True),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=BackendIPFijada(),
+        )
+
+
+def crear_transporte(limits: httpx.Limits) -> httpx.AsyncHTTPTransport:
+    return TransporteIPFijada(limits)
+
+
+def _headers_originales(resp: httpx.Response) -> Dict[str, str]:
+    """dict con el casing del servidor, igual que dict(requests.Response.headers)."""
+    headers: Dict[str, str] = {}
+    for nombre, valor in resp.headers.raw:
+        clave = nombre.decode("latin-1")
+        valor = valor.decode("latin-1")
+        headers[clave] = f"{headers[clave]}, {valor}" if clave in headers else valor
+    return headers
+
+
+def _registrar_latencias(marcas: Dict[str, float]):
+    """Eventos de httpcore -> histogramas de conexión y primer byte."""
+    def marca(sufijo: str) -> Optional[float]:
+        return next((t for e, t in marcas.items() if e.endswith(sufijo)), None)
+
+    inicio_tcp = marca("connect_tcp.started")
+    fin_conexion = marca("start_tls.complete") or marca("connect_tcp.complete")
+    if inicio_tcp is not None and fin_conexion is not None:  # solo conexiones nuevas
+        TIMEOUT_CONEXION.registrar(fin_conexion - inicio_tcp)
+    envio = marca("send_request_headers.started")
+    headers = marca("receive_response_headers.complete")
+    if envio is not None and headers is not None:
+        TIMEOUT_PRIMER_BYTE.registrar(headers - envio)
+
+
+async def _pedir_stream(
+    cliente: httpx.AsyncClient,
+    limites: LimitesDestino,
+    metodo: str,
+    url: str,
+    tope: int,
+    plazo: Plazo,
+) -> "tuple[httpx.Response, bytes, Optional[InfoTLS]]":
+    """Una petición en streaming; lee como mucho max(tope, HTTP_BYTES_DRENAR) bytes."""
+    # Los timeouts del cliente son el techo de los adaptativos
+    techo = cliente.timeout
+    conexion, primer_byte = timeouts_http(plazo, techo.connect, techo.read)
+    timeout = httpx.Timeout(
+        connect=plazo.acotar(conexion), read=plazo.acotar(primer_byte),
+        write=techo.write, pool=None,
+    )
+    marcas: Dict[str, float] = {}
+
+    async def trace(evento: str, info: dict):
+        marcas[evento] = time.monotonic()
+
+    async with await limites.semaforo(httpx.URL(url).host):
+        try:
+            async with cliente.stream(
+                metodo, url, timeout=timeout, extensions={"trace": trace}
+            ) as resp:
+                _registrar_latencias(marcas)
+                tls = None
+                if resp.url.scheme == "https":
+                    stream = resp.extensions.get("network_stream")
+                    if stream is not None:
+                        tls = info_desde_ssl(stream.get_extra_info("ssl_object"))
+                datos = b""
+                if metodo != "HEAD":
+                    async for trozo in resp.aiter_bytes():
+                        datos += trozo
+                        if len(datos) >= max(tope, HTTP_BYTES_DRENAR):
+                            break
+                return resp, datos[:tope], tls
+        except httpx.ConnectTimeout:
+            registrar_vencido(TIMEOUT_CONEXION, conexion, techo.connect, plazo)
+            raise
+        except httpx.ReadTimeout:
+            registrar_vencido(TIMEOUT_PRIMER_BYTE, primer_byte, techo.read, plazo)
+            raise
+
+
+async def _pedir(
+    cliente: httpx.AsyncClient,
+    limites: LimitesDestino,
+    metodo: str,
+    url: str,
+    tope: int,
+    plazo: Plazo,
+) -> "tuple[httpx.Response, bytes, Optional[InfoTLS]]":
+    """_pedir_stream acotado a lo que resta del plazo del dominio."""
+    plazo.verificar(ETAPA_HTTP)
+    try:
+        return await asyncio.wait_for(
+            _pedir_stream(cliente, limites, metodo, url, tope, plazo), plazo.restante()
+        )
+    except asyncio.TimeoutError:
+        plazo.cortar(ETAPA_HTTP)
+        raise PlazoAgotado(ETAPA_HTTP)
+
+
+async def _seguir(
+    cliente: httpx.AsyncClient,
+    limites: LimitesDestino,
+    url: str,
+    cortar_en_https: bool = False,
+    bytes_cuerpo: int = 0,
+    plazo: Optional[Plazo] = None,
+) -> TrazaHTTP:
+    traza = TrazaHTTP(url_inicial=url, url_final=url)
+    plazo = plazo if plazo is not None else Plazo()
+    usar_head = True
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            resp, cuerpo, tls = await _pedir(
+                cliente, limites, "HEAD" if usar_head else "GET", url, bytes_cuerpo, plazo
+            )
+            if usar_head and resp.status_code in HTTP_HEAD_NO_SOPORTADO:
+                usar_head = False  # el resto de la cadena va por GET
+                resp, cuerpo, tls = await _pedir(cliente, limites, "GET", url, bytes_cuerpo, plazo)
+
+            es_redirect = resp.has_redirect_location
+            if not es_redirect and bytes_cuerpo > 0 and usar_head:
+                # Se pidió cuerpo: solo la respuesta final se repite como GET
+                resp, cuerpo, tls = await _pedir(cliente, limites, "GET", url, bytes_cuerpo, plazo)
+                es_redirect = resp.has_redirect_location
+
+            traza.saltos.append(SaltoHTTP(url, resp.status_code))
+            traza.headers = _headers_originales(resp)
+            if traza.tls is None:
+                traza.tls = tls
+            if not es_redirect:
+                traza.cuerpo = cuerpo
+                break
+            url = str(resp.url.join(resp.headers['Location']))
+            traza.url_final = url
+            if cortar_en_https and url.startswith("https://"):
+                break
+        else:
+            traza.error = "Demasiados redirects"
+    except Exception as e:
+        traza.error = type(e).__name__
+        if plazo.agotado:
+            plazo.cortar(ETAPA_HTTP)
+    return traza
+
+
+async def _sondear(
+    cliente: httpx.AsyncClient,
+    limites: LimitesDestino,
+    semaforo: asyncio.Semaphore,
+    dominio: str,
+    bytes_cuerpo: int,
+    plazo: Optional[Plazo],
+) -> SondaHTTP:
+    plazo = plazo if plazo is not None else Plazo()
+    token = _PRESUPUESTO_SONDA.set(PresupuestoReintentos(plazo=plazo))
+    try:
+        async with semaforo:
+            with plazo.activo():
+                https = await _seguir(
+                    cliente, limites, f"https://{dominio}", bytes_cuerpo=bytes_cuerpo, plazo=plazo
+                )
+                http = await _seguir(
+                    cliente, limites, f"http://{dominio}", cortar_en_https=https.ok,
+                    bytes_cuerpo=0 if https.ok else bytes_cuerpo, plazo=plazo,
+                )
+    finally:
+        _PRESUPUESTO_SONDA.reset(token)
+    return SondaHTTP(dominio, https, http)
+
+
+@contextlib.asynccontextmanager
+async def sondeador(
+    concurrencia: int = HTTP_CONCURRENCIA_ASYNC,
+    por_ip: int = HTTP_CONCURRENCIA_POR_IP,
+    bytes_cuerpo: int = HTTP_BYTES_CUERPO,
+    timeout_conexion: float = HTTP_TIMEOUT_CONEXION,
+    timeout_lectura: float = REQUEST_TIMEOUT,
+) -> AsyncIterator[Callable[[str, Optional[Plazo]], Awaitable[SondaHTTP]]]:
+    """sondear(dominio, plazo) sobre un cliente httpx compartido mientras dure el bloque."""
+    concurrencia = max(concurrencia, 1)
+    semaforo = asyncio.Semaphore(concurrencia)
+    limites = LimitesDestino(por_ip)
+    timeout = httpx.Timeout(
+        connect=timeout_conexion, read=timeout_lectura, write=timeout_lectura, pool=None
+    )
+    # Dos conexiones por sonda (http y https) como máximo a la vez
+    limits = httpx.Limits(max_connections=concurrencia * 2, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(
+        headers={'User-Agent': USER_AGENT},
+        timeout=timeout,
+        transport=crear_transporte(limits),
+        follow_redirects=False,
+    ) as cliente:
+        async def sondear(dominio: str, plazo: Optional[Plazo] = None) -> SondaHTTP:
+            return await _sondear(cliente, limites, semaforo, dominio, bytes_cuerpo, plazo)
+
+        yield sondear
+
+
+async def sondear_lote_async(
+    dominios: List[str],
+    concurrencia: int = HTTP_CONCURRENCIA_ASYNC,
+    por_ip: int = HTTP_CONCURRENCIA_POR_IP,
+    bytes_cuerpo: int = HTTP_BYTES_CUERPO,
+    timeout_conexion: float = HTTP_TIMEOUT_CONEXION,
+    timeout_lectura: float = REQUEST_TIMEOUT,
+    plazos: Optional[Dict[str, Plazo]] = None,
+) -> Dict[str, SondaHTTP]:
+    plazos = plazos or {}
+
+    unicos = list(dict.fromkeys(dominios))
+    async with sondeador(concurrencia, por_ip, bytes_cuerpo, timeout_conexion, timeout_lectura) as sondear:
+        sondas = await asyncio.gather(*(sondear(d, plazos.get(d)) for d in unicos))
+    return dict(zip(unicos, sondas))
+
+
+def sondear_lote(
+    dominios: List[str],
+    concurrencia: int = HTTP_CONCURRENCIA_ASYNC,
+    por_ip: int = HTTP_CONCURRENCIA_POR_IP,
+    bytes_cuerpo: int = HTTP_BYTES_CUERPO,
+    plazos: Optional[Dict[str, Plazo]] = None,
+) -> Dict[str, SondaHTTP]:
+    """Versión síncrona para el hilo de Streamlit: {dominio: SondaHTTP}."""
+    if not dominios:
+        return {}
+    return asyncio.run(sondear_lote_async(dominios, concurrencia, por_ip, bytes_cuerpo, plazos=plazos))
@@ -0,0 +1,420 @@
+"""
+ProspectScan - Sonda HTTP única por dominio
+Una petición a https://dominio y otra a http://dominio, siguiendo los
+redirects a mano para guardar la cadena completa. De esa traza salen el
+estado HTTPS, los headers finales y la detección de servidor/CDN, en vez de
+evaluar_https + hacer_request (hasta cuatro descargas por dominio).
+
+Las dos cadenas comparten sesión: un redirect http -> https del mismo host
+no abre otra conexión, y si HTTPS ya respondió la cadena HTTP se corta en
+cuanto sube a https:// (ya sabemos que HTTPS es forzado).
+
+Solo se necesitan headers: cada salto es un HEAD (GET en streaming si el
+servidor no soporta HEAD) y del cuerpo se lee como mucho un tope pequeño.
+Del primer salto https:// se guardan certificado y protocolo TLS (tls_info),
+leídos del mismo socket.
+
+Todas las sondas del proceso usan UNA requests.Session con keep-alive y un
+pool de conexiones dimensionado a la concurrencia del escaneo.
+
+Cada host se resuelve por el cache DNS compartido (dns_cache), con un solo
+presupuesto de reintentos por dominio, y el adapter conecta directo a esas
+IPs (la siguiente si una no conecta) conservando SNI, verificación del
+certificado y header Host: sin getaddrinfo por petición, y el timing HTTP
+mide solo al servidor.
+
+Con plazo por dominio (plazo.Plazo) cada petición usa como timeout lo que
+quede del plazo; agotado, la traza termina con error "PlazoAgotado".
+Los timeouts de conexión y primer byte se aprenden de las latencias
+observadas (latencias.py); los fijos de abajo son el techo y el carril lento.
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import select_proxy
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.retry import Retry
+
+from dns_cache import PresupuestoReintentos, direcciones_en_cache, resolver_destino
+from latencias import ETAPA_LAT_CONEXION, ETAPA_LAT_PRIMER_BYTE, TimeoutAdaptativo, timeout_adaptativo
+from plazo import ETAPA_HTTP, Plazo
+from single_flight import SingleFlight
+from tls_info import InfoTLS, info_desde_ssl
+
+REQUEST_TIMEOUT = 10
+# Conectar es rápido o no ocurre: timeout corto y un reintento solo de conexión
+HTTP_TIMEOUT_CONEXION = 5
+HTTP_REINTENTOS_CONEXION = 1
+# Pisos de los timeouts adaptativos (los techos son los de arriba)
+HTTP_TIMEOUT_CONEXION_MIN = 0.5
+HTTP_TIMEOUT_PRIMER_BYTE_MIN = 1.0
+USER_AGENT = 'Mozilla/5.0 (compatible; SecurityAudit/1.0)'
+MAX_REDIRECTS = 10
+
+# Bytes del cuerpo final a conservar (0 = solo headers)
+HTTP_BYTES_CUERPO = int(os.environ.get("PROSPECTSCAN_HTTP_BYTES_CUERPO", "0"))
+# Cuerpos hasta este tamaño se leen enteros para devolver la conexión al pool;
+# los más grandes se cortan cerrando la conexión
+HTTP_BYTES_DRENAR = 16 * 1024
+# Respuestas a HEAD que indican "usa GET"
+HTTP_HEAD_NO_SOPORTADO = frozenset([405, 501])
+
+# Pool: conexiones guardadas por host = concurrencia; hosts con pool propio
+HTTP_CONCURRENCIA = 10
+HTTP_POOL_HOSTS = 200
+
+# Mismos valores que EstadoHTTPS en app_superficie.py / app_web.py
+ESTADO_HTTPS_FORZADO = "Forzado"
+ESTADO_HTTPS_DISPONIBLE = "Disponible"
+ESTADO_HTTPS_NO_DISPONIBLE = "No disponible"
+
+
+@dataclass
+class SaltoHTTP:
+    url: str
+    status: int
+
+
+@dataclass
+class TrazaHTTP:
+    """Cadena de respuestas de una URL inicial (la última es la final)."""
+    url_inicial: str
+    saltos: List[SaltoHTTP] = field(default_factory=list)
+    headers: Dict[str, str] = field(default_factory=dict)  # de la última respuesta
+    url_final: str = ""
+    error: Optional[str] = None
+    cuerpo: bytes = b""  # primeros bytes de la respuesta final (si se pidieron)
+    tls: Optional[InfoTLS] = None  # handshake del primer salto https://
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and bool(self.saltos)
+
+
+@dataclass
+class SondaHTTP:
+    dominio: str
+    https: TrazaHTTP
+    http: TrazaHTTP
+
+    @property
+    def estado_https(self) -> str:
+        if not self.https.ok:
+            return ESTADO_HTTPS_NO_DISPONIBLE
+        # HTTP caído con HTTPS funcionando también cuenta como forzado
+        if not self.http.ok or self.http.url_final.startswith("https://"):
+            return ESTADO_HTTPS_FORZADO
+        return ESTADO_HTTPS_DISPONIBLE
+
+    @property
+    def headers(self) -> Optional[Dict[str, str]]:
+        """Headers finales: HTTPS si respondió, si no HTTP; None si ninguno conectó."""
+        if self.https.ok:
+            return self.https.headers
+        if self.http.ok:
+            return self.http.headers
+        return None
+
+    @property
+    def tls(self) -> Optional[InfoTLS]:
+        """Certificado/protocolo de https://dominio (o del https al que redirige http)."""
+        return self.https.tls or self.http.tls
+
+
+TIMEOUT_CONEXION = timeout_adaptativo(
+    ETAPA_LAT_CONEXION, techo=HTTP_TIMEOUT_CONEXION, piso=HTTP_TIMEOUT_CONEXION_MIN
+)
+TIMEOUT_PRIMER_BYTE = timeout_adaptativo(
+    ETAPA_LAT_PRIMER_BYTE, techo=REQUEST_TIMEOUT, piso=HTTP_TIMEOUT_PRIMER_BYTE_MIN
+)
+
+
+def timeouts_http(
+    plazo: Plazo,
+    techo_conexion: float = HTTP_TIMEOUT_CONEXION,
+    techo_primer_byte: float = REQUEST_TIMEOUT,
+) -> "tuple[float, float]":
+    """(conexión, primer byte) adaptativos, o los techos en el carril lento."""
+    return (
+        TIMEOUT_CONEXION.limite(techo_conexion, plazo.carril_lento),
+        TIMEOUT_PRIMER_BYTE.limite(techo_primer_byte, plazo.carril_lento),
+    )
+
+
+def registrar_vencido(adaptativo: TimeoutAdaptativo, usado: float, techo: float, plazo: Plazo):
+    """Un timeout más corto que el techo, sin culpa del plazo: al carril lento."""
+    if usado < techo and not plazo.agotado:
+        adaptativo.vencido()
+        plazo.marcar_lento(ETAPA_HTTP)
+
+
+# ============================================================================
+# SESIÓN COMPARTIDA (KEEP-ALIVE)
+# ============================================================================
+
+# IP que está probando send() en este hilo (la toma get_connection_with_tls_context)
+# y plazo del dominio de la petición en curso (lo fija _pedir)
+_IP_DESTINO = threading.local()
+
+
+def _fallo_de_conexion(exc: requests.exceptions.ConnectionError) -> bool:
+    """True si no se llegó a conectar (rechazo o timeout de conexión): otra IP puede servir."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    razon = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(razon, (NewConnectionError, ConnectTimeoutError))
+
+
+class AdaptadorIPFijada(HTTPAdapter):
+    """
+    Conecta a las IPs que ya están en CACHE_DNS en vez de resolver con
+    getaddrinfo: en orden, pasando a la siguiente si la conexión falla.
+    El pool se abre contra la IP con server_hostname/assert_hostname = host
+    (SNI y certificado del host) y el header Host lleva el nombre original.
+    Sin IP en cache, o con proxy, se comporta como HTTPAdapter.
+
+    Con varias IPs la siguiente IP hace de reintento de conexión (sin el
+    Retry montado) y cada intento recibe como timeout solo lo que queda del
+    plazo del dominio: la conmutación no estira el plazo.
+    """
+
+    @property
+    def max_retries(self) -> Retry:
+        if getattr(_IP_DESTINO, "ip", None) is not None:
+            return self._sin_reintentos
+        return self._max_retries
+
+    @max_retries.setter
+    def max_retries(self, valor: Retry):
+        self._max_retries = valor
+        self._sin_reintentos = valor.new(total=0, connect=0)
+
+    def send(self, request, **kwargs):
+        ips = direcciones_en_cache(urlparse(request.url).hostname or "")
+        if len(ips) < 2 or select_proxy(request.url, kwargs.get("proxies")):
+            return super().send(request, **kwargs)
+        plazo = getattr(_IP_DESTINO, "plazo", None) or Plazo()
+        timeout = kwargs.get("timeout")
+        for i, ip in enumerate(ips):
+            _IP_DESTINO.ip = ip
+            if isinstance(timeout, tuple):
+                kwargs["timeout"] = tuple(t if t is None else plazo.acotar(t) for t in timeout)
+            try:
+                return super().send(request, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if i == len(ips) - 1 or not _fallo_de_conexion(e) or plazo.agotado:
+                    raise
+            finally:
+                _IP_DESTINO.ip = None
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        if select_proxy(request.url, proxies):
+            return super().get_connection_with_tls_context(request, verify, proxies, cert)
+        host_params, pool_kwargs = self.build_connection_pool_key_attributes(request, verify, cert)
+        host = host_params["host"]
+        ips = direcciones_en_cache(host)
+        ip = getattr(_IP_DESTINO, "ip", None) or (ips[0] if ips else host)
+        if ip != host:
+            if host_params["scheme"] == "https":
+                pool_kwargs["server_hostname"] = host
+                pool_kwargs["assert_hostname"] = host
+            host_params["host"] = ip
+        return self.poolmanager.connection_from_host(**host_params, pool_kwargs=pool_kwargs)
+
+    def add_headers(self, request, **kwargs):
+        # El mismo Host que urllib3 pondría con el nombre (la conexión va a la IP)
+        if "Host" not in request.headers:
+            request.headers["Host"] = urlparse(request.url).netloc.rpartition("@")[2]
+
+
+def crear_sesion(concurrencia: int = HTTP_CONCURRENCIA) -> requests.Session:
+    """Session con User-Agent, reintento de conexión y pool acorde a la concurrencia."""
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    # Sin cookies: la sesión la comparten todos los hilos y todos los prospectos
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = AdaptadorIPFijada(
+        pool_connections=max(HTTP_POOL_HOSTS, concurrencia),
+        pool_maxsize=max(concurrencia, 1),
+        max_retries=Retry(
+            total=HTTP_REINTENTOS_CONEXION, connect=HTTP_REINTENTOS_CONEXION,
+            read=0, status=0, redirect=0, other=0, backoff_factor=0.1,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_SESION: Optional[requests.Session] = None
+_SESION_CONCURRENCIA = 0
+_SESION_LOCK = threading.Lock()
+
+
+def configurar_sesion_http(concurrencia: int) -> requests.Session:
+    """
+    Sesión del proceso con pool para `concurrencia` hilos. Idempotente: los
+    reruns de Streamlit no tiran las conexiones abiertas si no cambia el tamaño.
+    """
+    global _SESION, _SESION_CONCURRENCIA
+    anterior = None
+    with _SESION_LOCK:
+        if _SESION is None or _SESION_CONCURRENCIA != concurrencia:
+            anterior, _SESION = _SESION, crear_sesion(concurrencia)
+            _SESION_CONCURRENCIA = concurrencia
+        sesion = _SESION
+    if anterior is not None:
+        anterior.close()
+    return sesion
+
+
+def obtener_sesion() -> requests.Session:
+    if _SESION is None:
+        return configurar_sesion_http(HTTP_CONCURRENCIA)
+    return _SESION
+
+
+# ============================================================================
+# SONDA
+# ============================================================================
+
+def _leer_cuerpo(resp: requests.Response, tope: int) -> bytes:
+    """Lee como mucho max(tope, HTTP_BYTES_DRENAR) bytes y cierra; retorna los primeros `tope`."""
+    datos = b""
+    try:
+        for trozo in resp.iter_content(chunk_size=8192):
+            datos += trozo
+            if len(datos) >= max(tope, HTTP_BYTES_DRENAR):
+                break
+    finally:
+        resp.close()
+    return datos[:tope]
+
+
+def _tls_de_respuesta(resp: requests.Response) -> Optional[InfoTLS]:
+    """Con stream=True el socket TLS sigue en la respuesta hasta leer el cuerpo."""
+    conexion = getattr(resp.raw, "connection", None) or getattr(resp.raw, "_connection", None)
+    return info_desde_ssl(getattr(conexion, "sock", None))
+
+
+def _pedir(
+    session: requests.Session,
+    metodo: str,
+    url: str,
+    plazo: Plazo,
+    presupuesto: Optional[PresupuestoReintentos] = None,
+) -> requests.Response:
+    """`presupuesto` es el del dominio: los redirects no renuevan los reintentos DNS."""
+    plazo.verificar(ETAPA_HTTP)
+    # A/AAAA por el cache compartido: el adapter conecta a esas IPs
+    resolver_destino(urlparse(url).hostname or "", presupuesto or PresupuestoReintentos(plazo=plazo))
+    conexion, primer_byte = timeouts_http(plazo)
+    _IP_DESTINO.plazo = plazo
+    try:
+        resp = session.request(
+            metodo,
+            url,
+            timeout=(plazo.acotar(conexion), plazo.acotar(primer_byte)),
+            allow_redirects=False,
+            verify=True,
+            stream=True,  # los headers llegan sin descargar el cuerpo
+        )
+    except requests.exceptions.ConnectTimeout:
+        registrar_vencido(TIMEOUT_CONEXION, conexion, HTTP_TIMEOUT_CONEXION, plazo)
+        raise
+    except requests.exceptions.ReadTimeout:
+        registrar_vencido(TIMEOUT_PRIMER_BYTE, primer_byte, REQUEST_TIMEOUT, plazo)
+        raise
+    finally:
+        _IP_DESTINO.plazo = None
+    # requests no separa la conexión: elapsed = envío -> headers (incluye el
+    # handshake si la conexión era nueva); la conexión la mide http_async
+    TIMEOUT_PRIMER_BYTE.registrar(resp.elapsed.total_seconds())
+    return resp
+
+
+def _seguir(
+    session: requests.Session,
+    url: str,
+    cortar_en_https: bool = False,
+    bytes_cuerpo: int = 0,
+    plazo: Optional[Plazo] = None,
+    presupuesto: Optional[PresupuestoReintentos] = None,
+) -> TrazaHTTP:
+    traza = TrazaHTTP(url_inicial=url, url_final=url)
+    plazo = plazo if plazo is not None else Plazo()
+    presupuesto = presupuesto if presupuesto is not None else PresupuestoReintentos(plazo=plazo)
+    usar_head = True
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = _pedir(session, "HEAD" if usar_head else "GET", url, plazo, presupuesto)
+            if usar_head and resp.status_code in HTTP_HEAD_NO_SOPORTADO:
+                _leer_cuerpo(resp, 0)  # leído hasta el final la conexión vuelve al pool
+                usar_head = False  # el resto de la cadena va por GET
+                resp = _pedir(session, "GET", url, plazo, presupuesto)
+
+            es_redirect = resp.is_redirect
+            if not es_redirect and bytes_cuerpo > 0 and usar_head:
+                # Se pidió cuerpo: solo la respuesta final se repite como GET
+                _leer_cuerpo(resp, 0)
+                resp = _pedir(session, "GET", url, plazo, presupuesto)
+                es_redirect = resp.is_redirect
+
+            traza.saltos.append(SaltoHTTP(url, resp.status_code))
+            traza.headers = dict(resp.headers)
+            if traza.tls is None and url.startswith("https://"):
+                traza.tls = _tls_de_respuesta(resp)
+            cuerpo = _leer_cuerpo(resp, 0 if es_redirect else bytes_cuerpo)
+            if not es_redirect:
+                traza.cuerpo = cuerpo
+                break
+            url = urljoin(resp.url, resp.headers['Location'])
+            traza.url_final = url
+            if cortar_en_https and url.startswith("https://"):
+                break
+        else:
+            traza.error = "Demasiados redirects"
+    except Exception as e:
+        traza.error = type(e).__name__
+        if plazo.agotado:
+            plazo.cortar(ETAPA_HTTP)
+    return traza
+
+
+def _sondear(dominio: str, bytes_cuerpo: int, plazo: Optional[Plazo]) -> SondaHTTP:
+    session = obtener_sesion()
+    plazo = plazo if plazo is not None else Plazo()
+    # Un solo presupuesto de reintentos DNS para todas las peticiones del dominio
+    presupuesto = PresupuestoReintentos(plazo=plazo)
+    with plazo.activo():
+        https = _seguir(
+            session, f"https://{dominio}", bytes_cuerpo=bytes_cuerpo, plazo=plazo, presupuesto=presupuesto
+        )
+        http = _seguir(
+            session, f"http://{dominio}", cortar_en_https=https.ok,
+            bytes_cuerpo=0 if https.ok else bytes_cuerpo, plazo=plazo, presupuesto=presupuesto,
+        )
+    return SondaHTTP(dominio, https, http)
+
+
+# Sondas idénticas en vuelo se comparten entre hilos y sesiones de Streamlit
+_VUELOS_SONDA = SingleFlight()
+
+
+def sondear(
+    dominio: str,
+    bytes_cuerpo: int = HTTP_BYTES_CUERPO,
+    plazo: Optional[Plazo] = None,
+) -> SondaHTTP:
+    """
+    Traza https:// y http:// del dominio (máx. una conexión por esquema y host).
+    bytes_cuerpo > 0 conserva ese prefijo del cuerpo final en traza.cuerpo.
+    """
+    return _VUELOS_SONDA.hacer((dominio, bytes_cuerpo), _sondear, dominio, bytes_cuerpo, plazo, plazo=plazo)
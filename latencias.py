@@ -0,0 +1,115 @@
+"""
+ProspectScan - Timeouts adaptativos por etapa
+Histograma móvil de latencias observadas en cada etapa (DNS, conexión TLS,
+primer byte, RDAP, WHOIS). El timeout de la etapa sale de ahí: p99 × factor,
+acotado entre un piso y un techo (el timeout fijo de siempre).
+
+La mayoría de los prospectos responde en milisegundos y los que no, casi
+nunca responden: con el timeout aprendido el caso común avanza rápido. Lo
+que venza un timeout adaptativo (más corto que el techo) se marca en el
+plazo del dominio y se reintenta con el techo en el carril lento, al final
+del lote, para no perder sitios lentos pero reales.
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+# p99 de la ventana × factor de seguridad
+LATENCIA_PERCENTIL = 0.99
+LATENCIA_FACTOR = float(os.environ.get("PROSPECTSCAN_TIMEOUT_FACTOR", "3.0"))
+LATENCIA_VENTANA = 1024
+# Con menos muestras que esto se usa el techo (timeout fijo)
+LATENCIA_MUESTRAS_MIN = 50
+
+# Nombres de etapa (mismos que en estadísticas)
+ETAPA_LAT_DNS = "DNS"
+ETAPA_LAT_CONEXION = "Conexión TLS"
+ETAPA_LAT_PRIMER_BYTE = "Primer byte"
+ETAPA_LAT_WHOIS = "WHOIS"
+ETAPA_LAT_RDAP = "RDAP"
+
+
+class TimeoutAdaptativo:
+    """Ventana de latencias de una etapa y el timeout derivado de ella."""
+
+    def __init__(
+        self,
+        etapa: str,
+        techo: float,
+        piso: float,
+        factor: float = LATENCIA_FACTOR,
+        percentil: float = LATENCIA_PERCENTIL,
+        ventana: int = LATENCIA_VENTANA,
+        muestras_min: int = LATENCIA_MUESTRAS_MIN,
+    ):
+        self.etapa = etapa
+        self.techo = techo
+        self.piso = min(piso, techo)
+        self.factor = factor
+        self.percentil = percentil
+        self.muestras_min = muestras_min
+        self._muestras: Deque[float] = deque(maxlen=max(ventana, 1))
+        self._lock = threading.Lock()
+        self.vencidos = 0  # timeouts adaptativos que mandaron algo al carril lento
+
+    def registrar(self, segundos: float):
+        """Solo respuestas completas: un timeout no es una latencia observada."""
+        with self._lock:
+            self._muestras.append(segundos)
+
+    def percentil_observado(self, p: float) -> float:
+        with self._lock:
+            muestras = sorted(self._muestras)
+        if not muestras:
+            return 0.0
+        return muestras[min(int(p * len(muestras)), len(muestras) - 1)]
+
+    def valor(self) -> float:
+        """Timeout actual de la etapa: techo hasta juntar muestras suficientes."""
+        with self._lock:
+            if len(self._muestras) < self.muestras_min:
+                return self.techo
+        p = self.percentil_observado(self.percentil)
+        return min(max(p * self.factor, self.piso), self.techo)
+
+    def limite(self, timeout: float, lento: bool = False) -> float:
+        """min(timeout, valor()); en el carril lento solo cuenta `timeout`."""
+        return timeout if lento else min(timeout, self.valor())
+
+    def vencido(self):
+        with self._lock:
+            self.vencidos += 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            n = len(self._muestras)
+        return {
+            "etapa": self.etapa,
+            "muestras": n,
+            "p50": self.percentil_observado(0.5),
+            "p99": self.percentil_observado(0.99),
+            "timeout": self.valor(),
+            "piso": self.piso,
+            "techo": self.techo,
+            "vencidos": self.vencidos,
+        }
+
+
+_TIMEOUTS: Dict[str, TimeoutAdaptativo] = {}
+_TIMEOUTS_LOCK = threading.Lock()
+
+
+def timeout_adaptativo(etapa: str, techo: float, piso: float) -> TimeoutAdaptativo:
+    """Instancia única por etapa (los reruns de Streamlit no pierden el histograma)."""
+    with _TIMEOUTS_LOCK:
+        if etapa not in _TIMEOUTS:
+            _TIMEOUTS[etapa] = TimeoutAdaptativo(etapa, techo, piso)
+        return _TIMEOUTS[etapa]
+
+
+def estadisticas_timeouts() -> Dict[str, dict]:
+    with _TIMEOUTS_LOCK:
+        etapas = list(_TIMEOUTS.values())
+    return {t.etapa: t.estadisticas() for t in etapas}
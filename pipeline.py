@@ -0,0 +1,341 @@
+"""
+ProspectScan - Pipeline por etapas con colas acotadas
+Cada etapa (existencia, DNS, HTTP, antigüedad, puntuación) tiene su propia
+cola de entrada acotada y su propio límite de concurrencia. Un dominio pasa
+a la etapa siguiente en cuanto termina la anterior, sin esperar al resto
+del lote: el DNS barato no hace fila detrás de las sondas HTTP lentas.
+
+Dos tipos de etapa:
+- EtapaHilos: N hilos que llaman a fn(item) (llamadas bloqueantes: RDAP/WHOIS,
+  puntuación, sondas con requests).
+- EtapaAsync: un event loop propio en su hilo con hasta N corrutinas a la vez
+  (DNS y httpx). Los recursos que viven en el loop (cliente httpx, semáforos,
+  expansor SPF) los crea `abrir`, un async context manager que entrega la
+  corrutina por item.
+
+El ruteo lo decide el `destino(item, resultado, error)` de cada etapa; una
+cola llena bloquea a quien pone (contrapresión). Un destino que reparte a
+varias ramas usa `encargar` para las lentas: el item espera en una fila
+propia de esa rama y no frena a las demás. Una etapa se cierra cuando
+terminan todas sus `previas`. Si quien consume deja de leer (cierra el
+generador de `ejecutar`), la entrada deja de alimentarse, las etapas vacían
+sus colas sin llamar a fn y lo que aún esté en vuelo se descarta.
+"""
+
+import abc
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+from typing import Any, AsyncContextManager, Awaitable, Callable, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de cola (un item que ninguna etapa produce)
+_FIN = object()
+
+Destino = Callable[[Any, Any, Optional[BaseException]], None]
+
+
+class Etapa(abc.ABC):
+    """Cola de entrada acotada + hasta `concurrencia` items en proceso."""
+
+    def __init__(
+        self,
+        nombre: str,
+        destino: Destino,
+        concurrencia: int,
+        capacidad: Optional[int] = None,
+    ):
+        self.nombre = nombre
+        self.destino = destino
+        self.concurrencia = max(int(concurrencia), 1)
+        # Por defecto la cola aguanta dos tandas completas de la etapa
+        self.cola: "queue.Queue[Any]" = queue.Queue(maxsize=capacidad or 2 * self.concurrencia)
+        self.previas: List["Etapa"] = []
+        self.terminada = threading.Event()
+        # Pipeline.agregar lo reemplaza por el del pipeline
+        self.cancelado = threading.Event()
+        self._lock = threading.Lock()
+        self._encargos: "Optional[queue.Queue[Any]]" = None
+        self.recibidos = 0
+        self.procesados = 0
+        self.errores = 0
+
+    def poner(self, item: Any):
+        """Encola un item; bloquea mientras la cola esté llena. Cancelado, lo descarta."""
+        if self.cancelado.is_set():
+            return
+        with self._lock:
+            self.recibidos += 1
+        self.cola.put(item)
+
+    def encargar(self, item: Any):
+        """
+        Como poner, sin bloquear a quien llama: el item espera en una fila sin
+        tope hasta que haya lugar en la cola (un hilo de la etapa lo pasa).
+        """
+        with self._lock:
+            if self._encargos is None:
+                self._encargos = queue.Queue()
+                threading.Thread(
+                    target=self._pasar_encargos, name=f"{self.nombre}-encargos", daemon=True
+                ).start()
+            encargos = self._encargos
+        encargos.put(item)
+
+    def _pasar_encargos(self):
+        while True:
+            item = self._encargos.get()
+            try:
+                if item is _FIN:
+                    return
+                self.poner(item)
+            finally:
+                self._encargos.task_done()
+
+    def esperar_encargos(self):
+        """Bloquea hasta que todo lo encargado pasó a la cola (antes de cerrar)."""
+        with self._lock:
+            encargos = self._encargos
+        if encargos is not None:
+            encargos.put(_FIN)
+            encargos.join()
+
+    @abc.abstractmethod
+    def iniciar(self):
+        """Arranca los hilos (o el event loop) que consumen la cola."""
+
+    @abc.abstractmethod
+    def cerrar(self):
+        """Avisa que no llegan más items: la etapa termina al vaciar la cola."""
+
+    def _entregar(self, item: Any, resultado: Any, error: Optional[BaseException]):
+        with self._lock:
+            self.procesados += 1
+            if error is not None:
+                self.errores += 1
+        if self.cancelado.is_set():
+            return  # Nadie lee la salida: el resultado se descarta
+        try:
+            self.destino(item, resultado, error)
+        except Exception:
+            # Un destino roto no puede dejar a las etapas siguientes esperando
+            logger.exception("Destino de la etapa %s falló", self.nombre)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "etapa": self.nombre,
+                "concurrencia": self.concurrencia,
+                "en_cola": self.cola.qsize(),
+                "recibidos": self.recibidos,
+                "procesados": self.procesados,
+                "errores": self.errores,
+            }
+
+
+class EtapaHilos(Etapa):
+    """N hilos propios que toman de la cola y llaman a fn(item)."""
+
+    def __init__(
+        self,
+        nombre: str,
+        fn: Callable[[Any], Any],
+        destino: Destino,
+        concurrencia: int,
+        capacidad: Optional[int] = None,
+    ):
+        super().__init__(nombre, destino, concurrencia, capacidad)
+        self.fn = fn
+        self._vivos = 0
+
+    def iniciar(self):
+        self._vivos = self.concurrencia
+        for i in range(self.concurrencia):
+            threading.Thread(target=self._trabajar, name=f"{self.nombre}-{i}", daemon=True).start()
+
+    def _trabajar(self):
+        try:
+            while True:
+                item = self.cola.get()
+                if item is _FIN:
+                    break
+                if self.cancelado.is_set():
+                    continue  # Solo vaciar la cola hasta _FIN
+                try:
+                    resultado, error = self.fn(item), None
+                except Exception as e:
+                    resultado, error = None, e
+                self._entregar(item, resultado, error)
+        finally:
+            with self._lock:
+                self._vivos -= 1
+                ultimo = self._vivos == 0
+            if ultimo:
+                self.terminada.set()
+
+    def cerrar(self):
+        for _ in range(self.concurrencia):
+            self.cola.put(_FIN)
+
+
+class EtapaAsync(Etapa):
+    """Un event loop en su propio hilo con hasta N corrutinas en vuelo."""
+
+    def __init__(
+        self,
+        nombre: str,
+        abrir: Callable[[], AsyncContextManager[Callable[[Any], Awaitable[Any]]]],
+        destino: Destino,
+        concurrencia: int,
+        capacidad: Optional[int] = None,
+    ):
+        super().__init__(nombre, destino, concurrencia, capacidad)
+        self.abrir = abrir
+        self._fin_recibido = False
+
+    def iniciar(self):
+        threading.Thread(target=self._correr, name=self.nombre, daemon=True).start()
+
+    def _correr(self):
+        try:
+            asyncio.run(self._bucle())
+        except Exception as e:
+            # Sin recursos de la etapa (p. ej. no se pudo abrir el cliente): cada
+            # item sale con el error y su destino decide el fallback
+            logger.exception("Etapa %s sin event loop", self.nombre)
+            while not self._fin_recibido:
+                item = self.cola.get()
+                if item is _FIN:
+                    self._fin_recibido = True
+                    break
+                self._entregar(item, None, e)
+        finally:
+            self.terminada.set()
+
+    async def _bucle(self):
+        # Hilos propios para lo bloqueante (esperar la cola, entregar a la
+        # siguiente): el executor por defecto lo comparten todos los loops
+        ejecutor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrencia + 1, thread_name_prefix=self.nombre
+        )
+        try:
+            async with self.abrir() as fn:
+                semaforo = asyncio.Semaphore(self.concurrencia)
+                loop = asyncio.get_running_loop()
+                tareas = set()
+                while True:
+                    await semaforo.acquire()
+                    # Solo se toma un item cuando hay lugar: la cola hace de contrapresión
+                    item = await loop.run_in_executor(ejecutor, self.cola.get)
+                    if item is _FIN:
+                        self._fin_recibido = True
+                        break
+                    if self.cancelado.is_set():
+                        semaforo.release()  # Solo vaciar la cola hasta _FIN
+                        continue
+                    tarea = asyncio.ensure_future(self._procesar(fn, item, semaforo, ejecutor))
+                    tareas.add(tarea)
+                    tarea.add_done_callback(tareas.discard)
+                if tareas:
+                    await asyncio.gather(*tareas)
+        finally:
+            ejecutor.shutdown(wait=False)
+
+    async def _procesar(
+        self,
+        fn: Callable[[Any], Awaitable[Any]],
+        item: Any,
+        semaforo: asyncio.Semaphore,
+        ejecutor: concurrent.futures.Executor,
+    ):
+        try:
+            try:
+                resultado, error = await fn(item), None
+            except Exception as e:
+                resultado, error = None, e
+            # El destino puede bloquear (cola siguiente llena): fuera del loop
+            await asyncio.get_running_loop().run_in_executor(ejecutor, self._entregar, item, resultado, error)
+        finally:
+            semaforo.release()
+
+    def cerrar(self):
+        self.cola.put(_FIN)
+
+
+class Pipeline:
+    """Etapas encadenadas y una cola de salida que consume el hilo que llama."""
+
+    def __init__(self, capacidad_salida: int = 256):
+        self.etapas: List[Etapa] = []
+        self.salida: "queue.Queue[Any]" = queue.Queue(maxsize=capacidad_salida)
+        self.cancelado = threading.Event()
+
+    def agregar(self, etapa: Etapa, previas: Iterable[Etapa] = ()) -> Etapa:
+        """`etapa` se cierra cuando terminan todas sus `previas` (sin previas: al agotar la entrada)."""
+        etapa.previas = list(previas)
+        etapa.cancelado = self.cancelado
+        self.etapas.append(etapa)
+        return etapa
+
+    def emitir(self, item: Any):
+        """Entrega un resultado final (bloquea si quien consume va atrasado)."""
+        while not self.cancelado.is_set():
+            try:
+                self.salida.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def estadisticas(self) -> List[dict]:
+        return [e.estadisticas() for e in self.etapas]
+
+    def _cerrar_tras(self, etapa: Etapa):
+        for previa in etapa.previas:
+            previa.terminada.wait()
+        etapa.esperar_encargos()
+        etapa.cerrar()
+
+    def _alimentar(self, items: Iterable[Any], entrada: Etapa):
+        try:
+            for item in items:
+                if self.cancelado.is_set():
+                    break
+                entrada.poner(item)
+        finally:
+            entrada.cerrar()
+
+    def _fin_tras_etapas(self):
+        for etapa in self.etapas:
+            etapa.terminada.wait()
+        self.emitir(_FIN)
+
+    def ejecutar(self, items: Iterable[Any], entrada: Etapa, intervalo: Optional[float] = None) -> Iterator[Any]:
+        """
+        Arranca las etapas, alimenta `entrada` desde otro hilo (quien consume
+        nunca se bloquea poniendo) y entrega lo emitido hasta que todas
+        terminan. Con `intervalo`, si pasa ese tiempo sin resultados entrega
+        None para que quien consume pueda refrescar el progreso.
+        """
+        for etapa in self.etapas:
+            etapa.iniciar()
+            if etapa.previas:
+                threading.Thread(target=self._cerrar_tras, args=(etapa,), daemon=True).start()
+        threading.Thread(target=self._alimentar, args=(items, entrada), daemon=True).start()
+        threading.Thread(target=self._fin_tras_etapas, daemon=True).start()
+
+        try:
+            while True:
+                try:
+                    item = self.salida.get(timeout=intervalo)
+                except queue.Empty:
+                    yield None
+                    continue
+                if item is _FIN:
+                    return
+                yield item
+        finally:
+            # Sin nadie leyendo: no alimentar más ni bloquear en la salida
+            self.cancelado.set()
@@ -0,0 +1,226 @@
+"""
+ProspectScan - Plazo de tiempo por dominio
+Un presupuesto de segundos que comparten TODAS las consultas de un dominio
+(DNS, HTTP y WHOIS): cada llamada recibe solo el tiempo que queda y, cuando
+se agota, el dominio se entrega como resultado parcial en vez de bloquear
+al worker.
+
+El reloj corre solo mientras alguna consulta del dominio está en vuelo
+(plazo.activo()): esperar turno en el semáforo del lote, o a que termine
+la fase anterior para los demás dominios, no consume el plazo. Consultas
+simultáneas del mismo dominio (MX, TXT y DMARC a la vez) cuentan una sola vez.
+
+El plazo también anota las etapas que vencieron un timeout adaptativo
+(latencias.py) para reintentarlas en el carril lento al final del lote.
+"""
+
+import concurrent.futures
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from latencias import TimeoutAdaptativo
+
+# Segundos por dominio para todo el escaneo (0 = sin límite)
+PLAZO_DOMINIO_SEGUNDOS = float(os.environ.get("PROSPECTSCAN_PLAZO_DOMINIO", "30"))
+
+# Etapas que pueden quedar cortadas por el plazo
+ETAPA_DNS = "DNS"
+ETAPA_HTTP = "HTTP"
+ETAPA_WHOIS = "WHOIS"
+
+
+# Marcas ("corte"/"lento", etapa) hechas dentro de registrar_marcas(): una
+# llamada compartida (single_flight) las replica en el plazo de cada seguidor
+_MARCAS: "contextvars.ContextVar[Optional[List[Tuple[str, str]]]]" = contextvars.ContextVar(
+    "marcas_plazo", default=None
+)
+
+
+@contextlib.contextmanager
+def registrar_marcas() -> Iterator[List[Tuple[str, str]]]:
+    """Junta las marcas que hace este hilo/tarea (y sus subtareas) en cualquier plazo."""
+    marcas: List[Tuple[str, str]] = []
+    token = _MARCAS.set(marcas)
+    try:
+        yield marcas
+    finally:
+        _MARCAS.reset(token)
+        # Anidado (una sonda que resuelve DNS): las marcas suben también al de afuera
+        externas = _MARCAS.get()
+        if externas is not None:
+            externas.extend(marcas)
+
+
+def aplicar_marcas(plazo: Optional["Plazo"], marcas: List[Tuple[str, str]]):
+    """Replica en `plazo` las marcas de una llamada que hizo otro."""
+    if plazo is None:
+        return
+    for tipo, etapa in marcas:
+        if tipo == "corte":
+            plazo.cortar(etapa)
+        else:
+            plazo.marcar_lento(etapa)
+
+
+def _anotar(tipo: str, etapa: str):
+    marcas = _MARCAS.get()
+    if marcas is not None:
+        marcas.append((tipo, etapa))
+
+
+class PlazoAgotado(Exception):
+    """La etapa no se intentó (o se cortó) porque el dominio ya no tiene tiempo."""
+
+    def __init__(self, etapa: str):
+        super().__init__(f"Plazo agotado en {etapa}")
+        self.etapa = etapa
+
+
+class Plazo:
+    """Reloj pausable de un dominio; seguro entre hilos y dentro de un event loop."""
+
+    def __init__(self, segundos: Optional[float] = None):
+        # None o <= 0: sin límite (las llamadas usan sus timeouts de siempre)
+        self.segundos = segundos if segundos and segundos > 0 else None
+        self._lock = threading.Lock()
+        self._consumido = 0.0
+        self._activos = 0
+        self._desde = 0.0
+        self.cortes: List[str] = []  # etapas que no terminaron por el plazo
+        self.lentos: List[str] = []  # etapas que vencieron un timeout adaptativo
+        # En el carril lento cada llamada usa su timeout fijo (techo)
+        self.carril_lento = False
+
+    @contextlib.contextmanager
+    def activo(self) -> Iterator["Plazo"]:
+        """El reloj corre mientras haya al menos un bloque activo (reentrante)."""
+        with self._lock:
+            if self._activos == 0:
+                self._desde = time.monotonic()
+            self._activos += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._activos -= 1
+                if self._activos == 0:
+                    self._consumido += time.monotonic() - self._desde
+
+    def consumido(self) -> float:
+        with self._lock:
+            if self._activos:
+                return self._consumido + time.monotonic() - self._desde
+            return self._consumido
+
+    def restante(self) -> Optional[float]:
+        """Segundos que quedan; None si no hay límite."""
+        if self.segundos is None:
+            return None
+        return max(self.segundos - self.consumido(), 0.0)
+
+    @property
+    def agotado(self) -> bool:
+        restante = self.restante()
+        return restante is not None and restante <= 0
+
+    def acotar(self, timeout: float) -> float:
+        """min(timeout, restante): ninguna llamada espera más de lo que queda."""
+        restante = self.restante()
+        return timeout if restante is None else min(timeout, restante)
+
+    def cortar(self, etapa: str):
+        _anotar("corte", etapa)
+        with self._lock:
+            if etapa not in self.cortes:
+                self.cortes.append(etapa)
+
+    def marcar_lento(self, etapa: str):
+        _anotar("lento", etapa)
+        with self._lock:
+            if etapa not in self.lentos:
+                self.lentos.append(etapa)
+
+    def pasar_a_carril_lento(self):
+        """Reintento con timeouts fijos; el tiempo ya consumido sigue contando."""
+        with self._lock:
+            self.carril_lento = True
+            self.lentos = []
+
+    def verificar(self, etapa: str):
+        """Lanza PlazoAgotado (y registra el corte) si ya no queda tiempo."""
+        if self.agotado:
+            self.cortar(etapa)
+            raise PlazoAgotado(etapa)
+
+    @property
+    def parcial(self) -> bool:
+        return bool(self.cortes)
+
+
+# Hilos para llamadas bloqueantes sin timeout propio (WHOIS). Si el plazo se
+# agota, el worker deja de esperar y la llamada termina aquí por su cuenta.
+_EJECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="plazo")
+
+
+def ejecutar_con_plazo(
+    plazo: Optional[Plazo],
+    etapa: str,
+    fn: Callable[..., Any],
+    *args,
+    defecto: Any = None,
+    adaptativo: Optional[TimeoutAdaptativo] = None,
+    techo: Optional[float] = None,
+) -> Any:
+    """
+    fn(*args) esperando como mucho lo que resta del plazo y, con `adaptativo`,
+    su timeout aprendido (techo en el carril lento). Sin ningún límite se
+    llama directo. Si vence un timeout adaptativo más corto que el techo la
+    etapa queda marcada como lenta; si vence el plazo o el techo (carril
+    lento), queda cortada: el resultado es parcial y no se cachea. En todos
+    los casos retorna `defecto`.
+
+    El reloj arranca cuando un hilo de _EJECUTOR toma la llamada: la cola
+    (hilos ocupados por llamadas abandonadas) no se cobra al plazo. Si
+    ningún hilo la toma dentro del límite, se descarta y la etapa queda
+    marcada como lenta para el carril lento (cortada si ya es el carril lento).
+    """
+    plazo = plazo if plazo is not None else Plazo()
+    timeout = None
+    if adaptativo is not None:
+        techo = adaptativo.techo if techo is None else techo
+        timeout = adaptativo.limite(techo, plazo.carril_lento)
+    limite = plazo.restante() if timeout is None else plazo.acotar(timeout)
+    if limite is None:
+        return fn(*args)
+    if plazo.agotado:
+        plazo.cortar(etapa)
+        return defecto
+
+    empezo = threading.Event()
+
+    def correr():
+        empezo.set()
+        return fn(*args)
+
+    futuro = _EJECUTOR.submit(correr)
+    if not empezo.wait(limite) and futuro.cancel():
+        if plazo.carril_lento:
+            plazo.cortar(etapa)
+        else:
+            plazo.marcar_lento(etapa)
+        return defecto
+    with plazo.activo():
+        try:
+            return futuro.result(timeout=limite)
+        except concurrent.futures.TimeoutError:
+            if not plazo.agotado and timeout is not None and timeout < techo:
+                adaptativo.vencido()
+                plazo.marcar_lento(etapa)
+            else:
+                # Plazo o techo vencido: sin reintento posible, el dominio queda parcial
+                plazo.cortar(etapa)
+            return defecto
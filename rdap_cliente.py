@@ -0,0 +1,186 @@
+"""
+ProspectScan - Antigüedad de dominio vía RDAP
+RDAP (RFC 9083) devuelve JSON estructurado: la fecha de creación es el
+evento "registration", sin scrapear el texto libre del puerto 43. El
+servidor de cada TLD sale del bootstrap de IANA incluido en
+data/rdap_dns.json (RFC 9224): copia sin modificar de
+https://data.iana.org/rdap/dns.json; para actualizarlo se reemplaza el
+archivo entero por el publicado.
+
+Todas las consultas usan UNA requests.Session con keep-alive: un lote de
+.com reutiliza la misma conexión a rdap.verisign.com. Cada servidor RDAP
+tiene su token bucket (el mismo LimiteRegistro de whois_cliente) y un 429
+lo pone en enfriamiento.
+
+Solo si el TLD no tiene servidor RDAP (p. ej. .mx) se cae a WHOIS.
+Un error de red o del servidor se lanza (no es "sin fecha"): quien llama
+deja la etapa como parcial para reintentarla.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from latencias import ETAPA_LAT_RDAP, timeout_adaptativo
+from single_flight import SingleFlight
+from whois_cliente import CLIENTE_WHOIS, WHOIS_ESPERA_MAX, LimiteRegistro, WhoisLimitado, tld_whois
+
+# ============================================================================
+# CONFIGURACIÓN
+# ============================================================================
+
+RDAP_BOOTSTRAP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rdap_dns.json")
+
+# Techo y piso del timeout adaptativo de RDAP (latencias.py)
+RDAP_TIMEOUT = 10
+RDAP_TIMEOUT_MIN = 1.0
+TIMEOUT_RDAP = timeout_adaptativo(ETAPA_LAT_RDAP, techo=RDAP_TIMEOUT, piso=RDAP_TIMEOUT_MIN)
+
+# Consultas por segundo por servidor RDAP (token bucket)
+RDAP_QPS = float(os.environ.get("PROSPECTSCAN_RDAP_QPS", "10"))
+RDAP_RAFAGA = 10
+
+# Conexiones keep-alive por servidor (igual a la concurrencia de la fase de antigüedad)
+RDAP_POOL_CONEXIONES = 8
+
+# Respuestas definitivas cacheadas en memoria (la caché permanente está en Neon)
+RDAP_CACHE_MAX = 4096
+
+USER_AGENT = "Mozilla/5.0 (compatible; SecurityAudit/1.0)"
+_FECHA_ISO = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+
+@lru_cache(maxsize=1)
+def _cargar_bootstrap() -> Dict[str, str]:
+    """TLD -> URL base del servidor RDAP (la primera https:// de cada servicio)."""
+    servidores: Dict[str, str] = {}
+    try:
+        with open(RDAP_BOOTSTRAP_PATH, encoding="utf-8") as f:
+            bootstrap = json.load(f)
+    except (OSError, ValueError):
+        return servidores  # Sin bootstrap: todo va por WHOIS
+    for tlds, urls in bootstrap.get("services", []):
+        base = next((u for u in urls if u.startswith("https://")), urls[0] if urls else None)
+        if not base:
+            continue
+        base = base if base.endswith("/") else base + "/"
+        for tld in tlds:
+            servidores[tld.lower()] = base
+    return servidores
+
+
+def servidor_rdap(dominio: str) -> Optional[str]:
+    """URL base RDAP del TLD del dominio; None si el registro no publica RDAP."""
+    return _cargar_bootstrap().get(tld_whois(dominio))
+
+
+def _parsear_fecha(valor: str) -> Optional[datetime]:
+    """Fecha RFC 3339 de RDAP como datetime UTC sin zona (se compara con datetime.now())."""
+    try:
+        fecha = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        m = _FECHA_ISO.match(valor or "")
+        return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))) if m else None
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def fecha_registro(respuesta: dict) -> Optional[datetime]:
+    """Evento "registration" de una respuesta RDAP de dominio."""
+    for evento in respuesta.get("events") or []:
+        if evento.get("eventAction") == "registration":
+            return _parsear_fecha(evento.get("eventDate"))
+    return None
+
+
+class ClienteRdap:
+    """RDAP concurrente: sesión compartida, límite por servidor y caché de respuestas definitivas."""
+
+    def __init__(self, espera_max: float = WHOIS_ESPERA_MAX, timeout: float = RDAP_TIMEOUT):
+        self.espera_max = espera_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.session.headers["Accept"] = "application/rdap+json, application/json"
+        adapter = HTTPAdapter(pool_connections=RDAP_POOL_CONEXIONES, pool_maxsize=RDAP_POOL_CONEXIONES)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._limites: Dict[str, LimiteRegistro] = {}
+        self._cache: "OrderedDict[str, Optional[datetime]]" = OrderedDict()
+        self._vuelos = SingleFlight()
+
+    def limite(self, servidor: str) -> LimiteRegistro:
+        host = urlparse(servidor).hostname or servidor
+        with self._lock:
+            if host not in self._limites:
+                self._limites[host] = LimiteRegistro(host, RDAP_QPS, RDAP_RAFAGA)
+            return self._limites[host]
+
+    def fecha_creacion(self, dominio: str, servidor: str) -> Optional[datetime]:
+        """
+        Fecha de registro según `servidor` (None si no existe o no la publica).
+        Lanza WhoisLimitado ante un 429 y requests.RequestException/OSError
+        si la red o el servidor fallan; ninguno queda en caché.
+        """
+        with self._lock:
+            if dominio in self._cache:
+                self._cache.move_to_end(dominio)
+                return self._cache[dominio]
+        return self._vuelos.hacer(dominio, self._consultar, dominio, servidor)
+
+    def _consultar(self, dominio: str, servidor: str) -> Optional[datetime]:
+        limite = self.limite(servidor)
+        limite.esperar_turno(self.espera_max)
+
+        inicio = time.monotonic()
+        resp = self.session.get(f"{servidor}domain/{dominio}", timeout=self.timeout)
+        try:
+            if resp.status_code == 429:
+                raise WhoisLimitado(limite.tld, limite.rechazo())
+            if resp.status_code == 404:
+                fecha = None  # El registro no lo conoce: respuesta definitiva
+            else:
+                resp.raise_for_status()
+                fecha = fecha_registro(resp.json())
+        finally:
+            resp.close()
+        limite.exito()
+        TIMEOUT_RDAP.registrar(time.monotonic() - inicio)
+        self._guardar(dominio, fecha)
+        return fecha
+
+    def _guardar(self, dominio: str, fecha: Optional[datetime]):
+        with self._lock:
+            self._cache[dominio] = fecha
+            self._cache.move_to_end(dominio)
+            while len(self._cache) > RDAP_CACHE_MAX:
+                self._cache.popitem(last=False)
+
+    def estadisticas(self) -> Dict[str, dict]:
+        with self._lock:
+            limites = list(self._limites.values())
+        return {l.tld: l.estadisticas() for l in limites}
+
+
+# Un cliente por proceso: keep-alive y límites compartidos entre sesiones de Streamlit
+CLIENTE_RDAP = ClienteRdap()
+
+
+def fecha_creacion_dominio(dominio: str) -> Optional[datetime]:
+    """Fecha de creación por RDAP; WHOIS solo si el TLD no tiene servidor RDAP."""
+    servidor = servidor_rdap(dominio)
+    if servidor is None:
+        return CLIENTE_WHOIS.fecha_creacion(dominio)
+    return CLIENTE_RDAP.fecha_creacion(dominio, servidor)
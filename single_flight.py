@@ -0,0 +1,117 @@
+"""
+ProspectScan - Single-flight para consultas en vuelo
+Si dos hilos (o dos sesiones de Streamlit del mismo proceso) piden la misma
+clave al mismo tiempo, solo uno sale a la red; los demás esperan su resultado.
+A diferencia de lru_cache, también ayuda ANTES de que la primera llamada termine.
+
+Cada quien llama con su propio plazo: las marcas que la llamada real dejó en
+el plazo del líder (corte, timeout adaptativo vencido) se replican en el de
+cada seguidor. Si el líder se cancela, su cancelación no se comparte: el
+primer seguidor que lo note toma la posta y repite la llamada.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from plazo import Plazo, aplicar_marcas, registrar_marcas
+
+
+class LiderCancelado(Exception):
+    """El líder se canceló antes de terminar; los seguidores reintentan."""
+
+
+# Lo que reciben los seguidores: (resultado, excepción, marcas del plazo)
+Desenlace = Tuple[Any, Optional[BaseException], List[Tuple[str, str]]]
+
+
+class SingleFlight:
+    """Coalesce llamadas concurrentes con la misma clave (sync y asyncio)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo: Dict[Hashable, concurrent.futures.Future] = {}
+        self.lideres = 0
+        self.coalescidas = 0
+
+    def _reclamar(self, clave: Hashable) -> Tuple[concurrent.futures.Future, bool]:
+        """Retorna (futuro, es_lider). Solo el líder ejecuta la llamada real."""
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            if futuro is not None:
+                self.coalescidas += 1
+                return futuro, False
+            futuro = concurrent.futures.Future()
+            self._en_vuelo[clave] = futuro
+            self.lideres += 1
+            return futuro, True
+
+    def _terminar(self, clave: Hashable, futuro: concurrent.futures.Future, desenlace: Desenlace):
+        with self._lock:
+            self._en_vuelo.pop(clave, None)
+        futuro.set_result(desenlace)
+
+    @staticmethod
+    def _seguir(desenlace: Desenlace, plazo: Optional[Plazo]) -> Any:
+        resultado, error, marcas = desenlace
+        aplicar_marcas(plazo, marcas)
+        if error is not None:
+            raise error
+        return resultado
+
+    def hacer(self, clave: Hashable, fn: Callable[..., Any], *args, plazo: Optional[Plazo] = None, **kwargs) -> Any:
+        """`plazo` es el de quien llama (recibe las marcas si otro hizo la llamada)."""
+        while True:
+            futuro, lider = self._reclamar(clave)
+            if lider:
+                break
+            desenlace = futuro.result()
+            if not isinstance(desenlace[1], LiderCancelado):
+                return self._seguir(desenlace, plazo)
+
+        with registrar_marcas() as marcas:
+            try:
+                resultado = fn(*args, **kwargs)
+            except Exception as e:
+                self._terminar(clave, futuro, (None, e, marcas))
+                raise
+            except BaseException:
+                self._terminar(clave, futuro, (None, LiderCancelado(), marcas))
+                raise
+        self._terminar(clave, futuro, (resultado, None, marcas))
+        return resultado
+
+    async def hacer_async(
+        self, clave: Hashable, fn: Callable[..., Any], *args, plazo: Optional[Plazo] = None, **kwargs
+    ) -> Any:
+        """fn es una corrutina. Los seguidores pueden estar en otro hilo/event loop."""
+        while True:
+            futuro, lider = self._reclamar(clave)
+            if lider:
+                break
+            # shield: cancelar a un seguidor no debe cancelar el futuro compartido
+            desenlace = await asyncio.shield(asyncio.wrap_future(futuro))
+            if not isinstance(desenlace[1], LiderCancelado):
+                return self._seguir(desenlace, plazo)
+
+        with registrar_marcas() as marcas:
+            try:
+                resultado = await fn(*args, **kwargs)
+            except Exception as e:
+                self._terminar(clave, futuro, (None, e, marcas))
+                raise
+            except BaseException:
+                # CancelledError del líder: no es la cancelación de los seguidores
+                self._terminar(clave, futuro, (None, LiderCancelado(), marcas))
+                raise
+        self._terminar(clave, futuro, (resultado, None, marcas))
+        return resultado
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "en_vuelo": len(self._en_vuelo),
+                "lideres": self.lideres,
+                "coalescidas": self.coalescidas,
+            }
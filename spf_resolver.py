@@ -0,0 +1,167 @@
+"""
+ProspectScan - Expansión recursiva de SPF
+Sigue include: y redirect= hasta el final, cuenta los lookups DNS que limita
+RFC 7208 (máx. 10) y devuelve todos los dominios incluidos para detectar
+vendors anidados. Los includes compartidos (spf.protection.outlook.com,
+_spf.google.com, ...) se resuelven una sola vez por lote.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from dns_cache import DNS_TIMEOUT, EstadoDNS, PresupuestoReintentos, consultar_async
+from dns_async import DNS_CONCURRENCIA, RegistrosIdentidad, extraer_spf
+
+# RFC 7208 §4.6.4: include, a, mx, ptr, exists y redirect cuentan para el límite
+SPF_LIMITE_LOOKUPS = 10
+SPF_MECANISMOS_CON_LOOKUP = ("include", "a", "mx", "ptr", "exists")
+# Más niveles que el límite de lookups no pueden ser válidos
+SPF_PROFUNDIDAD_MAX = SPF_LIMITE_LOOKUPS
+
+
+@dataclass(frozen=True)
+class ExpansionSPF:
+    incluidos: Tuple[str, ...] = ()  # dominios alcanzados vía include/redirect
+    lookups: int = 0
+
+    @property
+    def excede_limite(self) -> bool:
+        """Más de 10 lookups = permerror: el SPF no se evalúa en destino."""
+        return self.lookups > SPF_LIMITE_LOOKUPS
+
+
+def parsear_spf(spf: str) -> Tuple[List[str], Optional[str], int]:
+    """Retorna (includes, redirect, lookups del propio registro)."""
+    includes: List[str] = []
+    redirect: Optional[str] = None
+    lookups = 0
+    tiene_all = False
+
+    for termino in spf.split()[1:]:  # [0] es v=spf1
+        t = termino.lower()
+        if t.startswith("redirect="):
+            redirect = t.split("=", 1)[1].rstrip(".")
+            continue
+        if "=" in t:
+            continue  # exp= y modificadores desconocidos no generan lookups
+        t = t.lstrip("+-~?")
+        nombre = t.split(":", 1)[0].split("/", 1)[0]
+        if nombre == "all":
+            tiene_all = True
+        elif nombre in SPF_MECANISMOS_CON_LOOKUP:
+            lookups += 1
+            if nombre == "include" and ":" in t:
+                includes.append(t.split(":", 1)[1].rstrip("."))
+
+    # RFC 7208 §6.1: redirect se ignora si hay mecanismo "all"
+    if redirect and not tiene_all:
+        lookups += 1
+    else:
+        redirect = None
+    return includes, redirect, lookups
+
+
+class ExpansorSPF:
+    """
+    Memoria de un lote: cada registro SPF incluido se consulta una vez
+    (Task compartida) y cada subárbol ya expandido se reutiliza.
+    """
+
+    def __init__(self, semaforo: Optional[asyncio.Semaphore] = None):
+        self.semaforo = semaforo or asyncio.Semaphore(DNS_CONCURRENCIA)
+        self._registros: Dict[str, "asyncio.Task[str]"] = {}
+        self._expandidos: Dict[str, ExpansionSPF] = {}
+
+    async def _consultar_spf(self, dominio: str) -> str:
+        async with self.semaforo:
+            resp = await consultar_async(
+                dominio, 'TXT',
+                lifetime=DNS_TIMEOUT, presupuesto=PresupuestoReintentos(),
+            )
+        if resp.estado != EstadoDNS.RESPUESTA:
+            return ""
+        try:
+            return extraer_spf(resp)
+        except Exception:
+            return ""
+
+    async def _spf_de(self, dominio: str) -> str:
+        tarea = self._registros.get(dominio)
+        if tarea is None:
+            tarea = asyncio.ensure_future(self._consultar_spf(dominio))
+            self._registros[dominio] = tarea
+        return await tarea
+
+    async def _expandir_destino(self, dominio: str, camino: frozenset) -> ExpansionSPF:
+        if dominio in self._expandidos:
+            return self._expandidos[dominio]
+        spf = await self._spf_de(dominio)
+        expansion = await self.expandir(dominio, spf, camino) if spf else ExpansionSPF()
+        self._expandidos[dominio] = expansion
+        return expansion
+
+    async def expandir(self, dominio: str, spf: str, camino: frozenset = frozenset()) -> ExpansionSPF:
+        if not spf:
+            return ExpansionSPF()
+        includes, redirect, lookups = parsear_spf(spf)
+        camino = camino | {dominio}
+
+        destinos = [
+            d for d in includes + ([redirect] if redirect else [])
+            # Macros (%{d}) no se pueden resolver sin el remitente; bucles se cortan
+            if d and "%" not in d and d not in camino
+        ]
+        if len(camino) > SPF_PROFUNDIDAD_MAX:
+            destinos = []
+
+        subexpansiones = await asyncio.gather(
+            *(self._expandir_destino(d, camino) for d in destinos)
+        )
+
+        incluidos: List[str] = []
+        for destino, sub in zip(destinos, subexpansiones):
+            incluidos.append(destino)
+            incluidos.extend(sub.incluidos)
+            lookups += sub.lookups
+        return ExpansionSPF(tuple(dict.fromkeys(incluidos)), lookups)
+
+
+def _anotar(registros: RegistrosIdentidad, expansion: ExpansionSPF):
+    registros.spf_incluidos = list(expansion.incluidos)
+    registros.spf_lookups = expansion.lookups
+
+
+async def expandir_spf_lote_async(
+    registros: Dict[str, RegistrosIdentidad],
+    concurrencia: int = DNS_CONCURRENCIA,
+):
+    expansor = ExpansorSPF(semaforo=asyncio.Semaphore(max(concurrencia, 1)))
+    con_spf = [(d, r) for d, r in registros.items() if r.spf]
+    expansiones = await asyncio.gather(
+        *(expansor.expandir(d, r.spf) for d, r in con_spf)
+    )
+    for (_, r), expansion in zip(con_spf, expansiones):
+        _anotar(r, expansion)
+
+
+async def expandir_spf_registros(expansor: ExpansorSPF, dominio: str, registros: RegistrosIdentidad):
+    """Un dominio con el expansor compartido del lote (etapa DNS del pipeline)."""
+    if registros.spf:
+        _anotar(registros, await expansor.expandir(dominio, registros.spf))
+
+
+def expandir_spf_lote(
+    registros: Dict[str, RegistrosIdentidad],
+    concurrencia: int = DNS_CONCURRENCIA,
+):
+    """Completa spf_incluidos y spf_lookups de cada RegistrosIdentidad del lote."""
+    if any(r.spf for r in registros.values()):
+        asyncio.run(expandir_spf_lote_async(registros, concurrencia))
+
+
+def expandir_spf_dominio(dominio: str, registros: RegistrosIdentidad):
+    """Versión para un solo dominio (sin lote que compartir)."""
+    if registros.spf:
+        expansion = asyncio.run(ExpansorSPF().expandir(dominio, registros.spf))
+        _anotar(registros, expansion)
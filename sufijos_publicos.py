@@ -0,0 +1,90 @@
+"""
+ProspectScan - Dominio registrable (eTLD+1) con Public Suffix List offline
+mail.empresa.com.mx, ventas.empresa.com.mx y empresa.com.mx son el mismo
+prospecto: empresa.com.mx. Los dominios Unicode se pasan a punycode (IDNA).
+La lista va incluida en data/public_suffix_list.dat (actualizar a mano).
+Las IPs literales no tienen dominio registrable: se devuelven tal cual.
+"""
+
+import ipaddress
+import os
+from functools import lru_cache
+from typing import FrozenSet, Tuple
+
+try:
+    import idna  # Dependencia de requests; implementa UTS #46 / IDNA 2008
+except ImportError:
+    idna = None
+
+PSL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "public_suffix_list.dat")
+
+
+def a_punycode(host: str) -> str:
+    """Normaliza un host: minúsculas, sin punto final y en forma ASCII (xn--)."""
+    host = (host or "").strip().rstrip(".").lower()
+    if not host or host.isascii():
+        return host
+    try:
+        if idna is not None:
+            return idna.encode(host, uts46=True).decode("ascii")
+        return host.encode("idna").decode("ascii")
+    except Exception:
+        return ""  # Host Unicode inválido: no es un dominio que podamos consultar
+
+
+@lru_cache(maxsize=1)
+def _cargar_reglas() -> Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]:
+    """Retorna (normales, comodines "*.x" sin el "*.", excepciones "!x" sin el "!")."""
+    normales, comodines, excepciones = set(), set(), set()
+    try:
+        with open(PSL_PATH, encoding="utf-8") as f:
+            for linea in f:
+                regla = linea.split()[0] if linea.strip() else ""
+                if not regla or regla.startswith("//"):
+                    continue
+                if regla.startswith("!"):
+                    excepciones.add(a_punycode(regla[1:]))
+                elif regla.startswith("*."):
+                    comodines.add(a_punycode(regla[2:]))
+                else:
+                    normales.add(a_punycode(regla))
+    except OSError:
+        pass  # Sin lista: se aplica solo la regla por defecto "*"
+    return frozenset(normales), frozenset(comodines), frozenset(excepciones)
+
+
+def sufijo_publico(host: str) -> str:
+    """Sufijo público más largo que aplica al host (regla por defecto: última etiqueta)."""
+    normales, comodines, excepciones = _cargar_reglas()
+    etiquetas = host.split(".")
+    for i in range(len(etiquetas)):
+        candidato = ".".join(etiquetas[i:])
+        if candidato in excepciones:
+            return ".".join(etiquetas[i + 1:])
+        if candidato in normales or ".".join(etiquetas[i + 1:]) in comodines:
+            return candidato
+    return etiquetas[-1]
+
+
+def _es_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+@lru_cache(maxsize=65536)
+def dominio_registrable(host: str) -> str:
+    """
+    eTLD+1 en punycode: "Ventas.Empresa.com.mx." -> "empresa.com.mx".
+    Si el host ya es un sufijo público (ej. "com.mx") o una IP se devuelve tal cual.
+    """
+    host = a_punycode(host)
+    if not host or "." not in host or _es_ip(host):
+        return host
+    sufijo = sufijo_publico(host)
+    if host == sufijo:
+        return host
+    resto = host[: -len(sufijo) - 1]
+    return f"{resto.rsplit('.', 1)[-1]}.{sufijo}"
@@ -0,0 +1,78 @@
+"""Catálogo de vendors en JSON: orden de prioridad, versión y recarga en caliente."""
+
+import json
+import logging
+import os
+
+import pytest
+
+import catalogo_vendors
+from app_superficie import detectar_cdn_waf, detectar_vendor_correo
+from catalogo_vendors import _CatalogoRecargable, cargar_catalogo
+
+
+def _escribir(path, datos, mtime):
+    path.write_text(datos if isinstance(datos, str) else json.dumps(datos), encoding="utf-8")
+    os.utime(path, (mtime, mtime))  # mtime distinto aunque el sistema de archivos sea grueso
+
+
+def _catalogo(version, *cdn):
+    return {"version": version, "cdn_waf": [{"patron": p, "vendor": v} for p, v in cdn]}
+
+
+@pytest.fixture
+def sin_espera(monkeypatch):
+    monkeypatch.setattr(catalogo_vendors, "CATALOGO_RECARGA_SEGUNDOS", 0.0)
+
+
+def test_el_orden_del_catalogo_decide_el_vendor():
+    catalogo = cargar_catalogo()
+    # Akamai aparece antes en los headers, pero Cloudflare va antes en el catálogo
+    headers = {"Server": "AkamaiGHost", "X-Proxy": "cloudflare"}
+    assert detectar_cdn_waf(headers, catalogo) == "Cloudflare"
+    assert detectar_vendor_correo(["alt1.aspmx.l.google.com.outlook.com"], catalogo) == "Microsoft 365"
+
+
+def test_sin_version_se_usa_un_hash_del_contenido(tmp_path):
+    path = tmp_path / "catalogo.json"
+    _escribir(path, {"cdn_waf": []}, 1_000)
+    version = cargar_catalogo(str(path)).version
+    assert len(version) == 12
+    _escribir(path, {"cdn_waf": [{"patron": "x", "vendor": "X"}]}, 2_000)
+    assert cargar_catalogo(str(path)).version != version
+
+
+def test_recarga_al_cambiar_el_archivo(tmp_path, sin_espera):
+    path = tmp_path / "catalogo.json"
+    _escribir(path, _catalogo("1", ("fastly", "Fastly")), 1_000)
+    recargable = _CatalogoRecargable(str(path))
+    assert recargable.obtener().version == "1"
+
+    _escribir(path, _catalogo("2", ("fastly", "Fastly v2")), 2_000)
+    catalogo = recargable.obtener()
+    assert catalogo.version == "2"
+    assert catalogo.cdn_waf.primero(["fastly"]) == "Fastly v2"
+
+
+def test_json_roto_mantiene_el_ultimo_catalogo_bueno(tmp_path, sin_espera, caplog):
+    path = tmp_path / "catalogo.json"
+    _escribir(path, _catalogo("1", ("fastly", "Fastly")), 1_000)
+    recargable = _CatalogoRecargable(str(path))
+    bueno = recargable.obtener()
+
+    for roto, mtime in (('{"version": "2", "cdn_waf": [', 2_000), (_catalogo("3", ("(", "Regex rota")), 3_000)):
+        _escribir(path, roto, mtime)
+        with caplog.at_level(logging.WARNING, logger="catalogo_vendors"):
+            assert recargable.obtener() is bueno
+    assert bueno.version == "1"
+    assert "se mantiene v1" in caplog.text
+
+    _escribir(path, _catalogo("4", ("fastly", "Fastly")), 4_000)
+    assert recargable.obtener().version == "4"  # Arreglado, se recarga
+
+
+def test_json_roto_sin_catalogo_previo_falla(tmp_path):
+    path = tmp_path / "catalogo.json"
+    _escribir(path, "{", 1_000)
+    with pytest.raises(ValueError):
+        _CatalogoRecargable(str(path)).obtener()
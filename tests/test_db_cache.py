@@ -0,0 +1,155 @@
+"""Cache en Neon: migración al arrancar, checkpoints de escaneo con reclamo atómico y errores al log.
+
+Las pruebas contra PostgreSQL corren solo con PROSPECTSCAN_TEST_DATABASE_URL
+(una base desechable: init_db crea las tablas y las pruebas las modifican).
+"""
+
+import logging
+import os
+import threading
+import uuid
+
+import pandas as pd
+import pytest
+
+import db_cache
+
+URL_PRUEBA = os.environ.get("PROSPECTSCAN_TEST_DATABASE_URL")
+
+
+class _ConexionRota:
+    def cursor(self):
+        raise RuntimeError("conexión caída")
+
+    def close(self):
+        pass
+
+
+def test_errores_de_los_helpers_van_al_log(monkeypatch, caplog):
+    monkeypatch.setattr(db_cache, "_get_connection", lambda: _ConexionRota())
+    with caplog.at_level(logging.WARNING, logger="db_cache"):
+        df, pendientes = db_cache.get_cached_dominios(["a.com"])
+        assert pendientes == ["a.com"] and df.empty
+        assert db_cache.buscar_escaneo_pendiente("h", "yo") is None
+        db_cache.save_checkpoint("r", [{"dominio": "a.com"}])
+        assert not db_cache.init_db()
+        assert db_cache.query_all_cached().empty
+    mensajes = [r.getMessage() for r in caplog.records]
+    assert any("Error leyendo cache" in m for m in mensajes)
+    assert any("Error buscando escaneo" in m for m in mensajes)
+    assert any("Error guardando checkpoint" in m for m in mensajes)
+    assert any("Error inicializando BD" in m for m in mensajes)
+    assert any("Error consultando cache" in m for m in mensajes)
+
+
+@pytest.fixture
+def neon(monkeypatch):
+    if not URL_PRUEBA:
+        pytest.skip("sin PROSPECTSCAN_TEST_DATABASE_URL")
+    monkeypatch.setenv("DATABASE_URL", URL_PRUEBA)
+    assert db_cache.init_db()
+    return uuid.uuid4().hex  # hash de archivo propio de la prueba
+
+
+def test_dos_sesiones_no_reclaman_el_mismo_escaneo(neon):
+    assert db_cache.crear_escaneo(f"{neon}-r", neon, ["a.com", "b.com"])
+    barrera = threading.Barrier(8)
+    reclamados = {}
+
+    def reclamar(i):
+        barrera.wait()
+        reclamados[i] = db_cache.buscar_escaneo_pendiente(neon, f"sesion-{i}")
+
+    hilos = [threading.Thread(target=reclamar, args=(i,)) for i in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    ganadores = [i for i, r in reclamados.items() if r]
+    assert len(ganadores) == 1
+    assert reclamados[ganadores[0]] == (f"{neon}-r", ["a.com", "b.com"])
+
+
+def test_reclamo_liberacion_y_fin(neon):
+    run_id = f"{neon}-r"
+    assert db_cache.crear_escaneo(run_id, neon, ["a.com"], "yo")
+    assert db_cache.buscar_escaneo_pendiente(neon, "otra") is None
+    assert db_cache.buscar_escaneo_pendiente(neon, "yo")[0] == run_id  # rerun de la misma sesión
+    db_cache.liberar_escaneo(run_id, "yo")
+    assert db_cache.buscar_escaneo_pendiente(neon, "otra")[0] == run_id
+    db_cache.terminar_escaneo(run_id)
+    assert db_cache.buscar_escaneo_pendiente(neon, "otra") is None
+
+
+def test_activo_clasificado_con_otro_catalogo_queda_pendiente(neon):
+    def fila(dominio, estado, version):
+        return {
+            "dominio": dominio, "score": 50, "postura_identidad": "Media", "postura_exposicion": "Media",
+            "postura_general": "Media", "correo_proveedor": "N/D", "correo_gateway": "None",
+            "correo_envio": "None", "spf_estado": "OK", "dmarc_estado": "Ausente", "https_estado": "Forzado",
+            "cdn_waf": "None", "hsts": False, "csp": False, "dominio_antiguedad": "N/D",
+            "estado_dominio": estado, "catalogo_version": version,
+        }
+
+    vigente, viejo, muerto = (f"{neon}-{n}.com" for n in ("vigente", "viejo", "muerto"))
+    db_cache.save_to_cache(pd.DataFrame([
+        fila(vigente, "Activo", "v2"), fila(viejo, "Activo", "v1"), fila(muerto, "Inexistente", "v1"),
+    ]))
+    df, pendientes = db_cache.get_cached_dominios([vigente, viejo, muerto], "v2")
+    assert sorted(df["dominio"]) == sorted([vigente, muerto])
+    assert pendientes == [viejo]
+    assert db_cache.get_single_domain(viejo, "v2") is None
+    assert db_cache.get_single_domain(viejo, "v1") is not None
+    assert len(db_cache.get_cached_dominios([vigente, viejo, muerto])[0]) == 3  # sin versión: todo vigente
+
+
+def test_la_app_migra_una_sola_vez_por_proceso(monkeypatch):
+    import app_superficie
+
+    llamadas = []
+    monkeypatch.setattr(app_superficie, "init_db", lambda: llamadas.append(1) or True)
+    app_superficie.migrar_db.clear()
+    try:
+        assert app_superficie.migrar_db() and app_superficie.migrar_db()
+    finally:
+        app_superficie.migrar_db.clear()
+    assert len(llamadas) == 1
+
+
+def test_init_db_migra_una_tabla_anterior(neon, monkeypatch):
+    import psycopg2
+
+    esquema = f"migracion_{neon}"
+    separador = "&" if "?" in URL_PRUEBA else "?"
+    monkeypatch.setenv("DATABASE_URL", f"{URL_PRUEBA}{separador}options=-csearch_path%3D{esquema}")
+    conn = psycopg2.connect(URL_PRUEBA)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            # dominios_cache como la creaban las versiones sin score, estado ni catálogo
+            cur.execute(f"CREATE SCHEMA {esquema}")
+            cur.execute(f"""
+                CREATE TABLE {esquema}.dominios_cache (
+                    dominio TEXT PRIMARY KEY, postura_general TEXT, updated_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            cur.execute(f"INSERT INTO {esquema}.dominios_cache (dominio) VALUES ('viejo.com')")
+
+        assert db_cache.init_db()
+        assert db_cache.init_db()  # Idempotente: la segunda corrida no falla
+
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = %s",
+                (esquema, "dominios_cache"),
+            )
+            columnas = {c for (c,) in cur.fetchall()}
+            cur.execute(f"SELECT score, estado_dominio FROM {esquema}.dominios_cache")
+            assert cur.fetchall() == [(0, "Activo")]
+            cur.execute("SELECT to_regclass(%s)", (f"{esquema}.escaneo_filas",))
+            assert cur.fetchone()[0] is not None
+        assert {"score", "estado_dominio", "catalogo_version"} <= columnas
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {esquema} CASCADE")
+        conn.close()
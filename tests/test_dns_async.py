@@ -0,0 +1,137 @@
+"""Motor DNS asíncrono por lotes: registros de identidad y pre-chequeo de existencia."""
+
+import asyncio
+from types import SimpleNamespace
+
+import dns.name
+import pytest
+
+import dns_async
+from dns_async import (
+    dominio_inexistente, registros_desde_respuestas, resolvedor_identidad, verificador_existencia,
+)
+from dns_cache import EstadoDNS, RespuestaDNS
+
+
+def _mx(*hosts):
+    return RespuestaDNS(
+        EstadoDNS.RESPUESTA, tuple(SimpleNamespace(exchange=dns.name.from_text(h)) for h in hosts), 300
+    )
+
+
+def _txt(*textos):
+    # Un TXT largo llega partido en varias cadenas de 255 bytes
+    return RespuestaDNS(
+        EstadoDNS.RESPUESTA, tuple(SimpleNamespace(strings=tuple(t.encode() for t in txt)) for txt in textos), 300
+    )
+
+
+ZONA = {
+    ("empresa.com", "MX"): _mx("ASPMX.L.Google.com.", "alt1.aspmx.l.google.com."),
+    ("empresa.com", "TXT"): _txt(("google-site-verification=abc",), ("v=spf1 include:_spf.google.com", " ~all")),
+    ("_dmarc.empresa.com", "TXT"): _txt(("v=DMARC1; p=reject",)),
+}
+
+
+@pytest.fixture
+def zona(monkeypatch):
+    """consultar_async falso: responde desde ZONA y mide las consultas en vuelo."""
+    estado = SimpleNamespace(en_vuelo=0, maximo=0, consultas=[], zona=dict(ZONA))
+
+    async def consultar_async(nombre, rdtype, lifetime=None, presupuesto=None):
+        estado.consultas.append((nombre, rdtype))
+        estado.en_vuelo += 1
+        estado.maximo = max(estado.maximo, estado.en_vuelo)
+        await asyncio.sleep(0.01)
+        estado.en_vuelo -= 1
+        return estado.zona.get((nombre, rdtype), RespuestaDNS(EstadoDNS.NOANSWER, (), 300))
+
+    monkeypatch.setattr(dns_async, "consultar_async", consultar_async)
+    return estado
+
+
+def test_registros_crudos_como_los_usa_analizar_identidad(zona):
+    async def resolver():
+        async with resolvedor_identidad() as resolver:
+            return await resolver("empresa.com")
+
+    registros = asyncio.run(resolver())
+    assert registros.mx == ["aspmx.l.google.com", "alt1.aspmx.l.google.com"]
+    assert registros.spf == "v=spf1 include:_spf.google.com ~all"
+    assert registros.dmarc == "v=DMARC1; p=reject"
+    assert not registros.incompleto
+    assert sorted(zona.consultas) == [("_dmarc.empresa.com", "TXT"), ("empresa.com", "MX"), ("empresa.com", "TXT")]
+
+
+def test_la_concurrencia_es_del_lote_y_no_por_dominio(zona):
+    dominios = [f"d{i}.com" for i in range(40)]
+
+    async def resolver():
+        async with resolvedor_identidad(concurrencia=7) as resolver:
+            return await asyncio.gather(*(resolver(d) for d in dominios))
+
+    registros = asyncio.run(resolver())
+    assert len(registros) == 40 and all(r.mx == [] and r.spf == "" for r in registros)
+    assert len(zona.consultas) == 120
+    assert zona.maximo == 7
+
+
+def test_sin_registros_quedan_vacios():
+    vacia = RespuestaDNS(EstadoDNS.NXDOMAIN, (), 300)
+    registros = registros_desde_respuestas(vacia, vacia, vacia)
+    assert (registros.mx, registros.spf, registros.dmarc) == ([], "", "")
+
+
+# ============================================================================
+# PRE-CHEQUEO DE EXISTENCIA
+# ============================================================================
+
+def _estado(estado):
+    return RespuestaDNS(estado, (), 300)
+
+
+@pytest.mark.parametrize("estados, inexistente", [
+    ([EstadoDNS.NXDOMAIN], True),
+    ([EstadoDNS.NOANSWER, EstadoDNS.NXDOMAIN, EstadoDNS.TIMEOUT], True),
+    ([EstadoDNS.NOANSWER] * 4, True),  # sin SOA, A, AAAA ni MX
+    ([EstadoDNS.NOANSWER, EstadoDNS.NOANSWER, EstadoDNS.NOANSWER, EstadoDNS.RESPUESTA], False),
+    ([EstadoDNS.NOANSWER, EstadoDNS.TIMEOUT, EstadoDNS.NOANSWER, EstadoDNS.NOANSWER], False),
+    ([EstadoDNS.SERVFAIL] * 4, False),  # un resolver caído no mata al dominio
+    ([], False),
+])
+def test_dominio_inexistente(estados, inexistente):
+    assert dominio_inexistente([_estado(e) for e in estados]) is inexistente
+
+
+def _verificar(dominio):
+    async def verificar():
+        async with verificador_existencia() as verificar:
+            return await verificar(dominio)
+
+    return asyncio.run(verificar())
+
+
+def test_nxdomain_en_el_soa_ahorra_el_resto(zona):
+    zona.zona[("muerto.com", "SOA")] = _estado(EstadoDNS.NXDOMAIN)
+    assert not _verificar("muerto.com")
+    assert zona.consultas == [("muerto.com", "SOA")]
+
+
+def test_soa_propio_basta(zona):
+    zona.zona[("empresa.com", "SOA")] = _estado(EstadoDNS.RESPUESTA)
+    assert _verificar("empresa.com")
+    assert zona.consultas == [("empresa.com", "SOA")]
+
+
+def test_sin_soa_cuenta_a_aaaa_o_mx(zona):
+    # www.empresa.com no tiene SOA propio pero sí MX (ZONA solo tiene el de empresa.com)
+    zona.zona[("www.empresa.com", "MX")] = ZONA[("empresa.com", "MX")]
+    assert _verificar("www.empresa.com")
+    assert not _verificar("vacio.empresa.com")  # todo NoAnswer
+    assert len(zona.consultas) == 8
+
+
+def test_timeouts_no_declaran_inexistente(zona):
+    for rdtype in ("SOA", "A", "AAAA", "MX"):
+        zona.zona[("lento.com", rdtype)] = _estado(EstadoDNS.TIMEOUT)
+    assert _verificar("lento.com")
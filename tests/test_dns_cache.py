@@ -0,0 +1,176 @@
+"""Cache DNS compartido (TTL, negativas aparte de los fallos, LRU) y reintentos solo de fallos transitorios."""
+
+import dns.exception
+import dns.message
+import dns.name
+import dns.resolver
+import dns.rrset
+import pytest
+
+import dns_cache
+from dns_cache import (
+    DNS_BACKOFF_BASE, DNS_BACKOFF_MAX, DNS_REINTENTOS_CONSULTA, DNS_TIMEOUT, DNS_TTL_FALLO,
+    DNS_TTL_NEGATIVO, ESTADOS_REINTENTABLES, CacheDNS, EstadoDNS, PresupuestoReintentos, RespuestaDNS,
+    consultar, espera_backoff, respuesta_desde_excepcion,
+)
+from latencias import TimeoutAdaptativo
+
+
+class _Reloj:
+    def __init__(self):
+        self.ahora = 1_000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = _Reloj()
+    monkeypatch.setattr(dns_cache.time, "monotonic", reloj)
+    return reloj
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """CACHE_DNS limpio para la prueba."""
+    cache = CacheDNS()
+    monkeypatch.setattr(dns_cache, "CACHE_DNS", cache)
+    return cache
+
+
+def _respuesta(ttl, estado=EstadoDNS.RESPUESTA):
+    return RespuestaDNS(estado, (), ttl)
+
+
+def test_la_entrada_vence_con_su_ttl(reloj):
+    cache = CacheDNS()
+    cache.set("Empresa.com.", "mx", _respuesta(60))
+    reloj.ahora += 59
+    assert cache.get("empresa.com", "MX") is not None  # misma clave: sin punto final ni mayúsculas
+    reloj.ahora += 1
+    assert cache.get("empresa.com", "MX") is None
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["hits"], estadisticas["misses"], estadisticas["expirados"]) == (1, 1, 1)
+    assert estadisticas["entradas"] == 0
+
+
+def test_ttl_cero_no_se_guarda():
+    cache = CacheDNS()
+    cache.set("empresa.com", "A", _respuesta(0))
+    assert cache.get("empresa.com", "A") is None
+
+
+def test_desalojo_lru_respeta_el_uso_reciente():
+    cache = CacheDNS(max_entradas=2)
+    cache.set("a.com", "A", _respuesta(60))
+    cache.set("b.com", "A", _respuesta(60))
+    cache.get("a.com", "A")  # a.com pasa a ser la más reciente
+    cache.set("c.com", "A", _respuesta(60))
+    assert cache.get("b.com", "A") is None
+    assert cache.get("a.com", "A") is not None and cache.get("c.com", "A") is not None
+    assert cache.estadisticas()["desalojados"] == 1
+
+
+def _con_soa(ttl_soa, minimo):
+    consulta = dns.message.make_query("empresa.com", "TXT")
+    respuesta = dns.message.make_response(consulta)
+    respuesta.authority.append(
+        dns.rrset.from_text("empresa.com.", ttl_soa, "IN", "SOA", f"ns1. admin. 1 7200 900 1209600 {minimo}")
+    )
+    return respuesta
+
+
+def test_negativas_con_ttl_del_soa_y_fallos_con_ttl_corto():
+    nombre = dns.name.from_text("empresa.com")
+    nx = respuesta_desde_excepcion(dns.resolver.NXDOMAIN(qnames=[nombre], responses={nombre: _con_soa(900, 120)}))
+    assert (nx.estado, nx.ttl) == (EstadoDNS.NXDOMAIN, 120)
+    sin_datos = respuesta_desde_excepcion(dns.resolver.NoAnswer(response=_con_soa(60, 3600)))
+    assert (sin_datos.estado, sin_datos.ttl) == (EstadoDNS.NOANSWER, 60)
+    # Sin SOA en authority: TTL negativo por defecto
+    assert respuesta_desde_excepcion(dns.resolver.NXDOMAIN()).ttl == DNS_TTL_NEGATIVO
+
+    # Un timeout no se recuerda "para siempre" como respuesta vacía
+    timeout = respuesta_desde_excepcion(dns.exception.Timeout())
+    assert (timeout.estado, timeout.ttl) == (EstadoDNS.TIMEOUT, DNS_TTL_FALLO)
+    assert respuesta_desde_excepcion(dns.resolver.NoNameservers()).estado == EstadoDNS.SERVFAIL
+
+
+def test_consultar_lee_del_cache_compartido(cache, monkeypatch):
+    pedidos = []
+
+    def resolver_una_vez(nombre, rdtype, lifetime):
+        pedidos.append((nombre, rdtype))
+        return _respuesta(300)
+
+    monkeypatch.setattr(dns_cache, "_resolver_una_vez", resolver_una_vez)
+    assert consultar("empresa.com", "TXT").estado == EstadoDNS.RESPUESTA
+    assert consultar("EMPRESA.com.", "TXT").estado == EstadoDNS.RESPUESTA
+    assert pedidos == [("empresa.com", "TXT")]
+    assert cache.estadisticas()["por_estado"]["Respuesta"] == 1
+
+
+# ============================================================================
+# RESULTADOS TIPADOS Y REINTENTOS
+# ============================================================================
+
+@pytest.fixture
+def red(cache, monkeypatch):
+    """_resolver_una_vez falso: cada nombre devuelve su secuencia de estados."""
+    monkeypatch.setattr(dns_cache, "espera_backoff", lambda intento: 0.0)
+    monkeypatch.setattr(dns_cache, "TIMEOUT_DNS", TimeoutAdaptativo("DNS", techo=DNS_TIMEOUT, piso=0.5))
+    guion, pedidos = {}, []
+
+    def resolver_una_vez(nombre, rdtype, lifetime):
+        pedidos.append(nombre)
+        estados = guion[nombre]
+        estado = estados.pop(0) if len(estados) > 1 else estados[0]
+        return RespuestaDNS(estado, (), 0)  # ttl=0: cada consulta sale a la red
+
+    monkeypatch.setattr(dns_cache, "_resolver_una_vez", resolver_una_vez)
+    return guion, pedidos
+
+
+@pytest.mark.parametrize("estado", [EstadoDNS.NXDOMAIN, EstadoDNS.NOANSWER, EstadoDNS.RESPUESTA])
+def test_respuestas_definitivas_no_se_reintentan(red, estado):
+    guion, pedidos = red
+    guion["empresa.com"] = [estado]
+    assert consultar("empresa.com", "TXT").estado == estado
+    assert pedidos == ["empresa.com"]
+
+
+@pytest.mark.parametrize("estado", sorted(ESTADOS_REINTENTABLES, key=lambda e: e.value))
+def test_fallo_transitorio_se_reintenta_hasta_responder(red, estado):
+    guion, pedidos = red
+    guion["empresa.com"] = [estado, EstadoDNS.RESPUESTA]
+    respuesta = consultar("empresa.com", "TXT")
+    assert respuesta.estado == EstadoDNS.RESPUESTA and not respuesta.es_reintentable
+    assert len(pedidos) == 2
+
+
+def test_reintentos_por_consulta_acotados(red):
+    guion, pedidos = red
+    guion["empresa.com"] = [EstadoDNS.TIMEOUT]
+    assert consultar("empresa.com", "MX").estado == EstadoDNS.TIMEOUT
+    assert len(pedidos) == 1 + DNS_REINTENTOS_CONSULTA
+
+
+def test_presupuesto_compartido_por_las_consultas_del_dominio(red):
+    guion, pedidos = red
+    guion["empresa.com"] = guion["_dmarc.empresa.com"] = [EstadoDNS.SERVFAIL]
+    presupuesto = PresupuestoReintentos(reintentos=3)
+    consultar("empresa.com", "MX", presupuesto=presupuesto)  # 1 + 2 reintentos
+    consultar("empresa.com", "TXT", presupuesto=presupuesto)  # 1 + el último reintento
+    consultar("_dmarc.empresa.com", "TXT", presupuesto=presupuesto)  # sin presupuesto: un intento
+    assert len(pedidos) == 3 + 2 + 1
+    assert presupuesto.restantes == 0
+
+
+def test_presupuesto_vencido_en_segundos():
+    presupuesto = PresupuestoReintentos(reintentos=5, segundos=0.0)
+    assert not presupuesto.consumir()
+
+
+def test_backoff_con_jitter_acotado():
+    for intento in range(8):
+        assert 0.0 <= espera_backoff(intento) <= min(DNS_BACKOFF_MAX, DNS_BACKOFF_BASE * 2 ** intento)
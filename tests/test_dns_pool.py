@@ -0,0 +1,120 @@
+"""Pool de resolvers contra resolvers locales de prueba (UDP en 127.0.0.1)."""
+
+import socket
+import threading
+import time
+
+import dns.exception
+import dns.message
+import dns.rcode
+import dns.resolver
+import dns.rrset
+import pytest
+
+from dns_pool import PoolResolvers, Upstream
+
+
+class ResolverLocal:
+    """Responde A 127.0.0.1 a todo salvo "nx.test." (NXDOMAIN), tras `demora` segundos."""
+
+    def __init__(self, demora: float = 0.0):
+        self.demora = demora
+        self.consultas = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.puerto = self.sock.getsockname()[1]
+        threading.Thread(target=self._servir, daemon=True).start()
+
+    def _servir(self):
+        while True:
+            try:
+                datos, origen = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            self.consultas += 1
+            threading.Thread(target=self._responder, args=(datos, origen), daemon=True).start()
+
+    def _responder(self, datos, origen):
+        consulta = dns.message.from_wire(datos)
+        respuesta = dns.message.make_response(consulta)
+        nombre = consulta.question[0].name.to_text()
+        if nombre == "nx.test.":
+            respuesta.set_rcode(dns.rcode.NXDOMAIN)
+        else:
+            respuesta.answer.append(dns.rrset.from_text(nombre, 60, "IN", "A", "127.0.0.1"))
+        time.sleep(self.demora)
+        try:
+            self.sock.sendto(respuesta.to_wire(), origen)
+        except OSError:
+            pass
+
+    def upstream(self) -> Upstream:
+        return Upstream("127.0.0.1", self.puerto)
+
+    def cerrar(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def resolvers():
+    creados = []
+
+    def crear(demora=0.0):
+        r = ResolverLocal(demora)
+        creados.append(r)
+        return r
+
+    yield crear
+    for r in creados:
+        r.cerrar()
+
+
+def test_respuesta_rapida_sin_hedge(resolvers):
+    pool = PoolResolvers([resolvers().upstream(), resolvers().upstream()])
+    respuesta = pool.resolver("empresa.test.", "A", lifetime=2.0)
+    assert [r.address for r in respuesta] == ["127.0.0.1"]
+    assert pool.hedges == 0
+
+
+def test_nxdomain_es_definitivo(resolvers):
+    pool = PoolResolvers([resolvers().upstream(), resolvers().upstream()])
+    with pytest.raises(dns.resolver.NXDOMAIN):
+        pool.resolver("nx.test.", "A", lifetime=2.0)
+    assert pool.hedges == 0
+
+
+def test_primario_lento_gana_el_hedge_y_no_registra_muestra_cancelada(resolvers):
+    lento, rapido = resolvers(demora=1.5), resolvers()
+    pool = PoolResolvers([lento.upstream(), rapido.upstream()])
+    inicio = time.monotonic()
+    pool.resolver("empresa.test.", "A", lifetime=3.0)
+    assert time.monotonic() - inicio < 1.0  # umbral inicial 0.5 s + respuesta inmediata
+    assert pool.hedges == 1 and pool.hedges_ganados == 1
+    # La consulta del primario se canceló: no es una latencia observada
+    assert len(pool.upstreams[0].latencias) == 0
+    assert len(pool.upstreams[1].latencias) == 1
+
+
+def test_hedge_no_pasa_del_lifetime(resolvers):
+    pool = PoolResolvers([resolvers(demora=5).upstream(), resolvers(demora=5).upstream()])
+    inicio = time.monotonic()
+    with pytest.raises(dns.exception.Timeout):
+        pool.resolver("empresa.test.", "A", lifetime=1.0)
+    assert time.monotonic() - inicio < 1.3
+
+
+def test_llamadas_sincronas_comparten_un_event_loop(resolvers):
+    pool = PoolResolvers([resolvers().upstream()])
+    pool.resolver("a.test.", "A", lifetime=2.0)
+    loop = pool._loop
+    resultados = []
+    hilos = [
+        threading.Thread(target=lambda i=i: resultados.append(pool.resolver(f"h{i}.test.", "A", lifetime=2.0)))
+        for i in range(10)
+    ]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert len(resultados) == 10
+    assert pool._loop is loop and loop.is_running()
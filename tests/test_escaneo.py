@@ -0,0 +1,149 @@
+"""escanear_dominios con un pipeline de prueba: errores, carril lento y cierre."""
+
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import app_superficie
+import latencias
+from app_superficie import ESTADO_DOMINIO_ERROR, ResumenEscaneo, SalidaDominio, escanear_dominios
+from latencias import TimeoutAdaptativo
+from plazo import ETAPA_HTTP
+
+
+def _resultado():
+    return SimpleNamespace(identidad=SimpleNamespace(dns_incompleto=False), parcial=False)
+
+
+class PipelineFalso:
+    """Entrega las salidas que arma `salidas(plazos)` (después de recibir los plazos)."""
+
+    def __init__(self, salidas):
+        self._salidas = salidas
+
+    def estadisticas(self):
+        return []
+
+    def ejecutar(self, items, entrada, intervalo=None):
+        yield from self._salidas
+
+
+@pytest.fixture
+def sin_neon(monkeypatch):
+    monkeypatch.setattr(app_superficie, "CACHE_AVAILABLE", False)
+
+
+def _con_pipeline(monkeypatch, armar):
+    def crear(plazos, fechas_guardadas):
+        return PipelineFalso(armar(plazos)), None
+
+    monkeypatch.setattr(app_superficie, "crear_pipeline_superficie", crear)
+
+
+def test_error_de_analisis_sale_como_fila_de_error(monkeypatch, sin_neon):
+    _con_pipeline(monkeypatch, lambda plazos: [
+        SalidaDominio("ok.com", {"dominio": "ok.com"}, _resultado()),
+        SalidaDominio("roto.com", error=ValueError("falló")),
+    ])
+    resumen = ResumenEscaneo()
+    filas = list(escanear_dominios(["ok.com", "roto.com"], resumen=resumen))
+    assert [f["dominio"] for f in filas] == ["ok.com", "roto.com"]
+    assert filas[1]["estado_dominio"] == ESTADO_DOMINIO_ERROR
+    assert resumen.errores == {"roto.com": "falló"}
+    assert resumen.completados == 2
+
+
+def test_fila_de_error_no_entra_en_metricas():
+    df = pd.DataFrame([
+        {"dominio": "a.com", "estado_dominio": "Activo"},
+        {"dominio": "b.com", "estado_dominio": "Inexistente"},
+        {"dominio": "c.com", "estado_dominio": ESTADO_DOMINIO_ERROR},
+    ])
+    activos, inexistentes = app_superficie.separar_inexistentes(df)
+    assert activos["dominio"].tolist() == ["a.com"]
+    assert inexistentes["dominio"].tolist() == ["b.com"]
+
+
+def _lentas(plazos, fechas=None):
+    fechas = fechas or {}
+    salidas = []
+    for dominio in plazos:
+        plazos[dominio].marcar_lento(ETAPA_HTTP)
+        salidas.append(SalidaDominio(dominio, {"dominio": dominio}, _resultado(), fechas.get(dominio)))
+    return salidas
+
+
+def test_carril_lento_reusa_fechas_guardadas_y_del_primer_intento(monkeypatch):
+    guardada = datetime(2001, 1, 1)
+    primer_intento = datetime(2010, 5, 5)
+    monkeypatch.setattr(app_superficie, "CACHE_AVAILABLE", True)
+    monkeypatch.setattr(app_superficie, "get_cached_dominios", lambda ds, version=None: (pd.DataFrame(), list(ds)))
+    monkeypatch.setattr(app_superficie, "get_fechas_creacion", lambda ds: {"viejo.com": guardada})
+    monkeypatch.setattr(app_superficie, "_guardar_lote", lambda *a, **k: None)
+    _con_pipeline(monkeypatch, lambda plazos: _lentas(plazos, {"nuevo.com": primer_intento}))
+
+    recibidas = {}
+
+    def carril_lento(dominio, plazo, fecha=None):
+        recibidas[dominio] = fecha
+        return _resultado(), {"dominio": dominio, "lento": True}, fecha
+
+    monkeypatch.setattr(app_superficie, "_analizar_carril_lento", carril_lento)
+    filas = list(escanear_dominios(["viejo.com", "nuevo.com", "sin.com"]))
+    assert all(f.get("lento") for f in filas)
+    assert recibidas == {"viejo.com": guardada, "nuevo.com": primer_intento, "sin.com": None}
+
+
+def test_analizar_carril_lento_no_consulta_la_fecha_conocida(monkeypatch):
+    r = SimpleNamespace(etapas_parciales=[])
+    monkeypatch.setattr(app_superficie, "analizar_dominio", lambda dominio, plazo=None: r)
+    monkeypatch.setattr(app_superficie, "fila_df_resultados", lambda r, fecha: {"fecha": fecha})
+
+    def no_llamar(*a, **k):
+        raise AssertionError("RDAP/WHOIS repetido")
+
+    monkeypatch.setattr(app_superficie, "fecha_creacion_con_plazo", no_llamar)
+    fecha = datetime(2001, 1, 1)
+    plazo = app_superficie.Plazo(10)
+    assert app_superficie._analizar_carril_lento("x.com", plazo, fecha) == (r, {"fecha": fecha}, fecha)
+    assert plazo.carril_lento
+
+
+def test_cerrar_en_el_carril_lento_no_espera_los_reintentos(monkeypatch, sin_neon):
+    _con_pipeline(monkeypatch, _lentas)
+
+    def carril_lento(dominio, plazo, fecha=None):
+        if dominio != "rapido.com":
+            time.sleep(2.0)
+        return _resultado(), {"dominio": dominio}, None
+
+    monkeypatch.setattr(app_superficie, "_analizar_carril_lento", carril_lento)
+    filas = escanear_dominios(["rapido.com"] + [f"lento{i}.com" for i in range(30)])
+    assert next(filas)["dominio"] == "rapido.com"
+    inicio = time.monotonic()
+    filas.close()
+    assert time.monotonic() - inicio < 0.5
+
+
+def test_pasar_a_segundo_plano_reintenta_los_errores():
+    filas = [
+        {"dominio": "ok.com", "estado_dominio": "Activo"},
+        app_superficie.fila_dominio_error("roto.com"),
+    ]
+    faltan, hechas = app_superficie.repartir_para_trabajador(["ok.com", "roto.com", "nuevo.com"], filas)
+    assert faltan == ["roto.com", "nuevo.com"]
+    assert [f["dominio"] for f in hechas] == ["ok.com"]
+
+
+def test_resumen_etapas_incluye_los_timeouts_aprendidos(monkeypatch):
+    aprendido = TimeoutAdaptativo("Primer byte", techo=10.0, piso=0.5, muestras_min=1)
+    aprendido.registrar(0.5)
+    aprendido.vencido()
+    sin_muestras = TimeoutAdaptativo("WHOIS", techo=10.0, piso=0.5)
+    monkeypatch.setattr(latencias, "_TIMEOUTS", {"Primer byte": aprendido, "WHOIS": sin_muestras})
+
+    pipeline = SimpleNamespace(estadisticas=lambda: [{"etapa": "DNS", "procesados": 3, "recibidos": 5}])
+    assert app_superficie.resumen_etapas(pipeline) == "DNS 3/5 | ⏱️ Primer byte 1.5 s (1 al carril lento)"
@@ -0,0 +1,103 @@
+"""Transporte con IP fijada de http_async contra un servidor HTTP local."""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import http_async
+from dns_cache import PresupuestoReintentos
+from plazo import Plazo
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Manejador)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def resolucion(monkeypatch):
+    """Reemplaza la resolución DNS: {host: [ips]} y registra los presupuestos recibidos."""
+    zona = {}
+    presupuestos = []
+
+    async def resolver(host, presupuesto=None):
+        presupuestos.append(presupuesto)
+        return zona.get(host, [])
+
+    monkeypatch.setattr(http_async, "direcciones_en_cache", lambda host: [])
+    monkeypatch.setattr(http_async, "resolver_destino_async", resolver)
+    return zona, presupuestos
+
+
+async def _pedir(puerto: int, presupuesto=None) -> httpx.Response:
+    token = http_async._PRESUPUESTO_SONDA.set(presupuesto)
+    try:
+        transporte = http_async.crear_transporte(httpx.Limits(max_connections=4))
+        async with httpx.AsyncClient(transport=transporte) as cliente:
+            return await cliente.get(f"http://sitio.test:{puerto}/")
+    finally:
+        http_async._PRESUPUESTO_SONDA.reset(token)
+
+
+def test_conecta_a_la_ip_del_cache_con_el_host_original(servidor, resolucion):
+    zona, _ = resolucion
+    zona["sitio.test"] = ["127.0.0.1"]
+    resp = asyncio.run(_pedir(servidor))
+    assert resp.status_code == 200
+    assert resp.request.url.host == "sitio.test"
+
+
+def test_pasa_a_la_siguiente_ip_si_la_primera_rechaza(servidor, resolucion):
+    zona, _ = resolucion
+    # 127.0.0.2 es loopback pero el servidor solo escucha en 127.0.0.1
+    zona["sitio.test"] = ["127.0.0.2", "127.0.0.1"]
+    assert asyncio.run(_pedir(servidor)).status_code == 200
+
+
+def test_sin_ip_que_responda_falla_la_conexion(servidor, resolucion):
+    zona, _ = resolucion
+    zona["sitio.test"] = ["127.0.0.2"]
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(_pedir(servidor))
+
+
+def test_resuelve_con_el_presupuesto_del_dominio(servidor, resolucion):
+    zona, presupuestos = resolucion
+    zona["sitio.test"] = ["127.0.0.1"]
+    presupuesto = PresupuestoReintentos(plazo=Plazo(10))
+    asyncio.run(_pedir(servidor, presupuesto))
+    assert presupuestos and all(p is presupuesto for p in presupuestos)
+
+
+def test_limites_por_ip_usan_el_presupuesto_del_dominio(resolucion):
+    zona, presupuestos = resolucion
+    zona["a.test"] = ["10.0.0.1"]
+    zona["b.test"] = ["10.0.0.1"]
+    presupuesto = PresupuestoReintentos(plazo=Plazo(10))
+
+    async def correr():
+        http_async._PRESUPUESTO_SONDA.set(presupuesto)
+        limites = http_async.LimitesDestino(por_ip=2)
+        return await limites.semaforo("a.test"), await limites.semaforo("b.test")
+
+    sem_a, sem_b = asyncio.run(correr())
+    assert sem_a is sem_b  # misma IP, mismo semáforo
+    assert presupuestos == [presupuesto, presupuesto]
@@ -0,0 +1,100 @@
+"""Adapter con IP fijada y presupuesto DNS por dominio de http_probe."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_probe
+from plazo import Plazo
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        if self.path == "/viejo":
+            self.send_response(301)
+            self.send_header("Location", "/nuevo")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Manejador)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def resolucion(monkeypatch):
+    """{host: [ips]} en lugar del cache DNS; registra los presupuestos de resolver_destino."""
+    zona = {}
+    presupuestos = []
+
+    def resolver(host, presupuesto=None):
+        presupuestos.append(presupuesto)
+        return zona.get(host, [])
+
+    monkeypatch.setattr(http_probe, "direcciones_en_cache", lambda host: zona.get(host, []))
+    monkeypatch.setattr(http_probe, "resolver_destino", resolver)
+    return zona, presupuestos
+
+
+def test_pasa_a_la_siguiente_ip_si_la_primera_rechaza(servidor, resolucion):
+    zona, _ = resolucion
+    # 127.0.0.2 es loopback pero el servidor solo escucha en 127.0.0.1
+    zona["sitio.test"] = ["127.0.0.2", "127.0.0.1"]
+    with http_probe.crear_sesion() as sesion:
+        resp = sesion.get(f"http://sitio.test:{servidor}/nuevo", timeout=5)
+    assert resp.status_code == 200
+
+
+def test_sin_ip_que_responda_lanza_connection_error(servidor, resolucion):
+    zona, _ = resolucion
+    zona["sitio.test"] = ["127.0.0.2", "127.0.0.3"]
+    with http_probe.crear_sesion() as sesion:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            sesion.get(f"http://sitio.test:{servidor}/nuevo", timeout=5)
+
+
+def test_redirects_comparten_el_presupuesto_del_dominio(servidor, resolucion):
+    zona, presupuestos = resolucion
+    zona["sitio.test"] = ["127.0.0.1"]
+    with http_probe.crear_sesion() as sesion:
+        traza = http_probe._seguir(sesion, f"http://sitio.test:{servidor}/viejo", plazo=Plazo(10))
+    assert traza.ok and [s.status for s in traza.saltos] == [301, 200]
+    assert len(presupuestos) == 2
+    assert presupuestos[0] is presupuestos[1] is not None
+
+
+def test_conmutar_de_ip_no_estira_el_plazo(resolucion, monkeypatch):
+    zona, _ = resolucion
+    zona["muerto.test"] = ["127.0.0.2", "127.0.0.3", "127.0.0.4", "127.0.0.5"]
+    intentos = []
+
+    def send_colgado(adaptador, request, **kwargs):
+        intentos.append((kwargs["timeout"], adaptador.max_retries.total))
+        time.sleep(0.4)
+        raise requests.exceptions.ConnectTimeout("sin respuesta")
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", send_colgado)
+    plazo = Plazo(1.0)
+    with http_probe.crear_sesion() as sesion, plazo.activo():
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            http_probe._pedir(sesion, "HEAD", "http://muerto.test/", plazo)
+    # Se deja de probar IPs al agotarse el plazo, cada intento con lo que queda
+    assert len(intentos) == 3
+    conexiones = [t[0] for t, _ in intentos]
+    assert conexiones == sorted(conexiones, reverse=True) and conexiones[-1] <= 0.25
+    assert all(reintentos == 0 for _, reintentos in intentos)  # la siguiente IP es el reintento
@@ -0,0 +1,148 @@
+"""Pipeline por etapas: ruteo, errores, cancelación y executor propio de EtapaAsync."""
+
+import asyncio
+import contextlib
+import threading
+import time
+
+import pytest
+
+from pipeline import Etapa, EtapaAsync, EtapaHilos, Pipeline
+
+
+def _todas_terminadas(pipeline: Pipeline, espera: float = 5.0) -> bool:
+    return all(e.terminada.wait(espera) for e in pipeline.etapas)
+
+
+def test_etapa_es_abstracta():
+    with pytest.raises(TypeError):
+        Etapa("x", lambda *a: None, 1)
+
+
+def test_hilos_y_async_encadenados_entregan_todo():
+    pipeline = Pipeline()
+    hilos_destino = []
+
+    @contextlib.asynccontextmanager
+    async def abrir():
+        async def triplicar(x):
+            await asyncio.sleep(0.001)
+            return x * 3
+        yield triplicar
+
+    def a_la_salida(item, resultado, error):
+        hilos_destino.append(threading.current_thread().name)
+        pipeline.emitir((item, resultado))
+
+    asincrona = EtapaAsync("triple", abrir, a_la_salida, concurrencia=4)
+    doble = EtapaHilos("doble", lambda x: x * 2, lambda i, r, e: asincrona.poner(r), concurrencia=3)
+    pipeline.agregar(doble)
+    pipeline.agregar(asincrona, previas=[doble])
+
+    salida = sorted(pipeline.ejecutar(range(50), doble))
+    assert salida == sorted((x * 2, x * 6) for x in range(50))
+    # El destino de la etapa async corre en sus hilos, no en el executor por defecto
+    assert all(nombre.startswith("triple") for nombre in hilos_destino)
+
+
+def test_errores_de_fn_llegan_al_destino():
+    pipeline = Pipeline()
+
+    def fn(x):
+        if x % 2:
+            raise ValueError(x)
+        return x
+
+    etapa = EtapaHilos("pares", fn, lambda i, r, e: pipeline.emitir((i, type(e).__name__ if e else r)), 2)
+    pipeline.agregar(etapa)
+    salida = dict(pipeline.ejecutar(range(6), etapa))
+    assert salida == {0: 0, 1: "ValueError", 2: 2, 3: "ValueError", 4: 4, 5: "ValueError"}
+    assert etapa.estadisticas()["errores"] == 3
+
+
+def test_async_sin_recursos_entrega_cada_item_con_el_error():
+    pipeline = Pipeline()
+
+    @contextlib.asynccontextmanager
+    async def abrir():
+        raise RuntimeError("sin cliente")
+        yield
+
+    etapa = EtapaAsync("rota", abrir, lambda i, r, e: pipeline.emitir((i, str(e))), 2)
+    pipeline.agregar(etapa)
+    assert sorted(pipeline.ejecutar(range(3), etapa)) == [(0, "sin cliente"), (1, "sin cliente"), (2, "sin cliente")]
+
+
+def test_cancelar_vacia_las_colas_sin_llamar_a_fn():
+    pipeline = Pipeline()
+    llamadas = []
+
+    def lento(x):
+        llamadas.append(x)
+        time.sleep(0.02)
+        return x
+
+    etapa = EtapaHilos("lenta", lento, lambda i, r, e: pipeline.emitir(r), concurrencia=2, capacidad=50)
+    pipeline.agregar(etapa)
+    salida = pipeline.ejecutar(range(200), etapa)
+    next(salida)
+    salida.close()
+
+    assert _todas_terminadas(pipeline)
+    assert len(llamadas) < 20
+
+
+def test_cancelar_vacia_las_colas_async_sin_llamar_a_fn():
+    pipeline = Pipeline()
+    llamadas = []
+
+    @contextlib.asynccontextmanager
+    async def abrir():
+        async def lento(x):
+            llamadas.append(x)
+            await asyncio.sleep(0.02)
+            return x
+        yield lento
+
+    etapa = EtapaAsync("lenta", abrir, lambda i, r, e: pipeline.emitir(r), concurrencia=2, capacidad=50)
+    pipeline.agregar(etapa)
+    salida = pipeline.ejecutar(range(200), etapa)
+    next(salida)
+    salida.close()
+
+    assert _todas_terminadas(pipeline)
+    assert len(llamadas) < 20
+
+
+def test_rama_lenta_llena_no_frena_a_la_rapida():
+    pipeline = Pipeline()
+    soltar = threading.Event()
+    rapidos = []
+
+    def rapido(x):
+        rapidos.append(x)
+        return x
+
+    def lento(x):
+        soltar.wait(5)
+        return x
+
+    rapida = EtapaHilos("rápida", rapido, lambda i, r, e: pipeline.emitir(("rápida", r)), 2, capacidad=1)
+    lenta = EtapaHilos("lenta", lento, lambda i, r, e: pipeline.emitir(("lenta", r)), 1, capacidad=1)
+
+    def repartir(item, resultado, error):
+        rapida.poner(resultado)
+        lenta.encargar(resultado)
+
+    entrada = EtapaHilos("entrada", lambda x: x, repartir, 1, capacidad=1)
+    pipeline.agregar(entrada)
+    pipeline.agregar(rapida, previas=[entrada])
+    pipeline.agregar(lenta, previas=[entrada])
+
+    salida = pipeline.ejecutar(range(30), entrada)
+    vistos = [next(salida) for _ in range(30)]
+    # Con la rama lenta trabada y su cola llena, la rápida recibió todo el lote
+    assert sorted(r for rama, r in vistos if rama == "rápida") == list(range(30))
+    soltar.set()
+    resto = list(salida)
+    assert sorted(r for rama, r in resto if rama == "lenta") == list(range(30))
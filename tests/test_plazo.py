@@ -0,0 +1,130 @@
+"""Reloj pausable por dominio y ejecutar_con_plazo."""
+
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import plazo as modulo_plazo
+from latencias import TimeoutAdaptativo
+from plazo import (
+    ETAPA_DNS, ETAPA_WHOIS, Plazo, PlazoAgotado, aplicar_marcas, ejecutar_con_plazo,
+    registrar_marcas,
+)
+
+
+@pytest.fixture
+def ejecutor_de_uno(monkeypatch):
+    """_EJECUTOR con un solo hilo para poder ocuparlo desde la prueba."""
+    ejecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(modulo_plazo, "_EJECUTOR", ejecutor)
+    yield ejecutor
+    ejecutor.shutdown(wait=True)
+
+
+def test_el_reloj_solo_corre_dentro_de_activo():
+    p = Plazo(10)
+    time.sleep(0.05)
+    assert p.consumido() == 0.0
+    with p.activo():
+        with p.activo():  # reentrante: cuenta una sola vez
+            time.sleep(0.05)
+    consumido = p.consumido()
+    time.sleep(0.05)
+    assert 0.04 <= consumido < 0.5
+    assert p.consumido() == consumido
+
+
+def test_sin_limite_no_se_agota_ni_acota():
+    p = Plazo(None)
+    assert p.restante() is None
+    assert not p.agotado
+    assert p.acotar(3.0) == 3.0
+
+
+def test_verificar_corta_y_lanza_con_plazo_agotado():
+    p = Plazo(0.01)
+    with p.activo():
+        time.sleep(0.02)
+    with pytest.raises(PlazoAgotado):
+        p.verificar(ETAPA_DNS)
+    assert p.cortes == [ETAPA_DNS] and p.parcial
+
+
+def test_marcas_anidadas_suben_al_registro_externo():
+    p = Plazo(10)
+    with registrar_marcas() as externas:
+        with registrar_marcas() as internas:
+            p.cortar(ETAPA_DNS)
+        p.marcar_lento(ETAPA_WHOIS)
+    assert internas == [("corte", ETAPA_DNS)]
+    assert externas == [("corte", ETAPA_DNS), ("lento", ETAPA_WHOIS)]
+
+    otro = Plazo(10)
+    aplicar_marcas(otro, externas)
+    assert otro.cortes == [ETAPA_DNS] and otro.lentos == [ETAPA_WHOIS]
+
+
+def test_ejecutar_con_plazo_retorna_el_resultado():
+    assert ejecutar_con_plazo(Plazo(5), ETAPA_WHOIS, lambda x: x * 2, 21) == 42
+
+
+def test_ejecutar_con_plazo_corta_al_agotarse():
+    p = Plazo(0.1)
+    resultado = ejecutar_con_plazo(p, ETAPA_WHOIS, time.sleep, 1.0, defecto="N/D")
+    assert resultado == "N/D"
+    assert p.cortes == [ETAPA_WHOIS]
+
+
+def test_la_espera_en_cola_no_se_cobra_al_plazo(ejecutor_de_uno):
+    liberar = threading.Event()
+    ejecutor_de_uno.submit(liberar.wait)  # llamada abandonada que ocupa el hilo
+    threading.Timer(0.3, liberar.set).start()
+
+    p = Plazo(1.0)
+    assert ejecutar_con_plazo(p, ETAPA_WHOIS, lambda: "ok") == "ok"
+    assert p.consumido() < 0.2
+    assert not p.cortes and not p.lentos
+
+
+def test_sin_hilo_libre_se_descarta_como_lenta(ejecutor_de_uno):
+    liberar = threading.Event()
+    ejecutor_de_uno.submit(liberar.wait)
+    llamadas = []
+    try:
+        p = Plazo(0.2)
+        resultado = ejecutar_con_plazo(p, ETAPA_WHOIS, llamadas.append, 1, defecto="N/D")
+    finally:
+        liberar.set()
+    assert resultado == "N/D"
+    assert p.lentos == [ETAPA_WHOIS] and not p.cortes
+    assert p.consumido() == 0.0
+    ejecutor_de_uno.submit(lambda: None).result()
+    assert llamadas == []  # la llamada descartada nunca corrió
+
+
+def test_timeout_adaptativo_vencido_marca_lenta():
+    adaptativo = TimeoutAdaptativo("prueba", techo=2.0, piso=0.05, muestras_min=1)
+    adaptativo.registrar(0.01)
+    p = Plazo(10)
+    resultado = ejecutar_con_plazo(
+        p, ETAPA_WHOIS, time.sleep, 0.5, defecto="N/D", adaptativo=adaptativo
+    )
+    assert resultado == "N/D"
+    assert p.lentos == [ETAPA_WHOIS] and not p.cortes
+    assert adaptativo.vencidos == 1
+
+
+def test_techo_vencido_en_el_carril_lento_corta_la_etapa():
+    adaptativo = TimeoutAdaptativo("prueba", techo=0.2, piso=0.05, muestras_min=1)
+    adaptativo.registrar(0.01)
+    p = Plazo(10)
+    p.pasar_a_carril_lento()
+    resultado = ejecutar_con_plazo(
+        p, ETAPA_WHOIS, time.sleep, 0.5, defecto="N/D", adaptativo=adaptativo
+    )
+    # Sin más reintentos: el dominio queda parcial y no se cachea como completo
+    assert resultado == "N/D"
+    assert p.cortes == [ETAPA_WHOIS] and p.parcial
+    assert adaptativo.vencidos == 0
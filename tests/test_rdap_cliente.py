@@ -0,0 +1,50 @@
+"""Bootstrap de IANA y errores de red de la fase de antigüedad."""
+
+import json
+
+import pytest
+import requests
+
+import app_superficie
+import rdap_cliente
+from plazo import ETAPA_WHOIS, Plazo
+
+
+def test_bootstrap_es_el_archivo_de_iana():
+    with open(rdap_cliente.RDAP_BOOTSTRAP_PATH, encoding="utf-8") as f:
+        bootstrap = json.load(f)
+    assert set(bootstrap) == {"description", "publication", "services", "version"}
+    assert len(bootstrap["services"]) > 500
+
+
+@pytest.mark.parametrize("dominio,servidor", [
+    ("empresa.com", "https://rdap.verisign.com/com/v1/"),
+    ("empresa.com.br", "https://rdap.registro.br/"),
+])
+def test_servidor_rdap_por_tld(dominio, servidor):
+    assert rdap_cliente.servidor_rdap(dominio) == servidor
+
+
+def test_tld_sin_rdap_va_por_whois():
+    assert rdap_cliente.servidor_rdap("empresa.com.mx") is None
+
+
+@pytest.mark.parametrize("error", [requests.ConnectionError("caído"), OSError("reset")])
+def test_error_de_red_deja_la_etapa_parcial(monkeypatch, error):
+    def falla(dominio):
+        raise error
+
+    monkeypatch.setattr(app_superficie, "fecha_creacion_dominio", falla)
+    plazo = Plazo(10)
+    assert app_superficie.fecha_creacion_con_plazo("empresa.com", plazo) is None
+    assert plazo.cortes == [ETAPA_WHOIS]
+
+
+def test_respuesta_invalida_no_es_parcial(monkeypatch):
+    def falla(dominio):
+        raise ValueError("JSON inválido")
+
+    monkeypatch.setattr(app_superficie, "fecha_creacion_dominio", falla)
+    plazo = Plazo(10)
+    assert app_superficie.fecha_creacion_con_plazo("empresa.com", plazo) is None
+    assert not plazo.cortes
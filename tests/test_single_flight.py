@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from plazo import ETAPA_DNS, Plazo
+from single_flight import SingleFlight
+
+
+def test_hilos_concurrentes_hacen_una_sola_llamada():
+    vuelos = SingleFlight()
+    llamadas = []
+    barrera = threading.Barrier(8)
+
+    def lenta():
+        llamadas.append(1)
+        time.sleep(0.2)
+        return 42
+
+    resultados = []
+
+    def pedir():
+        barrera.wait()
+        resultados.append(vuelos.hacer("k", lenta))
+
+    hilos = [threading.Thread(target=pedir) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert resultados == [42] * 8
+    assert len(llamadas) == 1
+    assert vuelos.estadisticas()["en_vuelo"] == 0
+
+
+def test_excepcion_del_lider_llega_a_los_seguidores():
+    vuelos = SingleFlight()
+    listo = threading.Event()
+
+    def falla():
+        listo.wait(1)
+        raise ValueError("red")
+
+    errores = []
+
+    def pedir():
+        try:
+            vuelos.hacer("k", falla)
+        except ValueError as e:
+            errores.append(str(e))
+
+    hilos = [threading.Thread(target=pedir) for _ in range(3)]
+    for h in hilos:
+        h.start()
+    time.sleep(0.1)
+    listo.set()
+    for h in hilos:
+        h.join()
+    assert errores == ["red"] * 3
+
+
+def test_marcas_del_plazo_del_lider_se_replican_en_el_seguidor():
+    vuelos = SingleFlight()
+    plazo_lider, plazo_seguidor = Plazo(), Plazo()
+    empezo = threading.Event()
+
+    def consulta(plazo):
+        empezo.set()
+        time.sleep(0.2)
+        plazo.marcar_lento(ETAPA_DNS)
+        return "timeout"
+
+    hilo = threading.Thread(target=vuelos.hacer, args=("k", consulta, plazo_lider), kwargs={"plazo": plazo_lider})
+    hilo.start()
+    empezo.wait(1)
+    assert vuelos.hacer("k", consulta, plazo_seguidor, plazo=plazo_seguidor) == "timeout"
+    hilo.join()
+    assert plazo_lider.lentos == [ETAPA_DNS]
+    assert plazo_seguidor.lentos == [ETAPA_DNS]
+
+
+def test_lider_cancelado_cede_la_posta_al_seguidor():
+    vuelos = SingleFlight()
+    llamadas = []
+
+    async def consulta():
+        llamadas.append(1)
+        await asyncio.sleep(0.2)
+        return "ok"
+
+    async def escenario():
+        lider = asyncio.ensure_future(vuelos.hacer_async("k", consulta))
+        await asyncio.sleep(0.05)
+        seguidor = asyncio.ensure_future(vuelos.hacer_async("k", consulta))
+        await asyncio.sleep(0.05)
+        lider.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lider
+        return await seguidor
+
+    assert asyncio.run(escenario()) == "ok"
+    assert len(llamadas) == 2
+
+
+def test_seguidor_cancelado_no_cancela_a_los_demas():
+    vuelos = SingleFlight()
+
+    async def consulta():
+        await asyncio.sleep(0.2)
+        return "ok"
+
+    async def escenario():
+        lider = asyncio.ensure_future(vuelos.hacer_async("k", consulta))
+        await asyncio.sleep(0.02)
+        impaciente = asyncio.ensure_future(vuelos.hacer_async("k", consulta))
+        paciente = asyncio.ensure_future(vuelos.hacer_async("k", consulta))
+        await asyncio.sleep(0.02)
+        impaciente.cancel()
+        return await lider, await paciente
+
+    assert asyncio.run(escenario()) == ("ok", "ok")
@@ -0,0 +1,160 @@
+"""Sonda HTTP única por dominio: traza, estado HTTPS, cuerpo acotado y sesión compartida."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_probe
+from http_probe import (
+    ESTADO_HTTPS_DISPONIBLE, ESTADO_HTTPS_FORZADO, ESTADO_HTTPS_NO_DISPONIBLE, SaltoHTTP, SondaHTTP,
+    TrazaHTTP,
+)
+from plazo import Plazo
+
+
+# Cuerpo de /grande: bastante más que HTTP_BYTES_DRENAR
+CUERPO_GRANDE = bytes(range(256)) * 1024
+
+
+class _Sitio(BaseHTTPRequestHandler):
+    """
+    Solo HTTP (sin TLS): / redirige a /inicio, que responde con headers de CDN;
+    /sin-head rechaza HEAD con 405 y /grande tiene un cuerpo de 256 KB.
+    """
+    pedidos = []
+    conexiones = set()
+
+    def _responder(self, cuerpo: bytes = b""):
+        _Sitio.pedidos.append((self.command, self.path))
+        _Sitio.conexiones.add(self.client_address)
+        if self.path == "/sin-head" and self.command == "HEAD":
+            self.send_response(405)
+        elif self.path == "/":
+            self.send_response(302)
+            self.send_header("Location", "/inicio")
+            cuerpo = b""
+        else:
+            self.send_response(200)
+            self.send_header("CF-Ray", "8a1b2c3d4e5f-MEX")
+            self.send_header("Strict-Transport-Security", "max-age=31536000")
+            self.send_header("Set-Cookie", "sesion=prospecto-1; Path=/")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(cuerpo)
+
+    def do_HEAD(self):
+        self._responder()
+
+    def do_GET(self):
+        self._responder(CUERPO_GRANDE if self.path == "/grande" else b"")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _SitioKeepAlive(_Sitio):
+    protocol_version = "HTTP/1.1"
+
+
+@pytest.fixture(params=[_Sitio])
+def sitio(request):
+    _Sitio.pedidos = []
+    _Sitio.conexiones = set()
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), request.param)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def _traza(url_final: str, ok: bool = True) -> TrazaHTTP:
+    traza = TrazaHTTP(url_inicial=url_final, url_final=url_final, headers={"Server": url_final})
+    if ok:
+        traza.saltos.append(SaltoHTTP(url_final, 200))
+    else:
+        traza.error = "ConnectionError"
+    return traza
+
+
+@pytest.mark.parametrize("https_ok, http_final, http_ok, estado", [
+    (True, "https://e.com/", True, ESTADO_HTTPS_FORZADO),  # http redirige a https
+    (True, "http://e.com/", False, ESTADO_HTTPS_FORZADO),  # solo responde https
+    (True, "http://e.com/", True, ESTADO_HTTPS_DISPONIBLE),  # ambos, sin redirect
+    (False, "http://e.com/", True, ESTADO_HTTPS_NO_DISPONIBLE),
+])
+def test_estado_https_de_las_dos_trazas(https_ok, http_final, http_ok, estado):
+    sonda = SondaHTTP("e.com", _traza("https://e.com/", https_ok), _traza(http_final, http_ok))
+    assert sonda.estado_https == estado
+
+
+def test_headers_finales_de_https_o_de_http():
+    https, http = _traza("https://e.com/"), _traza("http://e.com/")
+    assert SondaHTTP("e.com", https, http).headers == {"Server": "https://e.com/"}
+    assert SondaHTTP("e.com", _traza("https://e.com/", ok=False), http).headers == {"Server": "http://e.com/"}
+    assert SondaHTTP("e.com", _traza("x", ok=False), _traza("y", ok=False)).headers is None
+
+
+def test_una_sonda_guarda_la_cadena_y_los_headers_finales(sitio):
+    sonda = http_probe._sondear(sitio, 0, Plazo(10))
+    assert not sonda.https.ok  # el servidor no habla TLS
+    assert [s.status for s in sonda.http.saltos] == [302, 200]
+    assert sonda.http.url_final == f"http://{sitio}/inicio"
+    assert sonda.headers["CF-Ray"] == "8a1b2c3d4e5f-MEX"
+    assert sonda.estado_https == ESTADO_HTTPS_NO_DISPONIBLE
+    # Un pedido por salto: nada de evaluar_https + hacer_request por separado
+    assert _Sitio.pedidos == [("HEAD", "/"), ("HEAD", "/inicio")]
+
+
+def test_head_no_soportado_pasa_a_get(sitio):
+    with http_probe.crear_sesion() as sesion:
+        traza = http_probe._seguir(sesion, f"http://{sitio}/sin-head", plazo=Plazo(10))
+    assert traza.ok and [s.status for s in traza.saltos] == [200]
+    assert _Sitio.pedidos == [("HEAD", "/sin-head"), ("GET", "/sin-head")]
+
+
+def test_sin_cuerpo_pedido_no_se_descarga(sitio):
+    with http_probe.crear_sesion() as sesion:
+        traza = http_probe._seguir(sesion, f"http://{sitio}/grande", plazo=Plazo(10))
+    assert traza.ok and traza.cuerpo == b""
+    assert _Sitio.pedidos == [("HEAD", "/grande")]
+
+
+def test_cuerpo_pedido_se_corta_en_el_tope(sitio):
+    with http_probe.crear_sesion() as sesion:
+        traza = http_probe._seguir(sesion, f"http://{sitio}/grande", bytes_cuerpo=64, plazo=Plazo(10))
+        # Solo la respuesta final se repite como GET, y el cuerpo llega recortado
+        assert traza.cuerpo == CUERPO_GRANDE[:64]
+        assert _Sitio.pedidos == [("HEAD", "/grande"), ("GET", "/grande")]
+        # La conexión cortada no deja a la sesión sin poder seguir
+        assert http_probe._seguir(sesion, f"http://{sitio}/inicio", plazo=Plazo(10)).ok
+
+
+@pytest.fixture
+def sesion_del_proceso(monkeypatch):
+    monkeypatch.setattr(http_probe, "_SESION", None)
+    monkeypatch.setattr(http_probe, "_SESION_CONCURRENCIA", 0)
+
+
+def test_configurar_sesion_es_idempotente(sesion_del_proceso):
+    sesion = http_probe.configurar_sesion_http(8)
+    assert http_probe.configurar_sesion_http(8) is sesion
+    assert http_probe.obtener_sesion() is sesion
+    adaptador = sesion.get_adapter("https://e.com/")
+    assert adaptador._pool_maxsize == 8
+    assert adaptador._pool_connections >= http_probe.HTTP_POOL_HOSTS
+
+    otra = http_probe.configurar_sesion_http(16)  # Cambió la concurrencia: pool nuevo
+    assert otra is not sesion and otra.get_adapter("https://e.com/")._pool_maxsize == 16
+    assert not adaptador.poolmanager.pools  # la anterior quedó cerrada
+
+
+@pytest.mark.parametrize("sitio", [_SitioKeepAlive], indirect=True)
+def test_sondas_reusan_la_conexion_y_no_guardan_cookies(sitio):
+    with http_probe.crear_sesion() as sesion:
+        for _ in range(3):
+            assert http_probe._seguir(sesion, f"http://{sitio}/", plazo=Plazo(10)).ok
+        assert not sesion.cookies  # la sesión la comparten todos los prospectos
+    assert len(_Sitio.pedidos) == 6
+    assert len(_Sitio.conexiones) == 1  # keep-alive: una sola conexión TCP
@@ -0,0 +1,95 @@
+"""Expansión recursiva de SPF: lookups de RFC 7208, includes anidados y memoria del lote."""
+
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import spf_resolver
+from dns_async import RegistrosIdentidad
+from dns_cache import EstadoDNS, RespuestaDNS
+from spf_resolver import ExpansorSPF, expandir_spf_lote, parsear_spf
+
+SPF = {
+    "spf.protection.outlook.com": "v=spf1 ip4:40.92.0.0/15 include:spfd.protection.outlook.com -all",
+    "spfd.protection.outlook.com": "v=spf1 ip4:40.107.0.0/16 -all",
+    "_spf.google.com": "v=spf1 include:_netblocks.google.com ~all",
+    "_netblocks.google.com": "v=spf1 ip4:35.190.247.0/24 ~all",
+    "mimecast.com": "v=spf1 redirect=_spf.mimecast.com",
+    "_spf.mimecast.com": "v=spf1 a mx ~all",
+    "bucle-a.com": "v=spf1 include:bucle-b.com -all",
+    "bucle-b.com": "v=spf1 include:bucle-a.com -all",
+}
+
+
+@pytest.fixture
+def dns_spf(monkeypatch):
+    """consultar_async falso con los TXT de SPF; cuenta las consultas por dominio."""
+    consultas = Counter()
+
+    async def consultar_async(nombre, rdtype, lifetime=None, presupuesto=None):
+        consultas[nombre] += 1
+        await asyncio.sleep(0)
+        if nombre not in SPF:
+            return RespuestaDNS(EstadoDNS.NXDOMAIN, (), 300)
+        return RespuestaDNS(EstadoDNS.RESPUESTA, (SimpleNamespace(strings=(SPF[nombre].encode(),)),), 300)
+
+    monkeypatch.setattr(spf_resolver, "consultar_async", consultar_async)
+    return consultas
+
+
+@pytest.mark.parametrize("spf, includes, redirect, lookups", [
+    ("v=spf1 include:_spf.google.com mx a:mail.e.com ip4:1.2.3.4 exists:%{i}.e.com -all",
+     ["_spf.google.com"], None, 4),
+    ("v=spf1 ip4:1.2.3.4 redirect=_spf.e.com.", [], "_spf.e.com", 1),
+    ("v=spf1 include:a.com redirect=_spf.e.com -all", ["a.com"], None, 1),  # "all" anula redirect
+    ("v=spf1 ~include:a.com exp=explica.e.com ?all", ["a.com"], None, 1),
+])
+def test_parsear_spf(spf, includes, redirect, lookups):
+    assert parsear_spf(spf) == (includes, redirect, lookups)
+
+
+def _expandir(expansor, dominio, spf):
+    return asyncio.run(expansor.expandir(dominio, spf))
+
+
+def test_includes_anidados_y_redirect(dns_spf):
+    expansion = _expandir(
+        ExpansorSPF(), "empresa.com", "v=spf1 include:spf.protection.outlook.com include:mimecast.com -all"
+    )
+    assert expansion.incluidos == (
+        "spf.protection.outlook.com", "spfd.protection.outlook.com", "mimecast.com", "_spf.mimecast.com",
+    )
+    # 2 includes propios + 1 anidado de outlook + redirect de mimecast + a y mx del destino
+    assert expansion.lookups == 6
+    assert not expansion.excede_limite
+
+
+def test_includes_compartidos_se_consultan_una_vez_por_lote(dns_spf):
+    registros = {
+        f"cliente{i}.com": RegistrosIdentidad(
+            mx=[], spf="v=spf1 include:spf.protection.outlook.com include:_spf.google.com -all", dmarc=""
+        )
+        for i in range(20)
+    }
+    registros["sin-spf.com"] = RegistrosIdentidad(mx=[], spf="", dmarc="")
+    expandir_spf_lote(registros, concurrencia=5)
+
+    assert set(dns_spf.values()) == {1}
+    assert len(dns_spf) == 4  # outlook, spfd, google, netblocks
+    r = registros["cliente7.com"]
+    assert "_netblocks.google.com" in r.spf_incluidos and r.spf_lookups == 4
+    assert registros["sin-spf.com"].spf_incluidos == []
+
+
+def test_bucles_e_includes_rotos_terminan(dns_spf):
+    expansion = _expandir(ExpansorSPF(), "bucle-a.com", SPF["bucle-a.com"])
+    assert expansion.incluidos == ("bucle-b.com",)
+    roto = _expandir(ExpansorSPF(), "e.com", "v=spf1 include:no-existe.com include:%{d}.e.com -all")
+    assert roto.incluidos == ("no-existe.com",) and roto.lookups == 2
+
+
+def test_mas_de_diez_lookups_excede_el_limite(dns_spf):
+    spf = "v=spf1 " + " ".join(f"a:h{i}.e.com" for i in range(9)) + " include:_spf.mimecast.com -all"
+    assert _expandir(ExpansorSPF(), "e.com", spf).excede_limite  # 9 + include + a + mx
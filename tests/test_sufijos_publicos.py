@@ -0,0 +1,22 @@
+import pytest
+
+from sufijos_publicos import dominio_registrable
+
+
+@pytest.mark.parametrize(
+    "host, esperado",
+    [
+        ("Ventas.Empresa.com.mx.", "empresa.com.mx"),
+        ("mail.empresa.co.uk", "empresa.co.uk"),
+        ("empresa.com", "empresa.com"),
+        ("com.mx", "com.mx"),
+        ("münchen.de", "xn--mnchen-3ya.de"),
+    ],
+)
+def test_dominio_registrable(host, esperado):
+    assert dominio_registrable(host) == esperado
+
+
+@pytest.mark.parametrize("ip", ["1.2.3.4", "192.168.1.1", "2001:db8::1", "::ffff:10.0.0.1"])
+def test_ip_literal_se_devuelve_tal_cual(ip):
+    assert dominio_registrable(ip) == ip
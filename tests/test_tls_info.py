@@ -0,0 +1,111 @@
+"""InfoTLS leído del socket de la sonda: emisor, vencimiento, protocolo y clave."""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import tls_info
+from http_probe import _tls_de_respuesta
+from tls_info import info_desde_ssl
+
+
+def _fecha_cert(fecha: datetime) -> str:
+    """notAfter en el formato de getpeercert(): 'Jun  1 12:00:00 2030 GMT'."""
+    return fecha.strftime("%b %d %H:%M:%S %Y GMT")
+
+
+class _SocketTLS:
+    def __init__(self, protocolo="TLSv1.3", vence=None, der=None, emisor=None):
+        self._protocolo = protocolo
+        self._der = der
+        self._cert = {
+            "subject": ((("commonName", "www.empresa.com"),),),
+            "issuer": emisor if emisor is not None else (
+                (("countryName", "US"),),
+                (("organizationName", "Let's Encrypt"),),
+                (("commonName", "R11"),),
+            ),
+            "notAfter": _fecha_cert(vence or datetime.now(timezone.utc) + timedelta(days=90)),
+        }
+
+    def getpeercert(self, binary_form=False):
+        return self._der if binary_form else self._cert
+
+    def cipher(self):
+        return ("TLS_AES_128_GCM_SHA256", self._protocolo, 128)
+
+    def version(self):
+        return self._protocolo
+
+
+def test_emisor_sujeto_y_vencimiento():
+    info = info_desde_ssl(_SocketTLS())
+    assert info.protocolo == "TLSv1.3" and info.cifrado == "TLS_AES_128_GCM_SHA256"
+    assert info.emisor == "Let's Encrypt"
+    assert info.sujeto == "www.empresa.com"
+    assert 88 <= info.dias_para_vencer <= 90
+    assert not info.por_vencer and not info.protocolo_obsoleto
+    assert info.clave is None  # sin DER no hay clave
+
+
+def test_emisor_sin_organizacion_usa_el_cn():
+    info = info_desde_ssl(_SocketTLS(emisor=((("commonName", "CA Interna"),),)))
+    assert info.emisor == "CA Interna"
+
+
+def test_por_vencer_y_protocolo_obsoleto():
+    info = info_desde_ssl(_SocketTLS("TLSv1.1", vence=datetime.now(timezone.utc) + timedelta(days=10)))
+    assert info.por_vencer
+    assert info.protocolo_obsoleto
+
+
+def test_socket_sin_handshake_no_da_info():
+    class _Cerrado(_SocketTLS):
+        def getpeercert(self, binary_form=False):
+            raise ValueError("handshake no realizado")
+
+    assert info_desde_ssl(None) is None
+    assert info_desde_ssl(_Cerrado()) is None
+
+
+@pytest.mark.skipif(not tls_info.CRYPTOGRAPHY_DISPONIBLE, reason="sin cryptography")
+def test_tipo_y_tamano_de_clave():
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.serialization import Encoding
+    from cryptography.x509.oid import NameOID
+
+    clave = ec.generate_private_key(ec.SECP256R1())
+    nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "www.empresa.com")])
+    ahora = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(nombre).issuer_name(nombre)
+        .public_key(clave.public_key()).serial_number(1)
+        .not_valid_before(ahora).not_valid_after(ahora + timedelta(days=90))
+        .sign(clave, hashes.SHA256())
+    )
+    info = info_desde_ssl(_SocketTLS(der=cert.public_bytes(Encoding.DER)))
+    assert info.clave == "EC 256"
+
+
+def test_tls_de_respuesta_lee_el_socket_de_la_conexion():
+    resp = SimpleNamespace(raw=SimpleNamespace(connection=SimpleNamespace(sock=_SocketTLS("TLSv1.2"))))
+    assert _tls_de_respuesta(resp).protocolo == "TLSv1.2"
+
+
+@pytest.mark.parametrize("raw", [
+    SimpleNamespace(connection=None),  # conexión ya devuelta al pool
+    SimpleNamespace(connection=SimpleNamespace(sock=None)),  # socket cerrado
+    SimpleNamespace(),  # respuesta sin conexión (urllib3 distinto)
+])
+def test_tls_de_respuesta_sin_socket(raw):
+    assert _tls_de_respuesta(SimpleNamespace(raw=raw)) is None
+
+
+def test_fecha_del_cert_se_interpreta_como_utc():
+    vence = datetime(2030, 6, 1, 12, 0, tzinfo=timezone.utc)
+    info = info_desde_ssl(_SocketTLS(vence=vence))
+    assert info.vence == vence
@@ -0,0 +1,169 @@
+"""Cola SQLite de trabajos: toma, reclamo de trabajos vencidos, lanzamiento y SIGTERM."""
+
+import threading
+import time
+
+import pytest
+
+import app_superficie
+import trabajador
+import trabajos
+from trabajador import ejecutar_trabajo
+from trabajos import CORRIENDO, LATIDO_VENCIDO_SEGUNDOS, PENDIENTE, TERMINADO, ColaTrabajos
+
+
+@pytest.fixture
+def cola(tmp_path):
+    return ColaTrabajos(str(tmp_path / "trabajos.db"))
+
+
+def _vencer(cola, trabajo_id):
+    with cola._conexion() as conn:
+        conn.execute(
+            "UPDATE trabajos SET latido = ? WHERE id = ?",
+            (time.time() - LATIDO_VENCIDO_SEGUNDOS - 1, trabajo_id),
+        )
+
+
+def test_encolar_tomar_y_terminar(cola):
+    trabajo_id = cola.encolar(["a.com", "b.com"], 30.0)
+    trabajo = cola.tomar("t1")
+    assert trabajo.id == trabajo_id and trabajo.dominios == ["a.com", "b.com"]
+    assert cola.tomar("t2") is None  # Ya lo tiene t1 y su latido está al día
+
+    cola.agregar_filas(trabajo_id, [{"dominio": "a.com"}], {"lentos": 0})
+    assert cola.dominios_hechos(trabajo_id) == ["a.com"]
+    cola.terminar(trabajo_id, {"lentos": 0})
+    info = cola.estado(trabajo_id)
+    assert (info["estado"], info["hechos"], info["total"]) == (TERMINADO, 1, 2)
+
+
+def test_dos_trabajadores_no_toman_el_mismo_trabajo(cola):
+    cola.encolar(["a.com"], 30.0)
+    barrera = threading.Barrier(6)
+    tomados = []
+
+    def tomar(i):
+        propia = ColaTrabajos(cola.ruta)
+        barrera.wait()
+        tomados.append(propia.tomar(f"t{i}"))
+
+    hilos = [threading.Thread(target=tomar, args=(i,)) for i in range(6)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert len([t for t in tomados if t is not None]) == 1
+
+
+def test_trabajo_con_latido_vencido_se_reclama(cola):
+    trabajo_id = cola.encolar(["a.com"], 30.0)
+    cola.tomar("muerto")
+    assert not trabajos.requiere_trabajador(cola.estado(trabajo_id))
+    _vencer(cola, trabajo_id)
+    assert trabajos.requiere_trabajador(cola.estado(trabajo_id))
+    assert cola.tomar("vivo").id == trabajo_id
+
+
+def test_filas_incrementales(cola):
+    trabajo_id = cola.encolar(["a.com", "b.com", "c.com"], 30.0)
+    cola.agregar_filas(trabajo_id, [{"dominio": "a.com"}, {"dominio": "b.com"}], {})
+    filas, desde = cola.filas(trabajo_id, 0)
+    assert [f["dominio"] for f in filas] == ["a.com", "b.com"]
+    cola.agregar_filas(trabajo_id, [{"dominio": "c.com"}], {})
+    filas, _ = cola.filas(trabajo_id, desde)
+    assert [f["dominio"] for f in filas] == ["c.com"]
+
+
+class _Proceso:
+    def __init__(self, *args, **kwargs):
+        self.vivo = True
+        _Proceso.lanzados.append(self)
+
+    def poll(self):
+        return None if self.vivo else 0
+
+
+@pytest.fixture
+def popen(monkeypatch):
+    _Proceso.lanzados = []
+    monkeypatch.setattr(trabajos.subprocess, "Popen", _Proceso)
+    monkeypatch.setattr(trabajos, "_LANZADOS", {})
+    return _Proceso
+
+
+def test_asegurar_no_registra_latidos_falsos(cola, popen):
+    assert trabajos.asegurar_trabajadores(cola, procesos=2)
+    assert cola.trabajadores_vivos() == 0  # Solo el trabajador, al arrancar, da su latido
+    assert trabajos.asegurar_trabajadores(cola, procesos=2)
+    assert len(popen.lanzados) == 1  # Sigue arrancando: no se lanza otro grupo
+
+    popen.lanzados[0].vivo = False  # Murió antes de dar su primer latido
+    assert trabajos.asegurar_trabajadores(cola, procesos=2)
+    assert len(popen.lanzados) == 2
+
+
+def test_asegurar_con_trabajador_vivo_o_sin_procesos(cola, popen):
+    assert not trabajos.asegurar_trabajadores(cola, procesos=0)
+    cola.latido_trabajador("otro")
+    assert trabajos.asegurar_trabajadores(cola, procesos=2)
+    assert popen.lanzados == []
+
+
+def test_detener_devuelve_el_trabajo_con_sus_filas(cola, monkeypatch):
+    detener = threading.Event()
+    cerrado = []
+
+    def escanear(dominios, plazo, resumen, al_esperar=None, escaneo=None):
+        try:
+            for i, dominio in enumerate(dominios):
+                if i == 2:
+                    detener.set()  # SIGTERM a mitad del escaneo
+                yield {"dominio": dominio}
+        finally:
+            cerrado.append(True)
+
+    monkeypatch.setattr(app_superficie, "escanear_dominios", escanear)
+    trabajo_id = cola.encolar([f"d{i}.com" for i in range(10)], 30.0)
+    ejecutar_trabajo(cola, cola.tomar("t1"), detener)
+
+    assert cerrado
+    info = cola.estado(trabajo_id)
+    assert (info["estado"], info["hechos"]) == (PENDIENTE, 3)
+    trabajo = cola.tomar("t2")
+    assert trabajo.id == trabajo_id and cola.estado(trabajo_id)["estado"] == CORRIENDO
+    assert len(cola.dominios_hechos(trabajo_id)) == 3
+
+
+def test_detener_mientras_el_escaneo_espera(cola, monkeypatch):
+    detener = threading.Event()
+
+    def escanear(dominios, plazo, resumen, al_esperar=None, escaneo=None):
+        yield {"dominio": dominios[0]}
+        detener.set()
+        while True:
+            al_esperar(None)  # Esperando al carril lento: sin filas nuevas
+            time.sleep(0.01)
+
+    monkeypatch.setattr(app_superficie, "escanear_dominios", escanear)
+    trabajo_id = cola.encolar(["a.com", "b.com"], 30.0)
+    ejecutar_trabajo(cola, cola.tomar("t1"), detener)
+    info = cola.estado(trabajo_id)
+    assert (info["estado"], info["hechos"]) == (PENDIENTE, 1)
+
+
+def test_latido_del_trabajo_sin_filas_ni_esperas(cola, monkeypatch):
+    monkeypatch.setattr(trabajador, "TRABAJO_LATIDO_SEGUNDOS", 0.05)
+    latidos = []
+
+    def escanear(dominios, plazo, resumen, al_esperar=None, escaneo=None):
+        inicio = cola.estado(trabajo_id)["latido"]
+        time.sleep(0.5)  # Trabado sin entregar filas ni llamar a al_esperar
+        latidos.append(cola.estado(trabajo_id)["latido"] - inicio)
+        yield {"dominio": dominios[0]}
+
+    monkeypatch.setattr(app_superficie, "escanear_dominios", escanear)
+    trabajo_id = cola.encolar(["a.com"], 30.0)
+    ejecutar_trabajo(cola, cola.tomar("t1"))
+    assert latidos[0] > 0.2
+    assert cola.estado(trabajo_id)["estado"] == TERMINADO
@@ -0,0 +1,66 @@
+"""Matcher de una pasada: coincidencias por patrón, por término SPF y por header."""
+
+import pytest
+
+from app_superficie import detectar_cdn_waf, detectar_vendors_envio, detectar_vendors_seguridad
+from catalogo_vendors import cargar_catalogo
+from vendor_matcher import MatcherVendors, terminos_spf
+
+
+def test_patrones_que_coinciden_desde_la_misma_posicion():
+    matcher = MatcherVendors({"include:.*mimecast": "M", "include:.*barracuda": "B"})
+    assert matcher.todos(["include:mimecast-barracuda.example"]) == ["M", "B"]
+
+
+def test_patron_largo_no_oculta_otro_mas_adelante():
+    matcher = MatcherVendors({"pphosted": "Proofpoint", "google": "Google"})
+    assert matcher.todos(["mx1.pphosted.google.com"]) == ["Proofpoint", "Google"]
+
+
+def test_todos_sin_repetir_y_en_orden_del_catalogo():
+    matcher = MatcherVendors({"outlook": "Microsoft 365", "protection": "Microsoft 365", "google": "Google"})
+    textos = ["aspmx.l.google.com", "empresa.mail.protection.outlook.com"]
+    assert matcher.todos(textos) == ["Microsoft 365", "Google"]
+
+
+def test_primero_respeta_orden_de_textos_y_luego_catalogo():
+    matcher = MatcherVendors({"google": "Google", "outlook": "Microsoft 365"})
+    assert matcher.primero(["x.outlook.com", "aspmx.l.google.com"]) == "Microsoft 365"
+    assert matcher.primero(["x.outlook.google.com"]) == "Google"
+    assert matcher.primero(["nada.example"]) is None
+
+
+def test_mayusculas_y_catalogo_vacio():
+    assert MatcherVendors({"cloudflare": "Cloudflare"}).todos(["CloudFlare"]) == ["Cloudflare"]
+    assert MatcherVendors({}).todos(["lo que sea"]) == []
+
+
+def test_terminos_spf():
+    assert terminos_spf("v=spf1 include:a include:b -all") == ["v=spf1", "include:a", "include:b", "-all"]
+    assert terminos_spf("") == []
+
+
+@pytest.fixture(scope="module")
+def catalogo():
+    return cargar_catalogo()
+
+
+def test_spf_se_compara_termino_a_termino(catalogo):
+    # Como texto único, include:.*mimecast cruzaría hasta el a: del final
+    spf = "v=spf1 include:_spf.google.com a:mimecast-relay.example -all"
+    assert detectar_vendors_seguridad([], spf, catalogo) == []
+    spf = "v=spf1 include:eu._netblocks.mimecast.com include:sendgrid.net include:mailgun.org ~all"
+    assert detectar_vendors_seguridad([], spf, catalogo) == ["Mimecast"]
+    assert detectar_vendors_envio(spf, catalogo) == ["SendGrid", "Mailgun"]
+
+
+def test_mx_y_spf_del_mismo_vendor_no_se_repiten(catalogo):
+    mx = ["mx1.us.mimecast.com"]
+    assert detectar_vendors_seguridad(mx, "v=spf1 include:us._netblocks.mimecast.com -all", catalogo) == ["Mimecast"]
+
+
+def test_cdn_waf_en_cualquier_header(catalogo):
+    assert detectar_cdn_waf({"Server": "AkamaiGHost"}, catalogo) == "Akamai"
+    assert detectar_cdn_waf({"Server": "nginx", "X-Cache": "Hit from cloudfront"}, catalogo) == "CloudFront"
+    assert detectar_cdn_waf({"Server": "nginx", "X-CDN": "Incapsula"}, catalogo) == "Imperva"
+    assert detectar_cdn_waf({"Server": "nginx"}, catalogo) is None
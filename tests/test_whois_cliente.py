@@ -0,0 +1,86 @@
+"""Detección de respuestas de cuota en whois_cliente."""
+
+from datetime import datetime
+
+import pytest
+
+import whois_cliente
+from whois_cliente import ClienteWhois, WhoisLimitado, es_respuesta_limitada
+
+REGISTRO_COM = """\
+   Domain Name: EMPRESA.COM
+   Registry Domain ID: 12345_DOMAIN_COM-VRSN
+   Registrar WHOIS Server: whois.example-registrar.com
+   Creation Date: 2004-03-15T17:44:01Z
+   Registrar: Example Registrar, Inc.
+   Name Server: NS1.EMPRESA.COM
+
+>>> Last update of whois database: 2026-10-18T00:00:00Z <<<
+
+NOTICE: The expiration date displayed in this record is the date the
+registrar's sponsorship of the domain name registration in the registry is
+currently set to expire. You agree that you will not use this data to enable
+high volume, automated, electronic processes. Excessive querying may result
+in access denied; query rate limit exceeded responses. Try again later.
+"""
+
+REGISTRO_MX = """\
+Domain Name:       empresa.com.mx
+
+Created On:        2010-05-20
+Registrar:         Registrar MX
+
+% NOTA: El uso excesivo (excessive use) de este servicio puede resultar en
+% access denied temporal.
+"""
+
+AVISOS_CUOTA = [
+    "Query rate limit exceeded. Try again later.\n",
+    "% Quota exceeded\n",
+    "%ERROR:201: access denied\n% too many connections from your IP\n",
+    "Number of allowed queries exceeded the maximum.",
+]
+
+
+@pytest.mark.parametrize("texto", [REGISTRO_COM, REGISTRO_MX])
+def test_registro_con_aviso_legal_no_es_limite(texto):
+    assert not es_respuesta_limitada(texto)
+
+
+@pytest.mark.parametrize("texto", AVISOS_CUOTA)
+def test_aviso_sin_registro_es_limite(texto):
+    assert es_respuesta_limitada(texto)
+
+
+def test_no_match_no_es_limite():
+    assert not es_respuesta_limitada('No match for "NOEXISTE-XYZ.COM".\n')
+
+
+class _NIC:
+    respuesta = ""
+
+    def whois_lookup(self, *args, **kwargs):
+        return self.respuesta
+
+
+@pytest.fixture
+def nic(monkeypatch):
+    monkeypatch.setattr(whois_cliente, "NICClient", _NIC)
+    return _NIC
+
+
+def test_consulta_con_aviso_legal_retorna_la_fecha(nic):
+    nic.respuesta = REGISTRO_COM
+    cliente = ClienteWhois()
+    fecha = cliente.fecha_creacion("empresa.com")
+    assert fecha.replace(tzinfo=None) == datetime(2004, 3, 15, 17, 44, 1)
+    assert cliente.limite("com").limitadas == 0
+
+
+def test_consulta_con_aviso_de_cuota_lanza_limitado_y_no_cachea(nic):
+    nic.respuesta = AVISOS_CUOTA[0]
+    cliente = ClienteWhois()
+    with pytest.raises(WhoisLimitado):
+        cliente.fecha_creacion("empresa.com")
+    assert cliente.limite("com").limitadas == 1
+    assert "empresa.com" not in cliente._cache
@@ -0,0 +1,116 @@
+"""
+ProspectScan - Certificado y protocolo TLS del handshake de la sonda
+Se leen del socket TLS que la sonda HTTPS ya abrió (requests o httpx): sin
+segunda conexión ni herramientas aparte. Emisor, vencimiento y versión TLS
+salen de ssl; el tipo y tamaño de clave requieren `cryptography` (opcional).
+"""
+
+import ssl
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import dsa, ec, ed448, ed25519, rsa
+    CRYPTOGRAPHY_DISPONIBLE = True
+except ImportError:  # Sin cryptography: solo protocolo, emisor y vencimiento
+    CRYPTOGRAPHY_DISPONIBLE = False
+
+# Versiones que ya no se consideran seguras (RFC 8996)
+TLS_OBSOLETOS = frozenset(["SSLv3", "TLSv1", "TLSv1.1"])
+# Días antes del vencimiento en que el certificado cuenta como "por vencer"
+CERT_DIAS_AVISO = 30
+
+
+@dataclass
+class InfoTLS:
+    protocolo: Optional[str]  # "TLSv1.3", "TLSv1.2", ...
+    cifrado: Optional[str]
+    emisor: Optional[str]  # organización (o CN) de la CA
+    sujeto: Optional[str]  # CN del certificado
+    vence: Optional[datetime]  # notAfter, UTC
+    algoritmo_clave: Optional[str] = None  # "RSA", "EC", ...
+    bits_clave: Optional[int] = None
+
+    @property
+    def dias_para_vencer(self) -> Optional[int]:
+        if self.vence is None:
+            return None
+        return (self.vence - datetime.now(timezone.utc)).days
+
+    @property
+    def por_vencer(self) -> bool:
+        dias = self.dias_para_vencer
+        return dias is not None and dias <= CERT_DIAS_AVISO
+
+    @property
+    def protocolo_obsoleto(self) -> bool:
+        return self.protocolo in TLS_OBSOLETOS
+
+    @property
+    def clave(self) -> Optional[str]:
+        """"RSA 2048", "EC 256"... o None si no se pudo leer."""
+        if not self.algoritmo_clave:
+            return None
+        return f"{self.algoritmo_clave} {self.bits_clave}" if self.bits_clave else self.algoritmo_clave
+
+
+def _campo(nombre_x509, clave: str) -> Optional[str]:
+    """Valor de un atributo en el formato de getpeercert(): ((('commonName', 'x'),), ...)."""
+    for rdn in nombre_x509 or ():
+        for k, v in rdn:
+            if k == clave:
+                return v
+    return None
+
+
+def _clave_publica(der: Optional[bytes]) -> "tuple[Optional[str], Optional[int]]":
+    if not der or not CRYPTOGRAPHY_DISPONIBLE:
+        return None, None
+    try:
+        clave = x509.load_der_x509_certificate(der).public_key()
+    except Exception:
+        return None, None
+    if isinstance(clave, rsa.RSAPublicKey):
+        return "RSA", clave.key_size
+    if isinstance(clave, ec.EllipticCurvePublicKey):
+        return "EC", clave.key_size
+    if isinstance(clave, dsa.DSAPublicKey):
+        return "DSA", clave.key_size
+    if isinstance(clave, ed25519.Ed25519PublicKey):
+        return "Ed25519", 256
+    if isinstance(clave, ed448.Ed448PublicKey):
+        return "Ed448", 448
+    return type(clave).__name__, None
+
+
+def info_desde_ssl(ssl_obj) -> Optional[InfoTLS]:
+    """InfoTLS de un ssl.SSLSocket / ssl.SSLObject ya conectado (y verificado)."""
+    if ssl_obj is None:
+        return None
+    try:
+        cert = ssl_obj.getpeercert() or {}
+        der = ssl_obj.getpeercert(binary_form=True)
+        cifrado = ssl_obj.cipher()
+        protocolo = ssl_obj.version()
+    except (ssl.SSLError, ValueError, AttributeError):
+        return None
+
+    vence = None
+    if cert.get("notAfter"):
+        try:
+            vence = datetime.fromtimestamp(ssl.cert_time_to_seconds(cert["notAfter"]), tz=timezone.utc)
+        except ValueError:
+            pass
+    algoritmo, bits = _clave_publica(der)
+    emisor = cert.get("issuer")
+    return InfoTLS(
+        protocolo=protocolo,
+        cifrado=cifrado[0] if cifrado else None,
+        emisor=_campo(emisor, "organizationName") or _campo(emisor, "commonName"),
+        sujeto=_campo(cert.get("subject"), "commonName"),
+        vence=vence,
+        algoritmo_clave=algoritmo,
+        bits_clave=bits,
+    )
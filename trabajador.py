@@ -0,0 +1,201 @@
+"""
+ProspectScan - Trabajador de escaneos en segundo plano
+Procesos que toman trabajos de la cola SQLite (trabajos.py) y los ejecutan
+con el mismo escanear_dominios de la app, guardando las filas a medida que
+salen. Además sirve la API de estado por HTTP (opcional):
+
+    GET /trabajos/<id>               -> estado y progreso (JSON)
+    GET /trabajos/<id>/filas?desde=N -> filas nuevas desde el seq N (JSON)
+
+Uso: python trabajador.py [--procesos 2] [--puerto 8765] [--ocioso 0]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from trabajos import TRABAJOS_DB_PATH, ColaTrabajos, Trabajo
+
+# Filas por escritura a SQLite y latido mínimo mientras el escaneo espera
+TRABAJO_LOTE_FILAS = 25
+TRABAJO_LATIDO_SEGUNDOS = 5.0
+
+
+def _resumen_dict(resumen) -> Dict:
+    return {
+        "desde_cache": resumen.desde_cache,
+        "reanudados": resumen.reanudados,
+        "inexistentes": len(resumen.inexistentes),
+        "incompletos": len(resumen.incompletos),
+        "parciales": len(resumen.parciales),
+        "errores": dict(resumen.errores),
+        "etapas": resumen.etapas,
+        "lentos": resumen.lentos,
+    }
+
+
+class _Detenido(Exception):
+    """El trabajador recibió SIGTERM mientras el escaneo esperaba."""
+
+
+def ejecutar_trabajo(cola: ColaTrabajos, trabajo: Trabajo, detener: Optional[threading.Event] = None):
+    """
+    Escanea los dominios del trabajo que aún no tienen fila. Si `detener` se
+    activa a mitad, guarda las filas hechas y devuelve el trabajo a la cola:
+    quien lo tome sigue desde ahí.
+    """
+    # Importación diferida: app_superficie carga catálogo, DNS y clientes HTTP
+    from app_superficie import Escaneo, ResumenEscaneo, escanear_dominios
+
+    hechos = set(cola.dominios_hechos(trabajo.id))
+    dominios = [d for d in trabajo.dominios if d not in hechos]
+    escaneo = None
+    if trabajo.run_id:
+        # Sigue el checkpoint de Neon del escaneo que empezó la UI
+        escaneo = Escaneo(trabajo.run_id, trabajo.hash_archivo or "", dominios)
+
+    resumen = ResumenEscaneo()
+    lote: List[Dict] = []
+    ultimo_latido = time.monotonic()
+
+    def al_esperar(_):
+        nonlocal ultimo_latido
+        if detener is not None and detener.is_set():
+            raise _Detenido()
+        if time.monotonic() - ultimo_latido >= TRABAJO_LATIDO_SEGUNDOS:
+            cola.agregar_filas(trabajo.id, lote, _resumen_dict(resumen))
+            lote.clear()
+            ultimo_latido = time.monotonic()
+
+    # Latido del trabajo aunque el escaneo se trabe sin entregar filas ni
+    # llamar a al_esperar (Neon lento, un dominio colgado): vencido, otro
+    # trabajador lo tomaría mientras este sigue vivo
+    terminado = threading.Event()
+
+    def latir():
+        while not terminado.wait(TRABAJO_LATIDO_SEGUNDOS):
+            cola.latido(trabajo.id)
+
+    threading.Thread(target=latir, daemon=True).start()
+    filas = escanear_dominios(dominios, trabajo.plazo, resumen, al_esperar=al_esperar, escaneo=escaneo)
+    try:
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= TRABAJO_LOTE_FILAS or time.monotonic() - ultimo_latido >= TRABAJO_LATIDO_SEGUNDOS:
+                cola.agregar_filas(trabajo.id, lote, _resumen_dict(resumen))
+                lote.clear()
+                ultimo_latido = time.monotonic()
+            if detener is not None and detener.is_set():
+                break
+    except _Detenido:
+        pass
+    finally:
+        filas.close()  # Cancela el pipeline y libera el checkpoint de Neon si quedó a medias
+        terminado.set()
+    cola.agregar_filas(trabajo.id, lote, _resumen_dict(resumen))
+    if detener is not None and detener.is_set():
+        cola.devolver(trabajo.id)
+        return
+    cola.terminar(trabajo.id, _resumen_dict(resumen))
+
+
+def bucle_trabajador(ruta: str, ocioso: float = 0.0):
+    """Toma y ejecuta trabajos hasta recibir SIGTERM (o `ocioso` segundos sin trabajo)."""
+    cola = ColaTrabajos(ruta)
+    nombre = f"{socket.gethostname()}-{os.getpid()}"
+    detener = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: detener.set())
+
+    # El latido del proceso sigue aunque un escaneo largo no entregue filas
+    def latir():
+        while not detener.wait(TRABAJO_LATIDO_SEGUNDOS):
+            cola.latido_trabajador(nombre)
+
+    cola.latido_trabajador(nombre)
+    threading.Thread(target=latir, daemon=True).start()
+    desde = time.monotonic()
+    try:
+        while not detener.is_set():
+            trabajo = cola.tomar(nombre)
+            if trabajo is None:
+                if ocioso and time.monotonic() - desde > ocioso:
+                    break
+                detener.wait(1.0)
+                continue
+            try:
+                ejecutar_trabajo(cola, trabajo, detener)
+            except Exception as e:
+                cola.terminar(trabajo.id, error=str(e))
+            desde = time.monotonic()
+    finally:
+        cola.baja_trabajador(nombre)
+
+
+class _ManejadorEstado(BaseHTTPRequestHandler):
+    cola: ColaTrabajos
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        partes = [p for p in url.path.split("/") if p]
+        if len(partes) == 2 and partes[0] == "trabajos":
+            cuerpo = self.cola.estado(partes[1])
+        elif len(partes) == 3 and partes[0] == "trabajos" and partes[2] == "filas":
+            try:
+                desde = int(parse_qs(url.query).get("desde", ["0"])[0])
+            except ValueError:
+                desde = 0
+            filas, ultimo = self.cola.filas(partes[1], desde)
+            cuerpo = {"filas": filas, "desde": ultimo} if self.cola.estado(partes[1]) else None
+        else:
+            cuerpo = None
+        datos = json.dumps(cuerpo if cuerpo is not None else {"error": "no encontrado"}).encode("utf-8")
+        self.send_response(200 if cuerpo is not None else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, format, *args):
+        pass  # Sin log por request
+
+
+def servir_estado(cola: ColaTrabajos, puerto: int) -> ThreadingHTTPServer:
+    """API de estado en 127.0.0.1:<puerto>, en un hilo."""
+    manejador = type("ManejadorEstado", (_ManejadorEstado,), {"cola": cola})
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trabajador de escaneos de ProspectScan")
+    parser.add_argument("--procesos", type=int, default=1, help="procesos trabajadores")
+    parser.add_argument("--puerto", type=int, default=0, help="puerto de la API de estado (0 = sin API)")
+    parser.add_argument("--ocioso", type=float, default=0.0, help="terminar tras N segundos sin trabajos (0 = nunca)")
+    parser.add_argument("--db", default=TRABAJOS_DB_PATH, help="archivo SQLite de la cola")
+    args = parser.parse_args()
+
+    cola = ColaTrabajos(args.db)  # Crea las tablas antes de arrancar los procesos
+    if args.puerto:
+        servir_estado(cola, args.puerto)
+    procesos = [
+        multiprocessing.Process(target=bucle_trabajador, args=(args.db, args.ocioso), daemon=False)
+        for _ in range(max(args.procesos, 1))
+    ]
+    for p in procesos:
+        p.start()
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in procesos])
+    for p in procesos:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+ProspectScan - Cola durable de escaneos en segundo plano
+Los escaneos largos no corren en el hilo del script de Streamlit (cada
+interacción lo re-ejecuta y varias sesiones compiten por el mismo proceso):
+la UI encola un trabajo en SQLite local y uno o más procesos de
+trabajador.py lo toman, lo ejecutan y van guardando sus filas. La UI solo
+consulta estado() y filas(); trabajador.py expone lo mismo por HTTP.
+
+Un trabajo tomado por un trabajador que dejó de dar latidos (se reinició el
+contenedor, murió el proceso) vuelve a la cola y se retoma sin repetir los
+dominios que ya tienen fila.
+
+Configuración:
+- PROSPECTSCAN_TRABAJOS_DB: ruta del archivo SQLite (por defecto data/trabajos.db)
+- PROSPECTSCAN_TRABAJADORES: procesos del trabajador que lanza la app (0 = no lanzar)
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+# ============================================================================
+# CONFIGURACIÓN
+# ============================================================================
+
+TRABAJOS_DB_PATH = os.environ.get(
+    "PROSPECTSCAN_TRABAJOS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "trabajos.db"),
+)
+
+# Procesos que lanza la app si no hay trabajadores vivos (0 = se lanzan aparte)
+TRABAJADORES_AUTO = int(os.environ.get("PROSPECTSCAN_TRABAJADORES", "2"))
+
+# Un trabajador o trabajo sin latido en este tiempo se da por muerto
+LATIDO_VENCIDO_SEGUNDOS = 120.0
+
+# Un trabajador lanzado por la app termina tras este tiempo sin trabajos
+TRABAJADOR_OCIOSO_SEGUNDOS = 600.0
+
+PENDIENTE = "pendiente"
+CORRIENDO = "corriendo"
+TERMINADO = "terminado"
+FALLIDO = "fallido"
+
+CREATE_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id            TEXT PRIMARY KEY,
+    estado        TEXT NOT NULL DEFAULT 'pendiente',
+    dominios      TEXT NOT NULL,
+    total         INTEGER NOT NULL,
+    plazo         REAL NOT NULL,
+    hash_archivo  TEXT,
+    run_id        TEXT,
+    tomado_por    TEXT,
+    resumen       TEXT,
+    error         TEXT,
+    creado        REAL NOT NULL,
+    latido        REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos(estado, creado);
+CREATE INDEX IF NOT EXISTS idx_trabajos_hash ON trabajos(hash_archivo);
+
+CREATE TABLE IF NOT EXISTS trabajo_filas (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    trabajo_id  TEXT NOT NULL,
+    dominio     TEXT NOT NULL,
+    fila        TEXT NOT NULL,
+    UNIQUE (trabajo_id, dominio)
+);
+
+CREATE TABLE IF NOT EXISTS trabajadores (
+    nombre  TEXT PRIMARY KEY,
+    pid     INTEGER,
+    latido  REAL NOT NULL
+);
+"""
+
+
+def _json_valor(valor):
+    """Tipos numpy/pandas a nativos para json.dumps."""
+    if hasattr(valor, "item"):
+        return valor.item()
+    return str(valor)
+
+
+def _fila_json(fila: Dict) -> str:
+    limpia = {k: (None if isinstance(v, float) and v != v else v) for k, v in fila.items()}
+    return json.dumps(limpia, default=_json_valor)
+
+
+@dataclass
+class Trabajo:
+    id: str
+    estado: str
+    dominios: List[str]  # los que el trabajador debe escanear
+    total: int  # dominios del archivo (incluye los que ya venían hechos)
+    plazo: float
+    hash_archivo: Optional[str] = None
+    run_id: Optional[str] = None  # escaneo con checkpoint en Neon (db_cache)
+    hechos: int = 0
+    resumen: Dict = field(default_factory=dict)
+    error: Optional[str] = None
+    latido: Optional[float] = None  # time.time() del último latido del trabajador que lo corre
+
+
+class ColaTrabajos:
+    """Cola de trabajos en un archivo SQLite compartido entre procesos (WAL)."""
+
+    def __init__(self, ruta: str = TRABAJOS_DB_PATH):
+        self.ruta = ruta
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with self._conexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(CREATE_TABLES_SQL)
+
+    @contextmanager
+    def _conexion(self) -> Iterator[sqlite3.Connection]:
+        # Una conexión por operación: se usa desde hilos y procesos distintos
+        conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def encolar(
+        self,
+        dominios: List[str],
+        plazo: float,
+        total: Optional[int] = None,
+        hash_archivo: Optional[str] = None,
+        run_id: Optional[str] = None,
+        filas_hechas: Optional[List[Dict]] = None,
+    ) -> str:
+        """Nuevo trabajo; `filas_hechas` son las que la UI ya tenía al pasarlo a segundo plano."""
+        trabajo_id = uuid.uuid4().hex
+        filas_hechas = filas_hechas or []
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """
+                INSERT INTO trabajos (id, dominios, total, plazo, hash_archivo, run_id, creado)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    trabajo_id,
+                    json.dumps(list(dominios)),
+                    total if total is not None else len(dominios) + len(filas_hechas),
+                    plazo,
+                    hash_archivo,
+                    run_id,
+                    time.time(),
+                ),
+            )
+            self._insertar_filas(conn, trabajo_id, filas_hechas)
+            conn.execute("COMMIT")
+        return trabajo_id
+
+    def tomar(self, trabajador: str) -> Optional[Trabajo]:
+        """Toma el trabajo pendiente más antiguo (o uno cuyo trabajador murió)."""
+        vencido = time.time() - LATIDO_VENCIDO_SEGUNDOS
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT id FROM trabajos
+                WHERE estado = ? OR (estado = ? AND latido < ?)
+                ORDER BY creado
+                LIMIT 1
+                """,
+                (PENDIENTE, CORRIENDO, vencido),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE trabajos SET estado = ?, tomado_por = ?, latido = ? WHERE id = ?",
+                (CORRIENDO, trabajador, time.time(), row[0]),
+            )
+            conn.execute("COMMIT")
+        return self.trabajo(row[0])
+
+    def trabajo(self, trabajo_id: str) -> Optional[Trabajo]:
+        with self._conexion() as conn:
+            row = conn.execute(
+                """
+                SELECT id, estado, dominios, total, plazo, hash_archivo, run_id, resumen, error, latido,
+                       (SELECT COUNT(*) FROM trabajo_filas WHERE trabajo_id = trabajos.id)
+                FROM trabajos WHERE id = ?
+                """,
+                (trabajo_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return Trabajo(
+            id=row[0],
+            estado=row[1],
+            dominios=json.loads(row[2]),
+            total=row[3],
+            plazo=row[4],
+            hash_archivo=row[5],
+            run_id=row[6],
+            resumen=json.loads(row[7]) if row[7] else {},
+            error=row[8],
+            latido=row[9],
+            hechos=row[10],
+        )
+
+    def activo_por_archivo(self, hash_archivo: str) -> Optional[str]:
+        """Trabajo pendiente o en curso del mismo archivo (otra sesión lo pudo haber encolado)."""
+        with self._conexion() as conn:
+            row = conn.execute(
+                """
+                SELECT id FROM trabajos
+                WHERE hash_archivo = ? AND estado IN (?, ?)
+                ORDER BY creado DESC
+                LIMIT 1
+                """,
+                (hash_archivo, PENDIENTE, CORRIENDO),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _insertar_filas(self, conn: sqlite3.Connection, trabajo_id: str, filas: List[Dict]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO trabajo_filas (trabajo_id, dominio, fila) VALUES (?, ?, ?)",
+            [(trabajo_id, f["dominio"], _fila_json(f)) for f in filas],
+        )
+
+    def agregar_filas(self, trabajo_id: str, filas: List[Dict], resumen: Optional[Dict] = None):
+        """Guarda filas terminadas; también cuenta como latido."""
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._insertar_filas(conn, trabajo_id, filas)
+            if resumen is not None:
+                conn.execute(
+                    "UPDATE trabajos SET latido = ?, resumen = ? WHERE id = ?",
+                    (time.time(), json.dumps(resumen), trabajo_id),
+                )
+            else:
+                conn.execute("UPDATE trabajos SET latido = ? WHERE id = ?", (time.time(), trabajo_id))
+            conn.execute("COMMIT")
+
+    def devolver(self, trabajo_id: str):
+        """El trabajador se detiene a mitad: el trabajo vuelve a la cola con sus filas."""
+        with self._conexion() as conn:
+            conn.execute(
+                "UPDATE trabajos SET estado = ?, tomado_por = NULL WHERE id = ? AND estado = ?",
+                (PENDIENTE, trabajo_id, CORRIENDO),
+            )
+
+    def latido(self, trabajo_id: str):
+        """El trabajador sigue con el trabajo (sin filas nuevas que guardar)."""
+        with self._conexion() as conn:
+            conn.execute("UPDATE trabajos SET latido = ? WHERE id = ?", (time.time(), trabajo_id))
+
+    def terminar(self, trabajo_id: str, resumen: Optional[Dict] = None, error: Optional[str] = None):
+        with self._conexion() as conn:
+            conn.execute(
+                "UPDATE trabajos SET estado = ?, resumen = COALESCE(?, resumen), error = ?, latido = ? WHERE id = ?",
+                (
+                    FALLIDO if error else TERMINADO,
+                    json.dumps(resumen) if resumen is not None else None,
+                    error,
+                    time.time(),
+                    trabajo_id,
+                ),
+            )
+
+    def dominios_hechos(self, trabajo_id: str) -> List[str]:
+        with self._conexion() as conn:
+            rows = conn.execute("SELECT dominio FROM trabajo_filas WHERE trabajo_id = ?", (trabajo_id,))
+            return [r[0] for r in rows]
+
+    # ------------------------------------------------------------------
+    # API de estado (la usan la UI y el servidor HTTP de trabajador.py)
+    # ------------------------------------------------------------------
+
+    def estado(self, trabajo_id: str) -> Optional[Dict]:
+        """Progreso de un trabajo: estado, total, hechos, resumen, error y último latido."""
+        trabajo = self.trabajo(trabajo_id)
+        if trabajo is None:
+            return None
+        return {
+            "id": trabajo.id,
+            "estado": trabajo.estado,
+            "total": trabajo.total,
+            "hechos": trabajo.hechos,
+            "resumen": trabajo.resumen,
+            "error": trabajo.error,
+            "latido": trabajo.latido,
+        }
+
+    def filas(self, trabajo_id: str, desde: int = 0) -> "tuple[List[Dict], int]":
+        """Filas con seq > desde y el último seq leído (para pedir solo las nuevas)."""
+        with self._conexion() as conn:
+            rows = conn.execute(
+                "SELECT seq, fila FROM trabajo_filas WHERE trabajo_id = ? AND seq > ? ORDER BY seq",
+                (trabajo_id, desde),
+            ).fetchall()
+        return [json.loads(f) for _, f in rows], (rows[-1][0] if rows else desde)
+
+    # ------------------------------------------------------------------
+    # Trabajadores
+    # ------------------------------------------------------------------
+
+    def latido_trabajador(self, nombre: str):
+        with self._conexion() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO trabajadores (nombre, pid, latido) VALUES (?, ?, ?)",
+                (nombre, os.getpid(), time.time()),
+            )
+
+    def baja_trabajador(self, nombre: str):
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM trabajadores WHERE nombre = ?", (nombre,))
+
+    def trabajadores_vivos(self) -> int:
+        with self._conexion() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM trabajadores WHERE latido > ?",
+                (time.time() - LATIDO_VENCIDO_SEGUNDOS,),
+            ).fetchone()
+        return row[0]
+
+
+def requiere_trabajador(estado: Dict) -> bool:
+    """
+    El trabajo (estado() de la cola) necesita que alguien lo tome: sigue
+    pendiente, o está corriendo pero su trabajador dejó de dar latidos.
+    """
+    if estado["estado"] == PENDIENTE:
+        return True
+    vencido = time.time() - LATIDO_VENCIDO_SEGUNDOS
+    return estado["estado"] == CORRIENDO and (estado.get("latido") or 0) < vencido
+
+
+# Trabajadores lanzados por este proceso, por ruta de la cola: mientras el
+# proceso vive (aunque todavía no haya dado su primer latido) no se lanza otro
+_LANZADOS: Dict[str, subprocess.Popen] = {}
+_LANZADOS_LOCK = threading.Lock()
+
+
+def asegurar_trabajadores(cola: ColaTrabajos, procesos: int = TRABAJADORES_AUTO) -> bool:
+    """
+    Lanza trabajador.py en su propio proceso si no hay ninguno vivo. Termina
+    solo tras TRABAJADOR_OCIOSO_SEGUNDOS sin trabajos. False si no hay
+    trabajadores ni se pueden lanzar (procesos = 0: se administran aparte).
+    """
+    if cola.trabajadores_vivos():
+        return True
+    if procesos <= 0:
+        return False
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trabajador.py")
+    with _LANZADOS_LOCK:
+        lanzado = _LANZADOS.get(cola.ruta)
+        if lanzado is not None and lanzado.poll() is None:
+            return True  # Arrancando: sus procesos registran el latido al empezar
+        try:
+            _LANZADOS[cola.ruta] = subprocess.Popen(
+                [
+                    sys.executable, script,
+                    "--procesos", str(procesos),
+                    "--ocioso", str(TRABAJADOR_OCIOSO_SEGUNDOS),
+                    "--db", cola.ruta,
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,  # Sobrevive a la sesión de Streamlit que lo lanzó
+            )
+        except OSError:
+            return False
+    return True
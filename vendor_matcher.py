@@ -0,0 +1,66 @@
+"""
+ProspectScan - Matcher compilado de catálogos de vendors
+Compila un catálogo {patrón: vendor} en UNA sola regex de alternativas con
+grupos nombrados. Cada texto se recorre una vez y se obtienen todos los
+vendors que aparecen, en vez de un re.search por patrón y por registro.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+class MatcherVendors:
+    """
+    Todas las coincidencias de un catálogo en una pasada por texto.
+
+    Todo va en lookaheads: el match es de ancho cero y el escaneo no consume
+    texto, así un patrón largo (include:.*mimecast) no oculta a otro vendor
+    que empiece más adelante. Cada patrón tiene su propio lookahead opcional
+    con grupo nombrado, así dos patrones que coinciden desde la misma
+    posición se reportan ambos; el lookahead inicial con todas las
+    alternativas descarta rápido las posiciones donde no empieza ninguno.
+    """
+
+    def __init__(self, catalogo: Dict[str, Any]):
+        self.patrones = list(catalogo.keys())
+        self.valores = list(catalogo.values())
+        self._regex = None
+        if self.patrones:
+            alguno = "|".join(f"(?:{patron})" for patron in self.patrones)
+            cada_uno = "".join(f"(?=(?P<v{i}>{patron}))?" for i, patron in enumerate(self.patrones))
+            self._regex = re.compile(f"(?=(?:{alguno})){cada_uno}", re.IGNORECASE)
+
+    def indices(self, texto: str) -> Set[int]:
+        """Índices (orden del catálogo) de los patrones que aparecen en el texto."""
+        if not texto or self._regex is None:
+            return set()
+        encontrados = set()
+        for m in self._regex.finditer(texto):
+            encontrados.update(int(nombre[1:]) for nombre, valor in m.groupdict().items() if valor is not None)
+        return encontrados
+
+    def todos(self, textos: Iterable[str]) -> List[Any]:
+        """Vendors que aparecen en cualquiera de los textos, sin repetir, en orden del catálogo."""
+        encontrados: Set[int] = set()
+        for texto in textos:
+            encontrados |= self.indices(texto)
+        return list(dict.fromkeys(self.valores[i] for i in sorted(encontrados)))
+
+    def primero(self, textos: Iterable[str]) -> Optional[Any]:
+        """
+        Primer texto con coincidencias -> vendor de menor índice en el catálogo
+        (misma prioridad que recorrer registros y luego patrones).
+        """
+        for texto in textos:
+            encontrados = self.indices(texto)
+            if encontrados:
+                return self.valores[min(encontrados)]
+        return None
+
+
+def terminos_spf(spf: str) -> List[str]:
+    """
+    Un SPF se evalúa término a término: include:.*x no puede cruzar a otro
+    mecanismo del mismo registro.
+    """
+    return spf.split() if spf else []
@@ -0,0 +1,267 @@
+"""
+ProspectScan - Cliente WHOIS seguro entre hilos y con límite por registro
+Consulta WHOIS sin redirigir stdout/stderr (es global al proceso y se pisa
+entre hilos): el cliente de python-whois va en modo silencioso y sus errores
+de socket se reciben como excepciones.
+
+Los registros frenan a quien consulta mucho (.mx y .com.br rechazan después
+de una ráfaga), así que cada TLD tiene su propio token bucket. Si la respuesta
+es un rechazo por cuota o la conexión se cierra, el TLD entra en enfriamiento
+con backoff exponencial y la consulta se reporta como WhoisLimitado: no se
+cachea, para volver a intentarla en otra carga.
+
+Configuración: PROSPECTSCAN_WHOIS_QPS="mx=0.2,br=0.2,com=5".
+"""
+
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from whois import NICClient
+from whois.exceptions import PywhoisError
+from whois.parser import WhoisEntry
+
+from latencias import ETAPA_LAT_WHOIS, timeout_adaptativo
+from single_flight import SingleFlight
+
+# ============================================================================
+# CONFIGURACIÓN
+# ============================================================================
+
+# Techo y piso del timeout adaptativo de WHOIS (latencias.py); el techo es
+# también el timeout de socket de cada consulta
+WHOIS_TIMEOUT = 20
+WHOIS_TIMEOUT_MIN = 2.0
+TIMEOUT_WHOIS = timeout_adaptativo(ETAPA_LAT_WHOIS, techo=WHOIS_TIMEOUT, piso=WHOIS_TIMEOUT_MIN)
+
+# Consultas por segundo por TLD (token bucket); los registros con cuota
+# estricta van más despacio
+WHOIS_QPS_DEFECTO = 1.0
+WHOIS_QPS_POR_TLD = {"mx": 0.2, "br": 0.2, "com": 5.0, "net": 5.0}
+WHOIS_RAFAGA = 5
+
+# Tiempo máximo de espera por turno; más que esto se reporta como limitado
+WHOIS_ESPERA_MAX = 10.0
+
+# Backoff tras un rechazo: base × 2^(rechazos-1), con jitter y tope
+WHOIS_BACKOFF_BASE = 5.0
+WHOIS_BACKOFF_MAX = 300.0
+
+# Respuestas definitivas cacheadas (fecha o "sin fecha")
+WHOIS_CACHE_MAX = 4096
+
+# Textos con que los registros avisan que se excedió la cuota. Solo cuentan
+# en respuestas sin campos de registro: los avisos legales al pie de un
+# registro completo mencionan "excessive", "access denied", etc.
+PATRONES_LIMITE = (
+    "limit exceeded",
+    "rate limit",
+    "query rate",
+    "quota exceeded",
+    "too many",
+    "try again later",
+    "exceeded the maximum",
+    "excessive",
+    "temporarily denied",
+    "access denied",
+)
+
+# Inicio de línea de un campo de registro ("Domain Name:", "Creation Date:",
+# "created:", "Registrar:", "nserver:"...): la respuesta es un registro real
+CAMPOS_REGISTRO = re.compile(
+    r"^\s*(domain(\s+name)?|creation\s+date|created(\s+on)?|registered(\s+on)?|registrar"
+    r"|registrant|name\s*servers?|nserver|fecha\s+de\s+(creaci[oó]n|alta)|dominio|status)\s*[:.]",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# python-whois reporta errores de socket por logging: no ensuciar logs/UI
+logging.getLogger("whois").setLevel(logging.CRITICAL)
+
+
+def _qps_configurados() -> Dict[str, float]:
+    qps = dict(WHOIS_QPS_POR_TLD)
+    for par in os.environ.get("PROSPECTSCAN_WHOIS_QPS", "").split(","):
+        tld, _, valor = par.partition("=")
+        try:
+            qps[tld.strip().lower().lstrip(".")] = float(valor)
+        except ValueError:
+            continue
+    return qps
+
+
+class WhoisLimitado(Exception):
+    """El registro nos está frenando: la consulta no se hizo (o fue rechazada)."""
+
+    def __init__(self, tld: str, espera: float = 0.0):
+        super().__init__(f"Consulta limitada por {tld} (reintentar en {espera:.0f}s)")
+        self.tld = tld
+        self.espera = espera
+
+
+def tld_whois(dominio: str) -> str:
+    """Clave del límite: el TLD ("empresa.com.mx" -> "mx")."""
+    return dominio.rstrip(".").rsplit(".", 1)[-1].lower()
+
+
+def es_respuesta_limitada(texto: str) -> bool:
+    """Aviso de cuota: menciona un PATRONES_LIMITE y no trae ningún campo de registro."""
+    if CAMPOS_REGISTRO.search(texto):
+        return False
+    texto = texto.lower()
+    return any(p in texto for p in PATRONES_LIMITE)
+
+
+class LimiteRegistro:
+    """Token bucket de un TLD más su enfriamiento tras un rechazo."""
+
+    def __init__(self, tld: str, qps: float, rafaga: int = WHOIS_RAFAGA):
+        self.tld = tld
+        self.qps = qps
+        self.rafaga = rafaga
+        self._lock = threading.Lock()
+        self._tokens = float(rafaga)
+        self._recarga = time.monotonic()
+        self._bloqueado_hasta = 0.0
+        self.rechazos_seguidos = 0
+        self.consultas = 0
+        self.limitadas = 0
+
+    def tomar_token(self) -> float:
+        """Consume un token; si no hay (o está en enfriamiento) retorna los segundos a esperar."""
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora < self._bloqueado_hasta:
+                return self._bloqueado_hasta - ahora
+            self._tokens = min(self.rafaga, self._tokens + (ahora - self._recarga) * self.qps)
+            self._recarga = ahora
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.consultas += 1
+                return 0.0
+            return (1 - self._tokens) / self.qps if self.qps > 0 else WHOIS_BACKOFF_MAX
+
+    def esperar_turno(self, espera_max: float):
+        """Bloquea hasta tener token; WhoisLimitado si la espera pasa de espera_max."""
+        limite = time.monotonic() + espera_max
+        while True:
+            espera = self.tomar_token()
+            if espera <= 0:
+                return
+            if time.monotonic() + espera > limite:
+                with self._lock:
+                    self.limitadas += 1
+                raise WhoisLimitado(self.tld, espera)
+            time.sleep(espera)
+
+    def rechazo(self) -> float:
+        """El registro rechazó: enfriamiento exponencial y la ráfaga se pierde."""
+        with self._lock:
+            self.rechazos_seguidos += 1
+            self.limitadas += 1
+            espera = min(WHOIS_BACKOFF_BASE * 2 ** (self.rechazos_seguidos - 1), WHOIS_BACKOFF_MAX)
+            espera *= random.uniform(1.0, 1.5)
+            self._bloqueado_hasta = time.monotonic() + espera
+            self._tokens = 0.0
+            self._recarga = time.monotonic()
+            return espera
+
+    def exito(self):
+        with self._lock:
+            self.rechazos_seguidos = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "tld": self.tld,
+                "qps": self.qps,
+                "consultas": self.consultas,
+                "limitadas": self.limitadas,
+                "enfriamiento": max(self._bloqueado_hasta - time.monotonic(), 0.0),
+            }
+
+
+def _fecha_creacion(entrada: WhoisEntry) -> Optional[datetime]:
+    creada = entrada.creation_date
+    if isinstance(creada, list):
+        creada = min([d for d in creada if isinstance(d, datetime)], default=None)
+    return creada if isinstance(creada, datetime) else None
+
+
+class ClienteWhois:
+    """WHOIS concurrente: límite por TLD, consultas coalescidas y caché de respuestas definitivas."""
+
+    def __init__(self, espera_max: float = WHOIS_ESPERA_MAX, timeout: float = WHOIS_TIMEOUT):
+        self.espera_max = espera_max
+        self.timeout = timeout
+        self._qps = _qps_configurados()
+        self._lock = threading.Lock()
+        self._limites: Dict[str, LimiteRegistro] = {}
+        self._cache: "OrderedDict[str, Optional[datetime]]" = OrderedDict()
+        self._vuelos = SingleFlight()
+
+    def limite(self, tld: str) -> LimiteRegistro:
+        with self._lock:
+            if tld not in self._limites:
+                self._limites[tld] = LimiteRegistro(tld, self._qps.get(tld, WHOIS_QPS_DEFECTO))
+            return self._limites[tld]
+
+    def fecha_creacion(self, dominio: str) -> Optional[datetime]:
+        """
+        Fecha de creación (None si el registro no la da o el dominio no existe).
+        Lanza WhoisLimitado si el registro nos frena y OSError si la red falla;
+        ninguno de los dos queda en caché.
+        """
+        with self._lock:
+            if dominio in self._cache:
+                self._cache.move_to_end(dominio)
+                return self._cache[dominio]
+        return self._vuelos.hacer(dominio, self._consultar, dominio)
+
+    def _consultar(self, dominio: str) -> Optional[datetime]:
+        limite = self.limite(tld_whois(dominio))
+        limite.esperar_turno(self.espera_max)
+
+        inicio = time.monotonic()
+        try:
+            # quiet + ignore_socket_errors=False: sin logs ni prints, el error llega aquí
+            texto = NICClient().whois_lookup(
+                None, dominio, 0, quiet=True, ignore_socket_errors=False, timeout=self.timeout
+            )
+        except (ConnectionRefusedError, ConnectionResetError) as e:
+            # Cerrar la conexión es la forma más común de frenar de .mx/.br
+            raise WhoisLimitado(limite.tld, limite.rechazo()) from e
+        if es_respuesta_limitada(texto):
+            raise WhoisLimitado(limite.tld, limite.rechazo())
+        if not texto.strip():
+            raise OSError(f"WHOIS sin respuesta para {dominio}")
+        limite.exito()
+        TIMEOUT_WHOIS.registrar(time.monotonic() - inicio)
+
+        try:
+            fecha = _fecha_creacion(WhoisEntry.load(dominio, texto))
+        except PywhoisError:
+            fecha = None  # "No match" y similares: respuesta definitiva sin fecha
+        self._guardar(dominio, fecha)
+        return fecha
+
+    def _guardar(self, dominio: str, fecha: Optional[datetime]):
+        with self._lock:
+            self._cache[dominio] = fecha
+            self._cache.move_to_end(dominio)
+            while len(self._cache) > WHOIS_CACHE_MAX:
+                self._cache.popitem(last=False)
+
+    def estadisticas(self) -> Dict[str, dict]:
+        with self._lock:
+            limites = list(self._limites.values())
+        return {l.tld: l.estadisticas() for l in limites}
+
+
+# Un cliente por proceso: los límites de cada registro son de la IP, no de la sesión
+CLIENTE_WHOIS = ClienteWhois()